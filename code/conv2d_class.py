@@ -55,7 +55,8 @@ class Conv2D:
             self.no_of_tiles *= self.output_channel/self.clipped_output_channel
             print("Conv2D: Clipped output channel to 1 due to output_channel > 1")
 
-        if self.tile or self.permute:
+        # Unrolled designs grow the most, so joint explorations with unrolling use its clipping
+        if (self.tile or self.permute) and not self.unroll:
             if self.input_height <= 16 and self.input_channel > 128:
                 factors = self.get_factors(self.input_channel)
                 factors_list = [factor for factor in factors if factor <= 128]
@@ -98,6 +99,21 @@ class Conv2D:
                 self.clipped_input_channel = 1
                 self.no_of_tiles *= self.input_channel/self.clipped_input_channel
         
+    def get_signature(self):
+        """Return the shape signature of the implemented (clipped) layer."""
+        if self.clipped_output_channel is not None:
+            output_channel = self.clipped_output_channel
+        else:
+            output_channel = self.output_channel
+        if self.clipped_input_channel is not None:
+            input_channel = self.clipped_input_channel
+        else:
+            input_channel = self.input_channel
+        return ("conv2d", self.strides, self.dilations,
+                self.input_batch, self.input_width, self.input_height, input_channel,
+                self.kernel_width, self.kernel_height, input_channel, output_channel,
+                self.output_batch, self.output_width, self.output_height, output_channel)
+
     def get_factors(self, n):
         """Return the factors of n."""
         factors = []
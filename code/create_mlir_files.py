@@ -1,4 +1,5 @@
 import os
+from transform_pipeline import get_loop_optimizer
 
 class MlirFiles():
     def __init__(self, args, layers):
@@ -8,12 +9,7 @@ class MlirFiles():
         self.permute = args.permute
         self.tile = args.tile
         self.unroll = args.unroll
-        if self.permute:
-            self.loop_optimizer = 'permute'
-        elif self.tile:
-            self.loop_optimizer = 'tile'
-        elif self.unroll:
-            self.loop_optimizer = 'unroll'
+        self.loop_optimizer = get_loop_optimizer(args)
 
     def create_mlir_function(self, layer_name, current_layer):
         if layer_name.startswith("conv2d"):
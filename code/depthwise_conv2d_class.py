@@ -60,7 +60,8 @@ class DepthwiseDepthConv2D:
         if self.kernel_multiplier is not None:
             self.no_of_tiles *= self.kernel_multiplier
 
-        if self.tile or self.permute:
+        # Unrolled designs grow the most, so joint explorations with unrolling use its clipping
+        if (self.tile or self.permute) and not self.unroll:
             if self.input_height <= 16 and self.input_channel > 128:
                 factors = self.get_factors(self.input_channel)
                 factors_list = [factor for factor in factors if factor <= 128]
@@ -103,6 +104,16 @@ class DepthwiseDepthConv2D:
                 self.clipped_input_channel = 1
                 self.no_of_tiles *= self.input_channel/self.clipped_input_channel
 
+    def get_signature(self):
+        """Return the shape signature of the implemented (clipped) layer."""
+        if self.clipped_input_channel is not None:
+            input_channel = self.clipped_input_channel
+        else:
+            input_channel = self.input_channel
+        return ("depthwise_conv2d", self.strides, self.dilations,
+                self.input_batch, self.input_width, self.input_height, input_channel,
+                self.kernel_width, self.kernel_height, input_channel,
+                self.output_batch, self.output_width, self.output_height, input_channel)
     
     def get_factors(self, n):
         """Return the factors of n."""
@@ -1,9 +1,47 @@
 import os
-import re
 import csv
-import subprocess
+import json
+import fcntl
+import shutil
+import hashlib
+import glob
+import math
+import time
 import numpy as np
-from itertools import permutations
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dse_worker import run_commands, run_job, run_stage_attempts, start_worker_session, StageFailure, default_timeouts
+from toolchain_session import ToolchainSession, stop_sessions
+from toolchain_backend import toolchain_backends
+from results_cache import ResultsCache
+from results_store import ResultsStore
+from results_csv import read_results_csv
+from network_report import write_network_report
+from metrics_engine import derive_metrics
+from stage_trace import write_trace
+from dse_async import AsyncOrchestrator
+from work_queue import QueueCoordinator
+from stage_scheduler import StageScheduler
+from pareto_front import ParetoFront
+from surrogate_model import SurrogateModel
+from search_strategies import search_strategies
+from loop_nest import get_loop_nest, get_legal_permutations, get_permutation_map, get_loop_nest_name, canonicalize_tile_sizes
+from transform_pipeline import get_loop_optimizer, get_recipe, get_soda_opt_passes, get_recipe_name, get_joint_candidates
+
+# Attributes describing the current configuration, restored when its results are recorded
+job_state = ["current_layer_name", "current_configuration", "current_configuration_suffix",
+             "current_permutation", "current_tiling_combination", "current_unroll_combination", "current_fidelity"]
+
+frontend_cache_directory = "frontend_cache"
+pareto_directory = "pareto"
+
+# Front-end steps whose output only depends on the layer, not on the configuration
+layer_frontend_passes = [
+    ("1a-soda", "a", "soda-opt", ["-soda-outline-bambu-code",
+                                  "-soda-extract-arguments-to-xml='using-bare-ptr'",
+                                  "-soda-generate-bambu-accelcode",
+                                  "-convert-linalg-to-affine-loops"]),
+    ("1b-mlir", "b", "mlir-opt", ["-expand-strided-metadata"])
+]
 
 class DSE:
     def __init__(self, args, layers):
@@ -13,134 +51,277 @@ class DSE:
         self.permute = args.permute
         self.tile = args.tile
         self.unroll = args.unroll
+        # Several loop transformations are explored jointly, composed into one pass pipeline
+        self.loop_optimizer = get_loop_optimizer(args)
+        self.joint = self.loop_optimizer == 'joint'
 
         self.commands = None
         self.current_configuration = None
+        self.current_configuration_suffix = None
         self.current_layer_name = None
+        self.layer_groups = self.group_layers(not args.no_dedup)
+        self.jobs_count = args.jobs
+        self.jobs = []
+        self.async_orchestrator = args.async_orchestrator
+        self.search = args.search
+        self.search_budget = args.search_budget
+        self.search_seed = args.search_seed
+        self.search_objective = args.search_objective
+        self.target_frequency = args.target_frequency * 1e6
+        self.search_outcomes = {}
+        self.pareto_prune = args.pareto_prune
+        # Pareto front of every layer and evaluated points of every representative layer
+        self.pareto_fronts = {}
+        self.evaluated_points = {}
+        self.multi_fidelity = args.multi_fidelity
+        self.finalist_margin = args.finalist_margin
+        self.current_fidelity = "openroad"
+        # Bambu cycles and area estimate per (layer name, transform) of the screened candidates
+        self.screening_results = {}
+        if self.multi_fidelity and self.search_objective == "energy":
+            print("Energy needs OpenROAD power, searching for cycles at the Bambu fidelity")
+            self.search_objective = "cycles"
+        self.network_report = args.network_report
+        self.area_budget = args.area_budget
+        self.results_store = None
+        if args.results_store is not None:
+            self.results_store = ResultsStore(args.results_store, self.target_frequency)
+        self.surrogate_top_k = args.surrogate_top_k
+        self.surrogate = None
+        # Predicted results per (layer name, transform) of the candidates sent to synthesis
+        self.surrogate_predictions = {}
+        if self.surrogate_top_k is not None:
+            self.surrogate = SurrogateModel()
+            if self.results_store is not None:
+                self.surrogate.load_records(self.results_store.get_records())
+            else:
+                self.surrogate.load_corpus("results/*.csv")
+            self.surrogate.cross_validate()
+        self.coordinator = None
+        if args.coordinator is not None:
+            self.coordinator = QueueCoordinator(self, args.coordinator)
+        self.stage_scheduler = None
+        if args.stage_scheduler:
+            self.stage_scheduler = StageScheduler(self, args.bambu_jobs or args.jobs, args.bambu_memory,
+                                                  args.openroad_jobs or args.jobs, args.openroad_memory)
+        self.toolchain_backend = args.toolchain_backend
+        self.backend = toolchain_backends[self.toolchain_backend]()
+        self.toolchain_session = args.toolchain_session
+        if self.toolchain_session and not self.backend.containerized:
+            print(f"The {self.toolchain_backend} backend runs no containers, ignoring --toolchain_session")
+        self.session = ToolchainSession(self.backend, self.toolchain_session, os.getpid())
+        self.fused_frontend = args.fused_frontend
+        self.debug_ir = args.debug_ir
+        self.frontend_reuse = not args.no_frontend_reuse
+        self.current_frontend_artifacts = None
+        self.timeouts = dict(default_timeouts)
+        for stage_type in default_timeouts.keys():
+            if getattr(args, f"{stage_type}_timeout") is not None:
+                self.timeouts[stage_type] = getattr(args, f"{stage_type}_timeout")
+        self.retries = args.retries
+        self.retry_failures = args.retry_failures
+        self.dominance_cutoff = args.dominance_cutoff
+        # Best simulation_cycles x no_of_tiles seen so far per representative layer
+        self.best_cycles = {}
+        self.results_cache = None
+        # Loop nest per layer signature of the model, read when results are imported
+        self.signature_loop_nests = None
+        if not args.no_results_cache:
+            self.results_cache = ResultsCache(args.results_cache)
+            if args.import_results and self.results_store is not None:
+                self.results_cache.import_records(self.results_store.get_records(), self.get_pass_pipeline, args.results_store,
+                                                  self.get_import_transform)
+            elif args.import_results:
+                for file_path in sorted(glob.glob("results/*.csv")):
+                    self.results_cache.import_csv(file_path, self.get_pass_pipeline, self.get_import_transform)
 
         if self.permute:
             self.permutations_list = []
-            self.permutation_mapping = {}  ### Remove this when the mapping for permutation is corrected
+            self.reorder_reductions = args.reorder_reductions
             self.current_permutation = None
         
         if self.tile:
             self.tiling_combinations = []
             self.current_tiling_combination = None
+            # Generated tiling combinations per layer name and canonical tiling combination
+            self.tiling_aliases = {}
         
         if self.unroll:
             self.unrolling_combinations = []
             self.current_unroll_combination = None
 
-    def create_docker_commands(self):
-        docker_base_command = "docker run -u $(id -u) -v $(pwd):/working_dir --rm agostini01/soda soda-opt "
-        soda_opt_bambu_pipeline = [
-            "-affine-scalrep",
-            "-cse",
-            "-affine-data-copy-generate='generate-dma=false fast-mem-space=0'",
-            "-erase-buffer-deallocation",
-            "-promote-buffers-to-stack='max-rank-of-allocated-memref=4 max-alloc-size-in-bytes=4096'",
-            "-lower-affine",
-            "-convert-scf-to-cf",
-            "-convert-memref-to-llvm",
-            "-convert-math-to-llvm",
-            "-convert-math-to-libm",
-            "-arith-expand",
-            "-memref-expand",
-            "-convert-arith-to-llvm",
-            "-convert-func-to-llvm='use-bare-ptr-memref-call-conv'",
-            "-reconcile-unrealized-casts",
-            "--mlir-print-ir-after-all",
-            f"output/04b{self.current_configuration}.mlir",
-            f"-o output/04c{self.current_configuration}.mlir",
-            f"2>&1 | cat > output/05cintermediate-{self.current_configuration}.mlir"
+        if self.joint:
+            self.joint_candidates = []
+
+    def group_layers(self, deduplicate):
+        """Map each representative layer to the layers sharing its shape signature."""
+        layer_groups = {}
+        representatives = {}
+        for layer_name, layer in self.layers.items():
+            signature = layer.get_signature()
+            if deduplicate and signature in representatives:
+                layer_groups[representatives[signature]].append(layer_name)
+            else:
+                representatives[signature] = layer_name
+                layer_groups[layer_name] = [layer_name]
+        print(f"Unique layer signatures: {len(layer_groups)} of {len(self.layers)} layers")
+        return layer_groups
+
+    def get_configuration_name(self, layer_name):
+        return f"{self.model_name}_{self.loop_optimizer}_{layer_name}_{self.current_configuration_suffix}"
+
+    def create_frontend_commands(self, frontend_passes, input_path):
+        """Return the front-end commands, one per stage or fused into a single pipe.
+
+        The IR after every pass is only dumped to the output/05*intermediate files with --debug_ir.
+        """
+        output_path = f"output/05{self.current_configuration}.ll"
+        commands = {}
+        pipe = []
+        for count, (key, step, tool, passes) in enumerate(frontend_passes):
+            command = " ".join([tool] + passes)
+            dump = self.debug_ir and tool != "mlir-translate"
+            if dump:
+                command += " --mlir-print-ir-after-all"
+            intermediate_path = f"output/05{step}intermediate-{self.current_configuration}.mlir"
+            if self.fused_frontend:
+                if count == 0:
+                    command += f" {input_path}"
+                if count == len(frontend_passes) - 1:
+                    command += f" -o {output_path}"
+                if dump:
+                    command += f" 2> {intermediate_path}"
+                pipe.append(command)
+            else:
+                if count == len(frontend_passes) - 1:
+                    command += f" {input_path} -o {output_path}"
+                else:
+                    command += f" {input_path} -o output/04{step}{self.current_configuration}.mlir"
+                    input_path = f"output/04{step}{self.current_configuration}.mlir"
+                if dump:
+                    command += f" 2>&1 | cat > {intermediate_path}"
+                commands[key] = command
+        if self.fused_frontend:
+            commands["1-frontend"] = f"bash -c \"set -o pipefail; {' | '.join(pipe)}\""
+        return commands
+
+    def prepare_frontend_artifacts(self):
+        """Run the layer-invariant front-end steps 1a and 1b once per layer file content.
+
+        The steps run inside the side/ directory of the artifacts so that files they write
+        next to their outputs, such as the extracted arguments XML, are kept for every configuration.
+        They are run, retried and traced like the stages of a configuration, and raise
+        StageFailure if they fail or leave no artifacts.
+        """
+        layer_file_path = self.layers[self.current_layer_name].file_path
+        digest = hashlib.blake2b(digest_size=16)
+        with open(layer_file_path, 'rb') as file:
+            digest.update(file.read())
+        digest.update(repr(layer_frontend_passes).encode())
+        artifacts_directory = os.path.join(frontend_cache_directory, digest.hexdigest())
+        self.current_frontend_artifacts = artifacts_directory
+        if os.path.exists(os.path.join(artifacts_directory, "04b.mlir")):
+            print(f"Reusing front-end artifacts: {artifacts_directory}")
+            return
+        side_directory = os.path.join(artifacts_directory, "side")
+        if not os.path.exists(side_directory):
+            os.makedirs(side_directory)
+        shutil.copyfile(layer_file_path, os.path.join(artifacts_directory, "layer.mlir"))
+        print(f"Creating front-end artifacts: {artifacts_directory}")
+        input_path = "../layer.mlir"
+        txt_file_path = os.path.join(artifacts_directory, "frontend.txt")
+        with open(txt_file_path, "w") as output_file:
+            for key, step, tool, passes in layer_frontend_passes:
+                command = " ".join([tool] + passes)
+                if self.debug_ir:
+                    command += f" --mlir-print-ir-after-all {input_path} -o ../04{step}.mlir 2> ../05{step}intermediate.mlir"
+                else:
+                    command += f" {input_path} -o ../04{step}.mlir"
+                input_path = f"../04{step}.mlir"
+                command = self.session.get_command(key, f"bash -c \"cd {side_directory} && {command}\"")
+                run_stage_attempts(key, command, f"frontend-{digest.hexdigest()[:12]}", txt_file_path, output_file, ".",
+                                   self.timeouts["frontend"], self.retries, self.session.backend)
+        if not os.path.exists(os.path.join(artifacts_directory, "04b.mlir")):
+            raise StageFailure("frontend_error", "1b-mlir", f"04b.mlir was not written, see {txt_file_path}")
+
+    def get_frontend_passes(self, loop_optimizer, transform):
+        """Return the configuration dependent front-end steps 1c-1e for a loop transformation."""
+        soda_opt_bambu_pipeline = get_soda_opt_passes(get_recipe(loop_optimizer, transform))
+        return [
+            ("1c-soda", "c", "soda-opt", soda_opt_bambu_pipeline),
+            ("1d-mlir-opt", "d", "mlir-opt", ["-symbol-dce"]),
+            ("1e-soda", "e", "mlir-translate", ["-opaque-pointers=0", "--mlir-to-llvmir"])
         ]
-        if self.permute:
-            soda_opt_bambu_pipeline.insert(0, f"-test-loop-permutation='permutation-map={self.current_permutation}'")
-            soda_command = docker_base_command + " ".join(soda_opt_bambu_pipeline)
+
+    def get_pass_pipeline(self, loop_optimizer, transform):
+        """Return the whole front-end pass pipeline of a loop transformation as a string."""
+        frontend_passes = layer_frontend_passes + self.get_frontend_passes(loop_optimizer, transform)
+        return " | ".join(" ".join([tool] + passes) for _, _, tool, passes in frontend_passes)
+
+    def get_current_transform(self):
+        if self.joint:
+            transform = {}
+            if self.tile:
+                transform["tile"] = list(self.current_tiling_combination)
+            if self.permute:
+                transform["permute"] = self.current_permutation
+            if self.unroll:
+                transform["unroll"] = list(self.current_unroll_combination)
+            return transform
+        elif self.permute:
+            return self.current_permutation
         elif self.tile:
-            tiling_combination_string = ",".join(str(i) for i in self.current_tiling_combination)
-            if all(x == 0 for x in self.current_tiling_combination):
-                soda_opt_bambu_pipeline.pop(4)
-            else:
-                soda_opt_bambu_pipeline.pop(4)
-                soda_opt_bambu_pipeline.insert(0, f"-affine-loop-tile='tile-sizes={tiling_combination_string}'")
-            soda_command = docker_base_command + " ".join(soda_opt_bambu_pipeline)
+            return list(self.current_tiling_combination)
         elif self.unroll:
-            soda_opt_bambu_pipeline.pop(2)
-            soda_opt_bambu_pipeline.pop(2)
-            loop_unroll_full_string = "-affine-loop-unroll='unroll-full'"
-            loop_unroll_factor_string = f"-affine-loop-unroll='unroll-factor={self.current_unroll_combination[1]}'"
-            if self.current_unroll_combination[1] == 0:
-                loop_unroll_string_list = [loop_unroll_full_string] * self.current_unroll_combination[0]
-            else:
-                loop_unroll_string_list = [loop_unroll_full_string] * (self.current_unroll_combination[0] - 1) +  [loop_unroll_factor_string]
-            loop_unroll_string = " ".join(loop_unroll_string_list)
-            soda_opt_bambu_pipeline.insert(2, loop_unroll_string)
-            soda_command = docker_base_command + " ".join(soda_opt_bambu_pipeline)
-        print(f"SODA command: {soda_command}")
-        self.commands = {
-            "1a-soda": 
-            f"docker run -u $(id -u) -v $(pwd):/working_dir --rm agostini01/soda \
-            soda-opt \
-            -soda-outline-bambu-code \
-            -soda-extract-arguments-to-xml='using-bare-ptr' \
-            -soda-generate-bambu-accelcode \
-            -convert-linalg-to-affine-loops \
-            {self.layers[self.current_layer_name].file_path} \
-            -o output/04a{self.current_configuration}.mlir \
-            2>&1 | cat > output/05aintermediate-{self.current_configuration}.mlir",
-
-            "1b-mlir": 
-            f"docker run -u $(id -u) -v $(pwd):/working_dir --rm agostini01/soda \
-            mlir-opt \
-            -expand-strided-metadata \
-            output/04a{self.current_configuration}.mlir \
-            -o output/04b{self.current_configuration}.mlir \
-            2>&1 | cat > output/05bintermediate-{self.current_configuration}.mlir",
-
-            "1c-soda": soda_command,
-
-            "1d-mlir-opt": 
-            f"docker run -u $(id -u) -v $(pwd):/working_dir --rm agostini01/soda \
-            mlir-opt \
-            -symbol-dce \
-            output/04c{self.current_configuration}.mlir \
-            -o output/04d{self.current_configuration}.mlir \
-            2>&1 | cat > output/05dintermediate-{self.current_configuration}.mlir",
-
-            "1e-soda":
-            f"docker run -u $(id -u) -v $(pwd):/working_dir --rm agostini01/soda \
-                mlir-translate -opaque-pointers=0  \
-                --mlir-to-llvmir \
-                output/04d{self.current_configuration}.mlir \
-                -o output/05{self.current_configuration}.ll",
-
-            "2-bambu":
-            f"scripts/run-bambu.sh {self.current_configuration} 2>&1 | tee ./output/bambu-{self.current_configuration}.log",
-
-            "3-openroad":
-            f"scripts/run-openroad.sh {self.current_configuration} 2>&1 | tee ./output/openroad-{self.current_configuration}.log"
-        }
+            return list(self.current_unroll_combination)
+
+    def create_docker_commands(self):
+        frontend_passes = self.get_frontend_passes(self.loop_optimizer, self.get_current_transform())
+        print(f"SODA command: soda-opt {' '.join(frontend_passes[0][3])}")
+        if self.frontend_reuse:
+            # Start from the layer artifacts of 1a and 1b
+            self.commands = {}
+            side_directory = os.path.join(self.current_frontend_artifacts, "side")
+            if os.listdir(side_directory):
+                self.commands["1-artifacts"] = f"cp -r {side_directory}/. ."
+            input_path = os.path.join(self.current_frontend_artifacts, "04b.mlir")
+            self.commands.update(self.create_frontend_commands(frontend_passes, input_path))
+        else:
+            input_path = self.layers[self.current_layer_name].file_path
+            self.commands = self.create_frontend_commands(layer_frontend_passes + frontend_passes, input_path)
+        self.commands.update({
+            "2-bambu": self.backend.get_bambu_command(self.current_configuration),
+            "3-openroad": self.backend.get_openroad_command(self.current_configuration)
+        })
+        if self.current_fidelity == "bambu":
+            del self.commands["3-openroad"]
         
     
     def create_or_append_to_csv(self, file_path, headers, data):
-        """Create a CSV file with headers if it doesn't exist, or append data to it if it does."""
-        file_exists = os.path.isfile(file_path)
+        """Create a CSV file with headers if it doesn't exist, or append data to it if it does.
 
+        With a results store, the row is buffered in the store under the CSV file name instead.
+        """
+        if self.results_store is not None:
+            self.results_store.add(file_path, {header: "" if value is None else str(value) for header, value in zip(headers, data)})
+            return
         with open(file_path, mode='a', newline='') as file:
+            # Lock the file so that concurrent runs never interleave rows
+            fcntl.flock(file, fcntl.LOCK_EX)
             writer = csv.writer(file)
             
-            # Write headers only if the file does not exist
-            if not file_exists:
+            # Write headers only if the file is empty
+            if file.tell() == 0:
                 writer.writerow(headers)
             
             # Append the data
             writer.writerow(data)
+            file.flush()
+            fcntl.flock(file, fcntl.LOCK_UN)
 
 
-    def record_results(self, simulation_cycles, total_power, available_area, target_frequency = 100e6):
+    def record_results(self, simulation_cycles, total_power, available_area, bambu_area = None):
         
-        giga_multiplier = 1e9
         current_layer = self.layers[self.current_layer_name]
         results_directory = "./results"
         # Check if the directory exists, and create it if it doesn't
@@ -158,6 +339,7 @@ class DSE:
                             "actual_output_batch", "actual_output_width", "actual_output_height", "actual_output_channel",
                             "number_of_tiles"]
             results_header =  ["simulation_cycles", "total_power", "area", "runtime_in_s", "gflops", "gflops_per_watt", "energy_consumed", "flop_count"]
+            tiles_header = ["tiled_output_batch", "tiled_output_width", "tiled_output_height", "tiled_output_channel", "tiled_kernel_width", "tiled_kernel_height", "tiled_input_channel"]
             
             if current_layer.clipped_output_channel is not None:
                 output_channel = current_layer.clipped_output_channel
@@ -169,10 +351,7 @@ class DSE:
                 input_channel = current_layer.input_channel
             
             actual_simulation_cycles = simulation_cycles * current_layer.no_of_tiles
-            runtime_in_s = round(actual_simulation_cycles / target_frequency, 6)
-            gflops = round(current_layer.flop_count / runtime_in_s / giga_multiplier, 6)
-            gflops_per_watt = round(gflops / total_power, 6)
-            energy_consumed = round(total_power * runtime_in_s, 12)
+            metrics = derive_metrics(current_layer.flop_count, actual_simulation_cycles, total_power, self.target_frequency)
 
 
             layer_info = [self.current_configuration, current_layer.strides, current_layer.dilations,
@@ -188,10 +367,10 @@ class DSE:
                 "Simulation Cycles": actual_simulation_cycles,
                 "Total Power (W)": total_power,
                 "Available Area (mm²)": available_area,
-                "Runtime (s)": runtime_in_s,
-                "GFLOPS": gflops,
-                "GFLOPS/Watt": gflops_per_watt,
-                "Energy Consumed (J)": energy_consumed,
+                "Runtime (s)": metrics["runtime_in_s"],
+                "GFLOPS": metrics["gflops"],
+                "GFLOPS/Watt": metrics["gflops_per_watt"],
+                "Energy Consumed (J)": metrics["energy_consumed"],
                 "FLOP Count": current_layer.flop_count
             }
             # Pretty print the results
@@ -199,7 +378,12 @@ class DSE:
             for key, value in results.items():
                 print(f"{key}: {value}")
             
-            if self.permute:
+            if self.joint:
+                file_path = f"./results/{self.model_name}_conv2d_joint.csv"
+                recipe_header, recipe = self.get_recipe_columns(tiles_header)
+                row_header = layer_info_header + recipe_header + implemented_layer_info_header + results_header
+                row = layer_info + recipe + implemented_layer_info + list(results.values())
+            elif self.permute:
                 file_path = f"./results/{self.model_name}_conv2d_permute.csv"
                 permutation_order = list(map(int, self.current_permutation.split(',')))
                 permutation_order_header = [f"permuation_order_{i}" for i in range(1, len(permutation_order)+1)]
@@ -208,7 +392,6 @@ class DSE:
             elif self.tile:
                 file_path = f"./results/{self.model_name}_conv2d_tile.csv"
                 tiles = self.current_tiling_combination
-                tiles_header = ["tiled_output_batch", "tiled_output_width", "tiled_output_height", "tiled_output_channel", "tiled_kernel_width", "tiled_kernel_height", "tiled_input_channel"]
                 row_header = layer_info_header + tiles_header + implemented_layer_info_header + results_header
                 row = layer_info + tiles + implemented_layer_info + list(results.values())
             elif self.unroll:
@@ -231,6 +414,7 @@ class DSE:
                             "actual_output_batch", "actual_output_width", "actual_output_height", "actual_output_channel",
                             "number_of_tiles"]
             results_header = ["simulation_cycles", "total_power", "area", "runtime_in_s", "gflops", "gflops_per_watt", "energy_consumed", "flop_count"]
+            tiles_header = ["tiled_output_batch", "tiled_output_width", "tiled_output_height", "tiled_input_channel", "tiled_kernel_width", "tiled_kernel_height"]
             
             if current_layer.clipped_input_channel is not None:
                 input_channel = current_layer.clipped_input_channel
@@ -238,10 +422,7 @@ class DSE:
                 input_channel = current_layer.input_channel
             
             actual_simulation_cycles = simulation_cycles * current_layer.no_of_tiles
-            runtime_in_s = round(actual_simulation_cycles / target_frequency, 6)
-            gflops = round(current_layer.flop_count / runtime_in_s / giga_multiplier, 6)
-            gflops_per_watt = round(gflops / total_power, 6)
-            energy_consumed = round(total_power * runtime_in_s, 12)
+            metrics = derive_metrics(current_layer.flop_count, actual_simulation_cycles, total_power, self.target_frequency)
 
 
             layer_info = [self.current_configuration, current_layer.strides, current_layer.dilations,
@@ -257,10 +438,10 @@ class DSE:
                 "Simulation Cycles": actual_simulation_cycles,
                 "Total Power (W)": total_power,
                 "Available Area (mm²)": available_area,
-                "Runtime (s)": runtime_in_s,
-                "GFLOPS": gflops,
-                "GFLOPS/Watt": gflops_per_watt,
-                "Energy Consumed (J)": energy_consumed,
+                "Runtime (s)": metrics["runtime_in_s"],
+                "GFLOPS": metrics["gflops"],
+                "GFLOPS/Watt": metrics["gflops_per_watt"],
+                "Energy Consumed (J)": metrics["energy_consumed"],
                 "FLOP Count": current_layer.flop_count
             }
             # Pretty print the results
@@ -268,7 +449,12 @@ class DSE:
             for key, value in results.items():
                 print(f"{key}: {value}")
 
-            if self.permute:
+            if self.joint:
+                file_path = f"./results/{self.model_name}_depthwise_conv2d_joint.csv"
+                recipe_header, recipe = self.get_recipe_columns(tiles_header)
+                row_header = layer_info_header + recipe_header + implemented_layer_info_header + results_header
+                row = layer_info + recipe + implemented_layer_info + list(results.values())
+            elif self.permute:
                 file_path = f"./results/{self.model_name}_depthwise_conv2d_permute.csv"
                 permutation_order = list(map(int, self.current_permutation.split(',')))
                 permutation_order_header = [f"permuation_order_{i}" for i in range(1, len(permutation_order)+1)]
@@ -277,7 +463,6 @@ class DSE:
             elif self.tile:
                 file_path = f"./results/{self.model_name}_depthwise_conv2d_tile.csv"
                 tiles = self.current_tiling_combination
-                tiles_header = ["tiled_output_batch", "tiled_output_width", "tiled_output_height", "tiled_input_channel", "tiled_kernel_width", "tiled_kernel_height"]
                 row_header = layer_info_header + tiles_header + implemented_layer_info_header + results_header
                 row = layer_info + tiles + implemented_layer_info + list(results.values())
             elif self.unroll:
@@ -298,6 +483,7 @@ class DSE:
                             "actual_output_batch", "actual_output_width", "actual_output_height",
                             "number_of_tiles"]
             results_header =  ["simulation_cycles", "total_power", "area", "runtime_in_s", "gflops", "gflops_per_watt", "energy_consumed", "flop_count"]
+            tiles_header = ["tiled_output_batch", "tiled_output_width", "tiled_output_height", "tiled_kernel_width"]
             
             if current_layer.clipped_output_width is not None:
                 output_width = current_layer.clipped_output_width
@@ -325,10 +511,7 @@ class DSE:
                 input_height = current_layer.input_height
             
             actual_simulation_cycles = simulation_cycles * current_layer.no_of_tiles
-            runtime_in_s = round(actual_simulation_cycles / target_frequency, 6)
-            gflops = round(current_layer.flop_count / runtime_in_s / giga_multiplier, 6)
-            gflops_per_watt = round(gflops / total_power, 6)
-            energy_consumed = round(total_power * runtime_in_s, 12)
+            metrics = derive_metrics(current_layer.flop_count, actual_simulation_cycles, total_power, self.target_frequency)
 
 
             layer_info = [self.current_configuration,
@@ -344,10 +527,10 @@ class DSE:
                 "Simulation Cycles": actual_simulation_cycles,
                 "Total Power (W)": total_power,
                 "Available Area (mm²)": available_area,
-                "Runtime (s)": runtime_in_s,
-                "GFLOPS": gflops,
-                "GFLOPS/Watt": gflops_per_watt,
-                "Energy Consumed (J)": energy_consumed,
+                "Runtime (s)": metrics["runtime_in_s"],
+                "GFLOPS": metrics["gflops"],
+                "GFLOPS/Watt": metrics["gflops_per_watt"],
+                "Energy Consumed (J)": metrics["energy_consumed"],
                 "FLOP Count": current_layer.flop_count
             }
             # Pretty print the results
@@ -355,7 +538,12 @@ class DSE:
             for key, value in results.items():
                 print(f"{key}: {value}")
 
-            if self.permute:
+            if self.joint:
+                file_path = f"./results/{self.model_name}_matmul_joint.csv"
+                recipe_header, recipe = self.get_recipe_columns(tiles_header)
+                row_header = layer_info_header + recipe_header + implemented_layer_info_header + results_header
+                row = layer_info + recipe + implemented_layer_info + list(results.values())
+            elif self.permute:
                 file_path = f"./results/{self.model_name}_matmul_permute.csv"
                 permutation_order = list(map(int, self.current_permutation.split(',')))
                 permutation_order_header = [f"permuation_order_{i}" for i in range(1, len(permutation_order)+1)]
@@ -364,7 +552,6 @@ class DSE:
             elif self.tile:
                 file_path = f"./results/{self.model_name}_matmul_tile.csv"
                 tiles = self.current_tiling_combination
-                tiles_header = ["tiled_output_batch", "tiled_output_width", "tiled_output_height", "tiled_kernel_width"]
                 row_header = layer_info_header + tiles_header + implemented_layer_info_header + results_header
                 row = layer_info + tiles + implemented_layer_info + list(results.values())
             elif self.unroll:
@@ -375,155 +562,593 @@ class DSE:
                 row_header = layer_info_header + unroll_header + implemented_layer_info_header + results_header
                 row = layer_info + unrolls + implemented_layer_info + list(results.values())
             
+        if self.current_fidelity == "bambu":
+            # Bambu fidelity rows have no OpenROAD power and area, they are kept apart from
+            # the OpenROAD rows so that every results file has a single header
+            file_path = file_path.replace(".csv", "_bambu.csv")
+            row_header = row_header + ["fidelity", "bambu_area"]
+            row = row + [self.current_fidelity, bambu_area]
         self.create_or_append_to_csv(file_path, row_header, row)
 
     
+    def get_recipe_columns(self, tiles_header):
+        """Return the header and values of the transform columns of a joint results row."""
+        recipe_header = []
+        recipe = []
+        if self.tile:
+            recipe_header += tiles_header
+            recipe += list(self.current_tiling_combination)
+        if self.permute:
+            permutation_order = list(map(int, self.current_permutation.split(',')))
+            recipe_header += [f"permuation_order_{i}" for i in range(1, len(permutation_order)+1)]
+            recipe += permutation_order
+        if self.unroll:
+            recipe_header += ["unroll_full", "unroll_factor"]
+            recipe += list(self.current_unroll_combination)
+        recipe_header.append("transform_recipe")
+        recipe.append(get_recipe_name(get_recipe(self.loop_optimizer, self.get_current_transform())))
+        return recipe_header, recipe
+
+    def record_group_results(self, simulation_cycles, total_power, available_area, key=None, bambu_area=None):
+        """Record the results of the representative layer for every layer sharing its signature.
+
+        The results of a canonical tiling combination are also recorded for each generated
+        tiling combination it stands for, under the results key of that combination.
+        """
+        representative_layer_name = self.current_layer_name
+        representative_configuration = self.current_configuration
+        representative_suffix = self.current_configuration_suffix
+        canonical_tiling = self.current_tiling_combination if self.tile else None
+        recorded = []
+        for tiling in self.get_tiling_aliases(canonical_tiling):
+            row_key = key
+            if tiling != canonical_tiling:
+                self.current_layer_name = representative_layer_name
+                self.current_tiling_combination = tiling
+                # The tiling combination leads the configuration suffix of the tile and joint loop optimizers
+                self.current_configuration_suffix = 'x'.join(map(str, tiling)) + \
+                    representative_suffix[len('x'.join(map(str, canonical_tiling))):]
+                row_key = self.get_results_key()
+            for layer_name in self.layer_groups[representative_layer_name]:
+                if self.results_cache is not None and self.results_cache.is_recorded(self.model_name, layer_name, row_key):
+                    print(f"Results of {layer_name} already recorded")
+                    continue
+                self.current_layer_name = layer_name
+                self.current_configuration = self.get_configuration_name(layer_name)
+                self.record_results(simulation_cycles, total_power, available_area, bambu_area = bambu_area)
+                recorded.append((layer_name, row_key))
+        # The rows of a job are written to the results store in one batch, before the journal records them
+        if self.results_store is not None:
+            self.results_store.flush()
+        if self.results_cache is not None:
+            for layer_name, row_key in recorded:
+                self.results_cache.mark_recorded(self.model_name, layer_name, row_key)
+        self.current_layer_name = representative_layer_name
+        self.current_configuration = representative_configuration
+        self.current_configuration_suffix = representative_suffix
+        if self.tile:
+            self.current_tiling_combination = canonical_tiling
+
+    def get_tiling_aliases(self, canonical_tiling):
+        """Return the generated tiling combinations that the canonical one of the current layer stands for."""
+        if canonical_tiling is None:
+            return [None]
+        aliases = self.tiling_aliases.get(self.current_layer_name, {})
+        return aliases.get(json.dumps(list(canonical_tiling)), [canonical_tiling])
+
+    def get_import_transform(self, record):
+        """Return the transform an imported results row is looked up by.
+
+        Tiling combinations of a layer shape of the model are canonicalized as by
+        canonicalize_tiling_combinations, those of other shapes are kept as written.
+        """
+        if record["loop_optimizer"] != "tile":
+            return record["transform"]
+        if self.signature_loop_nests is None:
+            self.signature_loop_nests = {layer.get_signature(): get_loop_nest(layer.file_path)[1]
+                                         for layer in self.layers.values()}
+        loops = self.signature_loop_nests.get(record["signature"])
+        if loops is None:
+            return record["transform"]
+        return canonicalize_tile_sizes(record["transform"], loops)
+
+    def canonicalize_tiling_combinations(self):
+        """Replace the tiling combinations of the layer by their distinct canonical forms.
+
+        Tiling combinations giving the same affine code, once clamped to the loop extents of
+        the implemented layer, are synthesized once.
+        """
+        _, loops = get_loop_nest(self.layers[self.current_layer_name].file_path)
+        aliases = self.tiling_aliases.setdefault(self.current_layer_name, {})
+        canonical_combinations = []
+        for tiling_combination in self.tiling_combinations:
+            canonical = canonicalize_tile_sizes(tiling_combination, loops)
+            if json.dumps(canonical) not in aliases:
+                aliases[json.dumps(canonical)] = []
+                canonical_combinations.append(canonical)
+            aliases[json.dumps(canonical)].append(list(tiling_combination))
+        print(f"Canonical tiling combinations: {len(canonical_combinations)} of {len(self.tiling_combinations)}")
+        self.tiling_combinations = canonical_combinations
+
+    def create_job(self):
+        """Return the current configuration as a self-contained job."""
+        return {
+            "configuration": self.current_configuration,
+            "key": self.get_results_key(),
+            "state": {name: getattr(self, name) for name in job_state if hasattr(self, name)},
+            "commands": dict(self.commands),
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "cycle_limit": None,
+            "profile": self.get_job_profile(),
+            "inputs": self.get_job_inputs()
+        }
+
+    def get_job_profile(self):
+        """Return what the stage scheduler predicts the cost and memory of the job from."""
+        current_layer = self.layers[self.current_layer_name]
+        return {
+            "flop_count": current_layer.flop_count,
+            "number_of_tiles": current_layer.no_of_tiles,
+            "loop_optimizer": self.loop_optimizer,
+            "transform": self.get_current_transform()
+        }
+
+    def get_job_inputs(self):
+        """Return the files a configuration reads, to be copied into worker workspaces."""
+        inputs = [self.layers[self.current_layer_name].file_path]
+        if self.frontend_reuse:
+            for directory, _, file_names in os.walk(self.current_frontend_artifacts):
+                inputs += [os.path.join(directory, file_name) for file_name in file_names]
+        return inputs
+
+    def finish_job(self, job, results):
+        """Record the results of a job with the configuration state it was created with.
+
+        The current state is restored afterwards, as jobs may finish while a layer is explored.
+        """
+        current_state = {name: getattr(self, name) for name in job["state"]}
+        for name, value in job["state"].items():
+            setattr(self, name, value)
+        try:
+            self.record_job_results(job, results)
+        finally:
+            for name, value in current_state.items():
+                setattr(self, name, value)
+
+    def record_job_results(self, job, results):
+        self.update_best_cycles(results["simulation_cycles"])
+        self.search_outcomes[job["configuration"]] = self.get_search_objective(results)
+        self.update_pareto_front(results)
+        if self.surrogate is not None:
+            self.update_surrogate(results)
+        if self.current_fidelity == "bambu":
+            self.screening_results[(self.current_layer_name, json.dumps(self.get_current_transform()))] = \
+                (results["simulation_cycles"] * self.layers[self.current_layer_name].no_of_tiles, results.get("bambu_area"))
+        self.record_group_results(results["simulation_cycles"], results["total_power"], results["available_area"], job["key"],
+                                  results.get("bambu_area"))
+
+    def update_best_cycles(self, simulation_cycles):
+        actual_simulation_cycles = simulation_cycles * self.layers[self.current_layer_name].no_of_tiles
+        best_cycles = self.best_cycles.get(self.current_layer_name)
+        if best_cycles is None or actual_simulation_cycles < best_cycles:
+            self.best_cycles[self.current_layer_name] = actual_simulation_cycles
+
+    def get_cycle_limit(self, layer_name):
+        """Return the per-tile simulation cycles above which a configuration of the layer is dominated."""
+        best_cycles = self.best_cycles.get(layer_name)
+        if self.dominance_cutoff is None or best_cycles is None:
+            return None
+        return max(1, int(self.dominance_cutoff * best_cycles / self.layers[layer_name].no_of_tiles))
+
+    def get_results_key(self):
+        signature = self.layers[self.current_layer_name].get_signature()
+        transform = self.get_current_transform()
+        pipeline = self.get_pass_pipeline(self.loop_optimizer, transform)
+        pipeline = ResultsCache.get_fidelity_pipeline(pipeline, self.current_fidelity)
+        return ResultsCache.get_key(signature, self.loop_optimizer, transform, pipeline)
+
     def execute_commands(self):
-        # Define the paths
-        txt_file_path = f"output/progress-{self.current_configuration}.txt"
-        # Get the directory name
-        directory = os.path.dirname(txt_file_path)
-        # Check if the directory exists, and create it if it doesn't
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-        # Open the output text file in write mode
-        with open(txt_file_path, "w") as output_file:
+        job = self.create_job()
+        if self.results_cache is not None:
+            results = self.results_cache.lookup(job["key"])
+            if results is not None:
+                print(f"Results cache hit: {self.current_configuration}")
+                self.finish_job(job, results)
+                return
+            failure = self.results_cache.lookup_failure(job["key"])
+            if failure is not None and not self.retry_failures and self.is_known_failure(failure):
+                print(f"Skipping known failure: {self.current_configuration} ({failure['kind']} in {failure['stage']})")
+                return
+            self.results_cache.start(job["key"], job["configuration"])
+        if self.jobs_count > 1 or self.async_orchestrator or self.coordinator is not None or self.stage_scheduler is not None:
+            # Queued and run in parallel at the end of execute()
+            self.jobs.append(job)
+        else:
+            job["cycle_limit"] = self.get_cycle_limit(self.current_layer_name)
+            try:
+                results = run_commands(job["configuration"], job["commands"], self.session,
+                                       timeouts=self.timeouts, retries=self.retries,
+                                       cycle_limit=job["cycle_limit"])
+            except StageFailure as failure:
+                self.fail_job(job, failure)
+                return
+            self.complete_job(job, results)
+
+    def is_known_failure(self, failure):
+        """Return True if a cached failure still holds for the current configuration.
+
+        A dominated configuration is only skipped while the cycle limit of its layer is at
+        or below the one its simulation was aborted at; a looser limit runs it again.
+        """
+        if failure["kind"] != "dominated":
+            return True
+        cycle_limit = self.get_cycle_limit(self.current_layer_name)
+        return cycle_limit is not None and failure.get("cycle_limit") is not None and cycle_limit <= failure["cycle_limit"]
+
+    def fail_job(self, job, failure):
+        if failure.kind == "dominated":
+            print(f"Configuration {job['configuration']} aborted: {failure}")
+        else:
+            print(f"Configuration {job['configuration']} failed: {failure}")
+        # Transient failures are environment problems, not a property of the configuration
+        if self.results_cache is not None and not failure.transient:
+            self.results_cache.fail(job["key"], job["configuration"], failure)
+
+    def complete_job(self, job, results):
+        if self.results_cache is not None:
+            self.results_cache.complete(job["key"], job["configuration"], results)
+        self.finish_job(job, results)
+
+    def run_jobs(self):
+        """Run the queued jobs in a process pool, the asyncio orchestrator, the stage scheduler or the work queue.
+
+        Only this process writes the results CSV files, as the jobs complete. Jobs are
+        submitted as workers become free so that their cycle limits use the best results
+        known at that time.
+        """
+        if self.stage_scheduler is not None:
+            print(f"Scheduling {len(self.jobs)} configurations by stage")
+            self.stage_scheduler.run(self.jobs)
+            self.jobs = []
+            return
+        if self.coordinator is not None:
+            self.coordinator.run(self.jobs)
+            self.jobs = []
+            return
+        if self.async_orchestrator:
+            print(f"Running {len(self.jobs)} configurations in {self.jobs_count} asyncio slots")
+            AsyncOrchestrator(self).run(self.jobs)
+            self.jobs = []
+            return
+        print(f"Running {len(self.jobs)} configurations with {self.jobs_count} workers")
+        pending = list(reversed(self.jobs))
+        futures = {}
+        with ProcessPoolExecutor(max_workers=self.jobs_count, initializer=start_worker_session,
+                                 initargs=(self.toolchain_backend, self.toolchain_session, os.getpid())) as executor:
+            while pending or futures:
+                while pending and len(futures) < self.jobs_count:
+                    job = pending.pop()
+                    job["cycle_limit"] = self.get_cycle_limit(job["state"]["current_layer_name"])
+                    futures[executor.submit(run_job, job)] = job
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = futures.pop(future)
+                    try:
+                        staging_path = future.result()
+                    except StageFailure as failure:
+                        self.fail_job(job, failure)
+                        continue
+                    with open(staging_path, "r", encoding="UTF-8") as file:
+                        results = json.load(file)
+                    self.complete_job(job, results)
+                    os.remove(staging_path)
+        self.jobs = []
 
-            # Initialize values for CSV
-            simulation_cycles = None
-            total_power = None
-            available_area = None
-            utilization_area = None
-
-            for key, command in self.commands.items():
-                # Execute the command
-                subprocess.run(command, shell=True, stdout=output_file, stderr=output_file)
-
-                # Check specific conditions after certain commands
-                if key == "2-bambu":
-                    cycles = ""
-                    for runtime in open(f'output/{self.current_configuration}/bambu-log').readlines():
-                        if "Average execution" in runtime:
-                            cycles = [int(s) for s in runtime.split() if s.isdigit()][0]
-                    
-                    output_file.write("Average execution in cycles: {}\n".format(cycles))
-                    simulation_cycles = int(cycles)  # Store value for CSV
-                
-                elif key == "3-openroad":
-                    log_path_suffix = 'HLS_output/Synthesis/bash_flow/openroad/logs/nangate45/main_kernel/base/6_report.log'
-                    gds_path_suffix = 'HLS_output/Synthesis/bash_flow/openroad/results/nangate45/main_kernel/base/6_final.gds'
-                    log_file = f'output/{self.current_configuration}/' + log_path_suffix
-                    power_multiplier = 1
-                    for l in open(log_file, 'r').readlines():
-                        if ("Total" in l and "Group" not in l):
-                            total_power = float(l.split()[4]) * power_multiplier
-                        if ("Design area" in l):
-                            available_area = float(l.split()[2])
-                            utilization_area = float(l.split()[4].strip('%'))
-                    
-                    output_file.write('Optimized accelerator:\n')
-                    output_file.write('  total power consumption: {}W\n'.format(total_power))
-                    output_file.write('  available chip area: {} um^2\n'.format(available_area))
-                    output_file.write('  utilized chip area: {}%\n'.format(utilization_area))
-                
-                    self.record_results(simulation_cycles, total_power, available_area)
-
-                    # Path to the output folder
-                    output_folder = './output'
-                    # Construct the command to find and delete files and folders
-                    command = f"find {output_folder} -name '*{self.current_configuration}*' -exec rm -rf {{}} +"
-                    # Execute the command
-                    subprocess.run(command, shell=True, check=True)
-
-                            
     def docker_commands(self):
+        if self.frontend_reuse:
+            try:
+                self.prepare_frontend_artifacts()
+            except StageFailure as failure:
+                # Every configuration of the layer would fail the same way, so none is run or journaled
+                print(f"Skipping layer {self.current_layer_name}, its front-end artifacts failed: {failure}")
+                self.clear_candidates()
+                return
+        if self.joint:
+            candidates = self.joint_candidates
+        elif self.permute:
+            candidates = self.permutations_list
+        elif self.tile:
+            candidates = self.tiling_combinations
+        elif self.unroll:
+            candidates = self.unrolling_combinations
+        if self.surrogate is not None:
+            candidates = self.rank_candidates(candidates)
+        if self.multi_fidelity:
+            self.current_fidelity = "bambu"
+        if self.search == "exhaustive":
+            for candidate in candidates:
+                if self.is_dominated_candidate(candidate):
+                    print(f"Pruned dominated candidate: {candidate}")
+                    continue
+                self.evaluate_candidate(candidate)
+        else:
+            self.search_candidates(candidates)
+        if self.multi_fidelity:
+            if self.jobs:
+                self.run_jobs()
+            self.current_fidelity = "openroad"
+            for candidate in self.select_finalists(candidates):
+                self.evaluate_candidate(candidate)
+        self.clear_candidates()
+
+    def clear_candidates(self):
         if self.permute:
-            for permutation in self.permutations_list:
-                self.current_configuration = f"{self.model_name}_permute_{self.current_layer_name}_{''.join(map(str, permutation))}"
-                print("--------------------------------")
-                print(f"Confgiuration: {self.current_configuration}")
-                docker_perm_string = ','.join(map(str, permutation))  # String with commas for Docker command
-                actual_perm_string = self.permutation_mapping.get(docker_perm_string, docker_perm_string)  # Retrieve actual perm string
-                self.current_permutation = actual_perm_string
-                print(f"Current permutation: {self.current_permutation}")
-                self.create_docker_commands()
-                self.execute_commands()
-                self.current_permutation = None
             self.permutations_list = []
-            self.permutation_mapping = {}
-        elif self.tile:
-            for count, tile in enumerate(self.tiling_combinations):
-                self.current_configuration = f"{self.model_name}_tile_{self.current_layer_name}_{''.join(map(str, tile))}"
-                print("--------------------------------")
-                print(f"Confgiuration: {self.current_configuration}")
-                self.current_tiling_combination = tile
-                print(f"Current tiling combination: {self.current_tiling_combination}")
-                self.create_docker_commands()
-                self.execute_commands()
-                self.current_tiling_combination = None
+        if self.tile:
             self.tiling_combinations = []
-        elif self.unroll:
-            for count, unroll in enumerate(self.unrolling_combinations):
-                self.current_configuration = f"{self.model_name}_unroll_{self.current_layer_name}_unroll_{unroll[0]}_factor_{unroll[1]}"
-                print("--------------------------------")
-                print(f"Confgiuration: {self.current_configuration}")
-                self.current_unroll_combination = unroll
-                print(f"Current unroll combination: {self.current_unroll_combination}")
-                self.create_docker_commands()
-                self.execute_commands()
-                self.current_unroll_combination = None
+        if self.unroll:
             self.unrolling_combinations = []
+        if self.joint:
+            self.joint_candidates = []
+
+    def evaluate_candidate(self, candidate):
+        """Explore one permutation, tiling or unroll combination and return its configuration name."""
+        if self.joint:
+            suffixes = []
+            if "tile" in candidate:
+                self.current_tiling_combination = candidate["tile"]
+                suffixes.append('x'.join(map(str, candidate["tile"])))
+            if "permute" in candidate:
+                self.current_permutation = self.get_candidate_transform(candidate["permute"], "permute")
+                suffixes.append(''.join(map(str, candidate["permute"])))
+            if "unroll" in candidate:
+                self.current_unroll_combination = candidate["unroll"]
+                suffixes.append(f"unroll_{candidate['unroll'][0]}_factor_{candidate['unroll'][1]}")
+            self.current_configuration_suffix = '_'.join(suffixes)
+            self.current_configuration = self.get_configuration_name(self.current_layer_name)
+            print("--------------------------------")
+            print(f"Confgiuration: {self.current_configuration}")
+            print(f"Current transform recipe: {get_recipe_name(get_recipe(self.loop_optimizer, self.get_current_transform()))}")
+            self.create_docker_commands()
+            self.execute_commands()
+            for name in ["current_tiling_combination", "current_permutation", "current_unroll_combination"]:
+                if hasattr(self, name):
+                    setattr(self, name, None)
+        elif self.permute:
+            permutation = candidate
+            self.current_configuration_suffix = ''.join(map(str, permutation))
+            self.current_configuration = self.get_configuration_name(self.current_layer_name)
+            print("--------------------------------")
+            print(f"Confgiuration: {self.current_configuration}")
+            self.current_permutation = get_permutation_map(permutation)
+            print(f"Current permutation: {self.current_permutation}")
+            self.create_docker_commands()
+            self.execute_commands()
+            self.current_permutation = None
+        elif self.tile:
+            tile = candidate
+            self.current_configuration_suffix = 'x'.join(map(str, tile))
+            self.current_configuration = self.get_configuration_name(self.current_layer_name)
+            print("--------------------------------")
+            print(f"Confgiuration: {self.current_configuration}")
+            self.current_tiling_combination = tile
+            print(f"Current tiling combination: {self.current_tiling_combination}")
+            self.create_docker_commands()
+            self.execute_commands()
+            self.current_tiling_combination = None
+        elif self.unroll:
+            unroll = candidate
+            self.current_configuration_suffix = f"unroll_{unroll[0]}_factor_{unroll[1]}"
+            self.current_configuration = self.get_configuration_name(self.current_layer_name)
+            print("--------------------------------")
+            print(f"Confgiuration: {self.current_configuration}")
+            self.current_unroll_combination = unroll
+            print(f"Current unroll combination: {self.current_unroll_combination}")
+            self.create_docker_commands()
+            self.execute_commands()
+            self.current_unroll_combination = None
+        return self.current_configuration
+
+    def get_candidate_features(self, candidate, loop_optimizer=None):
+        """Return the feature vector the search strategies compare candidates with."""
+        loop_optimizer = loop_optimizer or self.loop_optimizer
+        if loop_optimizer == 'joint':
+            return [feature for name, step in candidate.items() for feature in self.get_candidate_features(step, name)]
+        elif loop_optimizer == 'tile':
+            return [np.log2(size + 1) for size in candidate]
+        elif loop_optimizer == 'unroll':
+            return [candidate[0], np.log2(candidate[1] + 1)]
+        return list(candidate)
+
+    def search_candidates(self, candidates):
+        """Evaluate at most search_budget candidates of the layer, chosen by the search strategy.
+
+        Candidates are proposed in batches of --jobs; queued jobs are run after each batch
+        so that the strategy learns from their results before proposing the next batch.
+        """
+        if not candidates:
+            return
+        strategy = search_strategies[self.search]([self.get_candidate_features(c) for c in candidates], self.search_seed)
+        budget = min(self.search_budget, len(candidates))
+        evaluated = 0
+        print(f"Searching {budget} of {len(candidates)} candidates with {self.search} search")
+        while evaluated < budget:
+            batch = strategy.propose(min(self.jobs_count, budget - evaluated))
+            if not batch:
+                break
+            for index in [index for index in batch if self.is_dominated_candidate(candidates[index])]:
+                # Pruned candidates do not use up the budget
+                print(f"Pruned dominated candidate: {candidates[index]}")
+                strategy.observe(index, math.inf)
+                batch.remove(index)
+            configurations = [self.evaluate_candidate(candidates[index]) for index in batch]
+            if self.jobs:
+                self.run_jobs()
+            for index, configuration in zip(batch, configurations):
+                strategy.observe(index, self.search_outcomes.pop(configuration, math.inf))
+            evaluated += len(batch)
+        best = strategy.get_best()
+        if best is not None:
+            print(f"Best candidate: {candidates[best]} ({self.search_objective} {strategy.observed[best]:.6g})")
+
+    def get_pareto_point(self, results, layer_name):
+        """Return the objectives of the current configuration for a layer of its group as record_results computes them."""
+        actual_simulation_cycles = results["simulation_cycles"] * self.layers[layer_name].no_of_tiles
+        runtime_in_s = actual_simulation_cycles / self.target_frequency
+        return {
+            "configuration": self.get_configuration_name(layer_name),
+            "transform": self.get_current_transform(),
+            "runtime_in_s": runtime_in_s,
+            "energy_consumed": results["total_power"] * runtime_in_s,
+            "area": results["available_area"],
+            "simulation_cycles": actual_simulation_cycles,
+            "total_power": results["total_power"]
+        }
+
+    def update_pareto_front(self, results):
+        """Add the current configuration to the front of every layer of its group and rewrite the front artifacts.
+
+        Each layer of the group has its own front, as its runtime and energy depend on its
+        number of tiles.
+        """
+        if results["total_power"] is None or results["available_area"] is None:
+            return
+        for layer_name in self.layer_groups[self.current_layer_name]:
+            point = self.get_pareto_point(results, layer_name)
+            if layer_name == self.current_layer_name:
+                self.evaluated_points.setdefault(layer_name, []).append(point)
+            front = self.pareto_fronts.setdefault(layer_name, ParetoFront())
+            if not front.add(point):
+                continue
+            print(f"Pareto front of {layer_name}: {len(front.points)} configurations")
+            front.write(os.path.join(pareto_directory, f"{self.model_name}_{layer_name}_{self.loop_optimizer}.csv"))
+
+    def select_finalists(self, candidates):
+        """Return the screened candidates worth running OpenROAD for.
+
+        A finalist has at most finalist_margin more Bambu cycles than the fastest screened
+        candidate, and no other candidate beats it in both cycles and area estimate.
+        Candidates without an area estimate are compared by cycles only.
+        """
+        screened = {}
+        for index, candidate in enumerate(candidates):
+            outcome = self.screening_results.pop((self.current_layer_name, json.dumps(self.get_candidate_transform(candidate))), None)
+            if outcome is not None:
+                screened[index] = outcome
+        def beats(first, second):
+            (first_cycles, first_area), (second_cycles, second_area) = first, second
+            if first_area is None or second_area is None:
+                return first_cycles < second_cycles
+            return first_cycles <= second_cycles and first_area <= second_area and \
+                (first_cycles < second_cycles or first_area < second_area)
+        if not screened:
+            return []
+        cycle_limit = min(cycles for cycles, _ in screened.values()) * (1 + self.finalist_margin)
+        finalists = [index for index, outcome in screened.items() if outcome[0] <= cycle_limit and
+                     not any(beats(other, outcome) for other in screened.values())]
+        print(f"Finalists for OpenROAD: {len(finalists)} promoted, {len(screened) - len(finalists)} of "
+              f"{len(screened)} screened candidates skipped")
+        return [candidates[index] for index in finalists]
+
+    def contains_unrolling(self, candidate, evaluated):
+        """Return True if the candidate unrolls at least every loop iteration the evaluated unroll combination does."""
+        if candidate[0] != evaluated[0]:
+            return candidate[0] > evaluated[0]
+        return candidate[1] == 0 or (evaluated[1] != 0 and candidate[1] >= evaluated[1])
+
+    def get_unrolled_iterations(self, loops, unroll):
+        """Return the iterations of the loop nest an unroll combination runs side by side.
+
+        The innermost loops are fully unrolled one after the other, the last of them by
+        the factor when there is one.
+        """
+        depth, factor = unroll
+        if depth == 0:
+            return 1
+        trip_counts = [loop["trip_count"] for loop in loops[-depth:]]
+        if factor != 0:
+            trip_counts[0] = min(trip_counts[0], factor)
+        return math.prod(trip_counts)
+
+    def is_dominated_candidate(self, candidate):
+        """Return True if a front point dominates the best outcome the candidate can reach.
+
+        Unrolling more is assumed to never shrink the area or the power, and to at most
+        speed up the layer by the growth of the iterations run side by side, read from the
+        trip counts of the loop nest of the layer. The optimistic bound of a candidate
+        containing an evaluated unroll combination therefore keeps its area and divides its
+        runtime and energy by that growth. Only unroll combinations are pruned.
+        """
+        front = self.pareto_fronts.get(self.current_layer_name)
+        if not self.pareto_prune or self.loop_optimizer != 'unroll' or front is None:
+            return False
+        _, loops = get_loop_nest(self.layers[self.current_layer_name].file_path)
+        for point in self.evaluated_points[self.current_layer_name]:
+            if not self.contains_unrolling(candidate, point["transform"]):
+                continue
+            growth = self.get_unrolled_iterations(loops, candidate) / self.get_unrolled_iterations(loops, point["transform"])
+            bound = {
+                "runtime_in_s": point["runtime_in_s"] / growth,
+                "energy_consumed": point["energy_consumed"] / growth,
+                "area": point["area"]
+            }
+            if front.dominates(bound):
+                return True
+        return False
+
+    def get_candidate_transform(self, candidate, loop_optimizer=None):
+        """Return the transform of a candidate in the form of get_current_transform()."""
+        loop_optimizer = loop_optimizer or self.loop_optimizer
+        if loop_optimizer == 'joint':
+            return {name: self.get_candidate_transform(step, name) for name, step in candidate.items()}
+        elif loop_optimizer == 'permute':
+            return get_permutation_map(candidate)
+        return list(candidate)
+
+    def rank_candidates(self, candidates):
+        """Return the surrogate_top_k candidates of the best predicted search objective, best first."""
+        current_layer = self.layers[self.current_layer_name]
+        signature = current_layer.get_signature()
+        transforms = [self.get_candidate_transform(candidate) for candidate in candidates]
+        predictions = self.surrogate.predict(signature[0], self.loop_optimizer, signature, transforms,
+                                             current_layer.flop_count, current_layer.no_of_tiles)
+        if predictions is None:
+            print(f"No surrogate training data for {signature[0]} {self.loop_optimizer}, exploring all candidates")
+            return candidates
+        ranking = sorted(range(len(candidates)), key=lambda index: self.get_search_objective(predictions[index]))
+        ranking = ranking[:self.surrogate_top_k]
+        for index in ranking:
+            self.surrogate_predictions[(self.current_layer_name, json.dumps(transforms[index]))] = predictions[index]
+        print(f"Surrogate selected {len(ranking)} of {len(candidates)} candidates")
+        return [candidates[index] for index in ranking]
+
+    def update_surrogate(self, results):
+        """Check the prediction of the current configuration and train the surrogate on its results."""
+        current_layer = self.layers[self.current_layer_name]
+        transform = self.get_current_transform()
+        prediction = self.surrogate_predictions.pop((self.current_layer_name, json.dumps(transform)), None)
+        if prediction is not None:
+            self.surrogate.record_error(prediction, results)
+        signature = current_layer.get_signature()
+        self.surrogate.add(signature[0], self.loop_optimizer, signature, transform,
+                           current_layer.flop_count, current_layer.no_of_tiles, results)
+
+    def get_search_objective(self, results):
+        actual_simulation_cycles = results["simulation_cycles"] * self.layers[self.current_layer_name].no_of_tiles
+        if self.search_objective == "energy":
+            return actual_simulation_cycles / self.target_frequency * results["total_power"]
+        return actual_simulation_cycles
   
     def get_permutations(self):
-        if self.current_layer_name.startswith("conv2d"):
-            mapping_csv_path = 'scripts/conv2d_mapping.csv'     ### Remove this when the mapping for permutation is corrected
-            # group1 = [1, 2, 3]
-            # group2 = [4, 6, 5]
-            # #for perm1 in permutations(group1):
-            # for perm1 in permutations(group1):
-            #     permutation = [0] + list(perm1) + list(group2)
-            #     self.permutations_list.append(permutation)
-            # # for perm2 in permutations(group2):
-            # #     for perm1 in permutations(group1):
-            # #         permutation = [0] + list(perm2) + list(perm1)
-            # #         self.permutations_list.append(permutation)
-            self.permutations_list.append([0,1,2,3,4,5,6])
-            self.permutations_list.append([0,2,1,3,5,6,4])
-        elif self.current_layer_name.startswith("depthwise_conv2d"):
-            mapping_csv_path = 'scripts/depthwise_conv2d_mapping.csv'   ### Remove this when the mapping for permutation is corrected
-            # Define the groups and generate all permutations
-            group1 = [1, 2, 3]
-            group2 = [4, 5]
-            for perm1 in permutations(group1):
-                for perm2 in permutations(group2):
-                    permutation = [0] + list(perm1) + list(perm2)
-                    self.permutations_list.append(permutation)
-            group1 = [3, 4, 5]
-            group2 = [1, 2]
-            for perm1 in permutations(group1):
-                for perm2 in permutations(group2):
-                    permutation = [0] + list(perm1) + list(perm2)
-                    self.permutations_list.append(permutation)
-                    
-        elif self.current_layer_name.startswith("matmul"):
-            mapping_csv_path = 'scripts/matmul_mapping.csv' ### Remove this when the mapping for permutation is corrected
-            group1 = [1, 2, 3]
-            for perm in permutations(group1):
-                permutation = [0] + list(perm)  # Add 0 at the beginning
-                self.permutations_list.append(permutation)
-        return mapping_csv_path ### Remove this when the mapping for permutation is corrected
-        
+        """Generate the distinct legal loop orders of the layer's linalg op."""
+        op_name, loops = get_loop_nest(self.layers[self.current_layer_name].file_path)
+        self.permutations_list = get_legal_permutations(loops, self.reorder_reductions)
+        print(f"Loop nest of {op_name}: {get_loop_nest_name(loops, range(len(loops)))}")
+        print(f"Legal permutations: {len(self.permutations_list)}")
+
     def perform_permutation(self):
-        mapping_csv_path = self.get_permutations() ### Remove mapping_csv_path when the mapping for permutation is corrected
-        ### Remove this when the mapping for permutation is corrected and use the permutations_list instead
-        # Read the mapping CSV file into a dictionary
-        with open(mapping_csv_path, mode='r', encoding='UTF-8') as mapping_file:
-            reader = csv.reader(mapping_file)
-            for row in reader:
-                docker_perm = row[0]
-                actual_perm = row[1]
-                if actual_perm:  # Only add if the actual permutation is not empty
-                    self.permutation_mapping[docker_perm] = actual_perm
+        self.get_permutations()
         self.docker_commands()
      
     def generate_tiling_combinations(self, tiling_dimensions_1, tiling_dimensions_2, tiling_dimensions_3):
@@ -532,15 +1157,22 @@ class DSE:
             output_tiles = tiling_dimensions_1
             kernel_tiles = tiling_dimensions_2
             input_channel_tiles = tiling_dimensions_3
-            self.tiling_combinations.append([1, 14, 14, 1, 3, 3, 16])
-            # for output in output_tiles:
-            #     for kernel in kernel_tiles:
-            #         if output>=kernel:
-            #             for input_channel in input_channel_tiles:
-            #                 tiling_combination_string = [current_layer.output_batch, output, output, current_layer.clipped_output_channel, 
-            #                                              kernel, kernel, input_channel]
-            #                 self.tiling_combinations.append(tiling_combination_string)
-            # self.tiling_combinations.pop(-1)
+            if self.search != "exhaustive":
+                # The search strategies explore the full space instead of the single fixed tile
+                if current_layer.clipped_output_channel is not None:
+                    output_channel = current_layer.clipped_output_channel
+                else:
+                    output_channel = current_layer.output_channel
+                for output in output_tiles:
+                    for kernel in kernel_tiles:
+                        if output>=kernel:
+                            for input_channel in input_channel_tiles:
+                                tiling_combination = [current_layer.output_batch, output, output, output_channel,
+                                                      kernel, kernel, input_channel]
+                                self.tiling_combinations.append(tiling_combination)
+                self.tiling_combinations.pop(-1)
+            else:
+                self.tiling_combinations.append([1, 14, 14, 1, 3, 3, 16])
             print(f"Tiling combinations: {self.tiling_combinations}")
         elif self.current_layer_name.startswith("depthwise_conv2d"):
             output_tiles = tiling_dimensions_1
@@ -560,13 +1192,15 @@ class DSE:
             output_width_tiles = tiling_dimensions_1
             output_height_tiles = tiling_dimensions_2
             kernel_width_tiles = tiling_dimensions_3
-            self.tiling_combinations.append([1, 1, 64, 16])          
-            # for output_width in output_width_tiles:
-            #     for output_height in output_height_tiles:
-            #         for kernel_width in kernel_width_tiles:
-            #             tiling_combination = [current_layer.output_batch, output_width, output_height, kernel_width]
-            #             self.tiling_combinations.append(tiling_combination)
-            # self.tiling_combinations.pop(-1)
+            if self.search != "exhaustive":
+                for output_width in output_width_tiles:
+                    for output_height in output_height_tiles:
+                        for kernel_width in kernel_width_tiles:
+                            tiling_combination = [current_layer.output_batch, output_width, output_height, kernel_width]
+                            self.tiling_combinations.append(tiling_combination)
+                self.tiling_combinations.pop(-1)
+            else:
+                self.tiling_combinations.append([1, 1, 64, 16])
             print(f"Tiling combinations: {self.tiling_combinations}")
     
     def get_tile_sizes(self, max_tile_size, is_kernel = False, min_power = 2):
@@ -627,6 +1261,7 @@ class DSE:
     
     def perform_tiling(self):
         self.get_tiling_combinations()
+        self.canonicalize_tiling_combinations()
         self.docker_commands()
 
     
@@ -659,18 +1294,21 @@ class DSE:
                 input_channel_unrolls = self.get_unroll_sizes(current_layer.clipped_input_channel)
             else:
                 input_channel_unrolls = self.get_unroll_sizes(current_layer.input_channel)
-            #self.generate_unrolling_combinations(input_channel_unrolls, kernel_unrolls, kernel_unrolls)  
-            self.unrolling_combinations.append((0,0))
-            self.unrolling_combinations.append((3,0))
+            if self.search != "exhaustive":
+                self.generate_unrolling_combinations(input_channel_unrolls, kernel_unrolls, kernel_unrolls)
+            else:
+                self.unrolling_combinations.append((0,0))
+                self.unrolling_combinations.append((3,0))
         elif self.current_layer_name.startswith("depthwise_conv2d"):
             kernel_unrolls = self.get_unroll_sizes(current_layer.kernel_height)
             if current_layer.clipped_input_channel is not None:
                 input_channel_unrolls = self.get_unroll_sizes(current_layer.clipped_input_channel)
             else:
                 input_channel_unrolls = self.get_unroll_sizes(current_layer.input_channel)
-            #self.generate_unrolling_combinations(kernel_unrolls, kernel_unrolls, input_channel_unrolls)
-            #self.unrolling_combinations.append((0,0))
-            self.unrolling_combinations.append((3,0))
+            if self.search != "exhaustive":
+                self.generate_unrolling_combinations(kernel_unrolls, kernel_unrolls, input_channel_unrolls)
+            else:
+                self.unrolling_combinations.append((3,0))
         elif self.current_layer_name.startswith("matmul"):
             if current_layer.clipped_output_width is not None:
                 output_width = current_layer.clipped_output_width
@@ -687,31 +1325,92 @@ class DSE:
             #output_width_unrolls = self.get_unroll_sizes(output_width)
             output_height_unrolls = self.get_unroll_sizes(output_height)
             kernel_width_unrolls = self.get_unroll_sizes(kernel_width)
-            #self.generate_unrolling_combinations(kernel_width_unrolls, output_height_unrolls)
-            self.unrolling_combinations.append((0,0))
-            self.unrolling_combinations.append((2,0))
+            if self.search != "exhaustive":
+                self.generate_unrolling_combinations(kernel_width_unrolls, output_height_unrolls)
+            else:
+                self.unrolling_combinations.append((0,0))
+                self.unrolling_combinations.append((2,0))
  
     def perform_unrolling(self):
         self.get_unrolling_combinations()
         self.docker_commands()
 
+    def perform_joint_exploration(self):
+        """Explore every combination of the tiling, permutation and unroll candidates of the layer."""
+        candidates = {}
+        if self.tile:
+            self.get_tiling_combinations()
+            self.canonicalize_tiling_combinations()
+            candidates["tile"] = self.tiling_combinations
+        if self.permute:
+            self.get_permutations()
+            candidates["permute"] = self.permutations_list
+        if self.unroll:
+            self.get_unrolling_combinations()
+            candidates["unroll"] = self.unrolling_combinations
+        self.joint_candidates = get_joint_candidates(candidates)
+        print(f"Joint combinations: {len(self.joint_candidates)}")
+        self.docker_commands()
+
+
+    def print_layer_name(self, layer_name):
+        print("===========================")
+        print(f"Layer name: {layer_name}")
+        if len(self.layer_groups[layer_name]) > 1:
+            print(f"Results shared with: {', '.join(self.layer_groups[layer_name][1:])}")
 
     def execute(self):
-        if self.permute:
-            for layer_name in self.layers.keys():
-                print("===========================")
-                print(f"Layer name: {layer_name}")
+        trace_start = time.time()
+        if self.jobs_count == 1 or self.stage_scheduler is not None:
+            self.session.start()
+        if self.coordinator is not None:
+            # Workers keep polling the queue between the batches of the whole run
+            self.coordinator.open()
+        try:
+            self.explore_layers()
+            if self.network_report is not None:
+                self.report_network()
+        finally:
+            if self.coordinator is not None:
+                self.coordinator.close()
+            # Tear down the serial session and any session left by a worker process
+            self.session.stop()
+            stop_sessions(os.getpid())
+            if self.results_store is not None:
+                self.results_store.close()
+            write_trace(self.model_name, trace_start)
+
+    def report_network(self):
+        """Roll the best configuration of every layer of the model up into a network report."""
+        if self.results_store is not None:
+            self.results_store.flush()
+            records = self.results_store.get_records(model_name=self.model_name)
+        else:
+            records = (record for file_path in sorted(glob.glob("results/*.csv")) for record in read_results_csv(file_path))
+        write_network_report(self.model_name, list(self.layers.keys()), records, self.network_report, self.area_budget)
+
+    def explore_layers(self):
+        if self.joint:
+            for layer_name in self.layer_groups.keys():
+                self.print_layer_name(layer_name)
+                self.current_layer_name = layer_name
+                self.perform_joint_exploration()
+        elif self.permute:
+            for layer_name in self.layer_groups.keys():
+                self.print_layer_name(layer_name)
                 self.current_layer_name = layer_name
                 self.perform_permutation()
         elif self.tile:
-            for layer_name in self.layers.keys():
-                print("===========================")
-                print(f"Layer name: {layer_name}")
+            for layer_name in self.layer_groups.keys():
+                self.print_layer_name(layer_name)
                 self.current_layer_name = layer_name
                 self.perform_tiling()
         elif self.unroll:
-            for layer_name in self.layers.keys():
-                print("===========================")
-                print(f"Layer name: {layer_name}")
+            for layer_name in self.layer_groups.keys():
+                self.print_layer_name(layer_name)
                 self.current_layer_name = layer_name
-                self.perform_unrolling()
\ No newline at end of file
+                self.perform_unrolling()
+        if self.jobs:
+            self.run_jobs()
+        if self.surrogate is not None:
+            self.surrogate.report_errors()
\ No newline at end of file
@@ -0,0 +1,167 @@
+import os
+import signal
+import asyncio
+from dse_worker import StageFailure, CycleCounter, get_stage_type, get_workspace, copy_inputs, \
+    get_log_follower, get_stage_cycle_limit, get_stage_environment, get_dominated_failure, get_timeout_failure, \
+    check_return_code, get_progress_path, get_empty_results, check_stage_inputs, get_retry_delay, \
+    record_stage_results, keep_failure_output, get_cleanup_command, default_timeouts, poll_interval
+from toolchain_session import ToolchainSession
+from stage_trace import StageSpan
+
+# Longest line read from the output of a stage
+line_limit = 1 << 20
+
+def kill_stage(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+async def run_stage(key, command, output_file, working_directory, timeout, follower, cycle_limit=None):
+    """Run one stage as a coroutine, parsing its output and log file while they are written.
+
+    The stage runs in its own process group, which is killed on timeout or, for the
+    Bambu stage, once the reported simulation cycles exceed cycle_limit. Exit codes are
+    handled as in dse_worker.run_stage. The log file is polled every poll_interval
+    rather than on every line of output.
+    """
+    cycle_limit = get_stage_cycle_limit(key, cycle_limit)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.STDOUT, cwd=working_directory,
+                                                    start_new_session=True, env=get_stage_environment(cycle_limit),
+                                                    limit=line_limit)
+    output = []
+    cycle_counter = CycleCounter()
+    cycles = 0
+    next_poll = loop.time() + poll_interval
+    try:
+        while True:
+            try:
+                line = await asyncio.wait_for(process.stdout.readline(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                line = None
+            if line == b"":
+                break
+            if line is not None:
+                line = line.decode(errors="replace")
+                output_file.write(line)
+                output.append(line)
+                cycles = cycle_counter.update(line)
+            if follower is not None and loop.time() >= next_poll:
+                follower.poll()
+                next_poll = loop.time() + poll_interval
+            if cycle_limit is not None and cycles > cycle_limit:
+                raise get_dominated_failure(key, cycle_limit)
+            if loop.time() > deadline:
+                raise get_timeout_failure(key, timeout)
+        return_code = await process.wait()
+    except (StageFailure, asyncio.CancelledError):
+        kill_stage(process)
+        await process.wait()
+        raise
+    if follower is not None:
+        follower.finish()
+    check_return_code(key, return_code, "".join(output))
+
+async def run_commands(configuration, commands, session, working_directory=".", timeouts=default_timeouts, retries=0,
+                       cycle_limit=None, keep_output=False):
+    """Coroutine version of dse_worker.run_commands.
+
+    With keep_output, the outputs of a successful run are kept for the stages that
+    follow in a later call.
+    """
+    txt_file_path = get_progress_path(configuration, working_directory)
+    results = get_empty_results()
+    try:
+        with open(txt_file_path, "a") as output_file:
+            for key, command in commands.items():
+                check_stage_inputs(key, configuration, working_directory)
+                command = session.get_command(key, command, working_directory)
+                for attempt in range(retries + 1):
+                    follower = get_log_follower(key, configuration, working_directory, session.backend)
+                    span = StageSpan(key, configuration, working_directory, attempt)
+                    try:
+                        await run_stage(key, span.get_command(command), output_file, working_directory,
+                                        timeouts[get_stage_type(key)], follower, cycle_limit)
+                        span.finish()
+                        break
+                    except StageFailure as failure:
+                        span.finish(failure.kind)
+                        await asyncio.sleep(get_retry_delay(failure, attempt, retries, output_file))
+
+                record_stage_results(key, follower, results, output_file, cycle_limit)
+    except BaseException as failure:
+        if isinstance(failure, StageFailure):
+            keep_failure_output(failure, configuration, txt_file_path)
+        keep_output = False
+        raise
+    finally:
+        if not keep_output:
+            process = await asyncio.create_subprocess_shell(get_cleanup_command(configuration, working_directory))
+            await process.wait()
+    return results
+
+class AsyncOrchestrator:
+    """Runs the queued jobs of a DSE as coroutines in the DSE process.
+
+    Each of the jobs_count slots runs one configuration at a time in its own workspace
+    (the working directory when there is a single slot). Finished configurations are
+    handed to a recorder coroutine, so that the results CSV files are written while the
+    next configurations already run.
+    """
+    def __init__(self, dse):
+        self.dse = dse
+        self.pending = None
+        self.finished = None
+
+    def run(self, jobs):
+        asyncio.run(self.run_jobs(jobs))
+
+    async def run_jobs(self, jobs):
+        self.pending = list(reversed(jobs))
+        self.finished = asyncio.Queue()
+        recorder = asyncio.create_task(self.record())
+        slots = [self.run_slot(slot) for slot in range(self.dse.jobs_count)]
+        try:
+            await asyncio.gather(*slots)
+        finally:
+            await self.finished.put(None)
+            await recorder
+
+    async def run_slot(self, slot):
+        if self.dse.jobs_count == 1:
+            working_directory = "."
+            session = self.dse.session
+        else:
+            working_directory = get_workspace(f"slot_{slot}")
+            session = ToolchainSession(self.dse.backend, self.dse.toolchain_session, os.getpid(), working_directory)
+            session.start()
+        try:
+            while self.pending:
+                job = self.pending.pop()
+                job["cycle_limit"] = self.dse.get_cycle_limit(job["state"]["current_layer_name"])
+                if working_directory != ".":
+                    copy_inputs(job["inputs"], working_directory)
+                try:
+                    results = await run_commands(job["configuration"], job["commands"], session, working_directory,
+                                                 job["timeouts"], job["retries"], job["cycle_limit"])
+                except StageFailure as failure:
+                    await self.finished.put((job, failure))
+                    continue
+                await self.finished.put((job, results))
+        finally:
+            if session is not self.dse.session:
+                session.stop()
+
+    async def record(self):
+        while True:
+            item = await self.finished.get()
+            if item is None:
+                return
+            job, outcome = item
+            if isinstance(outcome, StageFailure):
+                self.dse.fail_job(job, outcome)
+            else:
+                self.dse.complete_job(job, outcome)
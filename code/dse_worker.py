@@ -0,0 +1,381 @@
+import os
+import re
+import json
+import time
+import socket
+import signal
+import shutil
+import subprocess
+from toolchain_session import ToolchainSession
+from toolchain_backend import toolchain_backends
+from stage_trace import StageSpan
+
+workspaces_directory = "workspaces"
+failures_directory = "failures"
+
+# Toolchain session of this worker process, started by the process pool initializer
+worker_session = None
+
+# Default wall-clock timeouts in seconds per type of stage
+default_timeouts = {"frontend": 3600, "bambu": 4 * 3600, "openroad": 8 * 3600}
+
+# Failure kind of a stage that exits with an error or does not produce its results
+failure_kinds = {"frontend": "frontend_error", "bambu": "hls_error", "openroad": "pnr_failure"}
+
+# Tool output of failures caused by the environment rather than by the configuration
+transient_errors = ["Cannot connect to the Docker daemon", "Error response from daemon",
+                    "connection reset by peer", "TLS handshake timeout", "Resource temporarily unavailable"]
+
+retry_delay = 10
+
+# Seconds between checks of a running stage
+poll_interval = 1
+
+# Cycle counts reported by the Bambu simulation while it runs and when it ends
+simulation_cycles_pattern = re.compile(r'(\d+) cycles')
+
+class StageFailure(Exception):
+    """A stage of a configuration failed, classified as one of the failure kinds.
+
+    Dominated failures carry the cycle limit the simulation was aborted at.
+    """
+    def __init__(self, kind, stage, message, transient=False, cycle_limit=None):
+        super().__init__(kind, stage, message, transient, cycle_limit)
+        self.kind = kind
+        self.stage = stage
+        self.message = message
+        self.transient = transient
+        self.cycle_limit = cycle_limit
+
+    def __str__(self):
+        return f"{self.kind} in {self.stage}: {self.message}"
+
+def get_stage_type(key):
+    if key.startswith("1"):
+        return "frontend"
+    elif key == "2-bambu":
+        return "bambu"
+    return "openroad"
+
+def get_workspace(name=None):
+    """Return the private workspace of the current worker process, creating it if needed."""
+    if name is None:
+        # Workers on several hosts may share the filesystem
+        name = f"worker_{socket.gethostname()}_{os.getpid()}"
+    workspace = os.path.join(workspaces_directory, name)
+    for directory in ["output", "results"]:
+        directory = os.path.join(workspace, directory)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+    # The tool scripts are shared, only their outputs are private
+    scripts_link = os.path.join(workspace, "scripts")
+    if not os.path.exists(scripts_link) and os.path.isdir("scripts"):
+        os.symlink(os.path.abspath("scripts"), scripts_link)
+    return workspace
+
+def copy_inputs(inputs, workspace):
+    """Copy the input files of a job into the workspace, keeping their relative paths."""
+    for input_path in inputs:
+        workspace_path = os.path.join(workspace, input_path)
+        directory = os.path.dirname(workspace_path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        shutil.copyfile(input_path, workspace_path)
+
+def parse_bambu_line(line, report):
+    """Update the report dict with the simulation cycles and area estimate found in a line of bambu-log."""
+    if "Average execution" in line:
+        report["simulation_cycles"] = [int(s) for s in line.split() if s.isdigit()][0]
+    if "Total estimated area:" in line:
+        report["bambu_area"] = float(line.split(":")[1].split()[0])
+
+def parse_openroad_line(line, report):
+    """Update the report dict with the power and area found in a line of 6_report.log."""
+    power_multiplier = 1
+    if ("Total" in line and "Group" not in line):
+        report["total_power"] = float(line.split()[4]) * power_multiplier
+    if ("Design area" in line):
+        report["available_area"] = float(line.split()[2])
+        report["utilization_area"] = float(line.split()[4].strip('%'))
+
+def check_bambu_report(report):
+    if "simulation_cycles" not in report:
+        raise StageFailure("hls_error", "2-bambu", "no average execution cycles in bambu-log")
+    return int(report["simulation_cycles"])
+
+def check_openroad_report(report):
+    if "total_power" not in report or "available_area" not in report:
+        raise StageFailure("pnr_failure", "3-openroad", "no power or area in 6_report.log")
+    return report["total_power"], report["available_area"], report["utilization_area"]
+
+class LogFollower:
+    """Parses the lines appended to a log file since the last poll into a report, as the file is written."""
+    def __init__(self, file_path, parse_line):
+        self.file_path = file_path
+        self.parse_line = parse_line
+        self.report = {}
+        self.offset = 0
+        self.partial_line = ""
+
+    def poll(self):
+        if not os.path.exists(self.file_path):
+            return
+        with open(self.file_path, "r", errors="replace") as file:
+            file.seek(self.offset)
+            data = file.read()
+            self.offset = file.tell()
+        lines = (self.partial_line + data).split("\n")
+        # The last line may still be written
+        self.partial_line = lines.pop()
+        for line in lines:
+            self.parse_line(line, self.report)
+
+    def finish(self):
+        self.poll()
+        if self.partial_line:
+            self.parse_line(self.partial_line, self.report)
+            self.partial_line = ""
+
+def get_log_follower(key, configuration, working_directory, backend):
+    """Return the follower of the log the results of a stage are read from, or None."""
+    if key == "2-bambu":
+        return LogFollower(backend.get_bambu_log_path(configuration, working_directory), parse_bambu_line)
+    elif key == "3-openroad":
+        return LogFollower(backend.get_openroad_report_path(configuration, working_directory), parse_openroad_line)
+    return None
+
+def start_worker_session(backend_name, persistent, owner):
+    """Process pool initializer starting the toolchain session of the worker.
+
+    Worker processes exit without running atexit handlers, the parent removes their
+    containers by owner label at the end of DSE.execute().
+    """
+    global worker_session
+    worker_session = ToolchainSession(toolchain_backends[backend_name](), persistent, owner, get_workspace())
+    worker_session.start()
+
+def get_reported_cycles(output):
+    cycles = [int(count) for count in simulation_cycles_pattern.findall(output)]
+    return max(cycles) if cycles else 0
+
+class CycleCounter:
+    """Largest simulation cycle count reported in the output of a stage, fed as it is read.
+
+    Only the new output and the unfinished line before it are scanned, a count may be
+    split between two reads.
+    """
+    def __init__(self):
+        self.cycles = 0
+        self.partial_line = ""
+
+    def update(self, data):
+        lines = (self.partial_line + data).split("\n")
+        self.partial_line = lines.pop()
+        for line in lines:
+            self.cycles = max(self.cycles, get_reported_cycles(line))
+        return max(self.cycles, get_reported_cycles(self.partial_line))
+
+# Stage helpers shared by run_commands and the coroutine version in dse_async, which only
+# differ in how they start and wait for the stage processes
+
+def get_stage_cycle_limit(key, cycle_limit):
+    """Return the cycle limit of a stage, only the Bambu simulation has one."""
+    return cycle_limit if get_stage_type(key) == "bambu" else None
+
+def get_stage_environment(cycle_limit):
+    """Return the environment of a stage with its cycle limit as DSE_MAX_SIM_CYCLES.
+
+    The native and mock backends pass the limit on to the simulation, the run-bambu.sh
+    script of the Docker backend is not part of this tree and may ignore it. The limit
+    is always enforced by watching the cycle counts the stage prints, see run_stage.
+    """
+    environment = dict(os.environ)
+    if cycle_limit is not None:
+        environment["DSE_MAX_SIM_CYCLES"] = str(cycle_limit)
+    return environment
+
+def get_dominated_failure(key, cycle_limit):
+    return StageFailure("dominated", key, f"exceeded {cycle_limit} simulation cycles", cycle_limit=cycle_limit)
+
+def get_timeout_failure(key, timeout):
+    stage_type = get_stage_type(key)
+    if stage_type == "bambu":
+        return StageFailure("simulation_timeout", key, f"timed out after {timeout} s")
+    return StageFailure(failure_kinds[stage_type], key, f"timed out after {timeout} s")
+
+def check_return_code(key, return_code, output):
+    """Raise the failure of a stage that exited with an error, transient if its output shows an environment error."""
+    if return_code != 0:
+        transient = any(error in output for error in transient_errors)
+        raise StageFailure(failure_kinds[get_stage_type(key)], key, f"exit code {return_code}", transient=transient)
+
+def get_progress_path(configuration, working_directory):
+    """Return the progress file of a configuration, creating its folder if needed.
+
+    The file is opened for appending, so that stages run by separate calls, as with the
+    stage scheduler, write to one file until the outputs of the configuration are removed.
+    """
+    txt_file_path = os.path.join(working_directory, f"output/progress-{configuration}.txt")
+    directory = os.path.dirname(txt_file_path)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    return txt_file_path
+
+def get_empty_results():
+    return {
+        "simulation_cycles": None,
+        "total_power": None,
+        "available_area": None,
+        "bambu_area": None
+    }
+
+def check_stage_inputs(key, configuration, working_directory):
+    if key == "2-bambu":
+        ll_file = os.path.join(working_directory, f"output/05{configuration}.ll")
+        if not os.path.exists(ll_file) or os.path.getsize(ll_file) == 0:
+            raise StageFailure("frontend_error", "1e-soda", "no LLVM IR was generated")
+
+def get_retry_delay(failure, attempt, retries, output_file):
+    """Return the seconds to wait before retrying a failed attempt of a stage, or raise the failure."""
+    if not failure.transient or attempt == retries:
+        output_file.write(f"Failed: {failure}\n")
+        raise failure
+    output_file.write(f"Retrying after transient failure: {failure}\n")
+    return retry_delay * (attempt + 1)
+
+def record_stage_results(key, follower, results, output_file, cycle_limit):
+    """Check the report parsed from the log of a finished stage and add it to the results."""
+    if key == "2-bambu":
+        if not os.path.exists(follower.file_path):
+            raise StageFailure("hls_error", key, "bambu-log was not written")
+        cycles = check_bambu_report(follower.report)
+        if cycle_limit is not None and cycles > cycle_limit:
+            raise StageFailure("dominated", key, f"{cycles} of at most {cycle_limit} simulation cycles",
+                               cycle_limit=cycle_limit)
+        output_file.write("Average execution in cycles: {}\n".format(cycles))
+        results["simulation_cycles"] = cycles
+        results["bambu_area"] = follower.report.get("bambu_area")
+
+    elif key == "3-openroad":
+        if not os.path.exists(follower.file_path):
+            raise StageFailure("pnr_failure", key, "6_report.log was not written")
+        total_power, available_area, utilization_area = check_openroad_report(follower.report)
+        output_file.write('Optimized accelerator:\n')
+        output_file.write('  total power consumption: {}W\n'.format(total_power))
+        output_file.write('  available chip area: {} um^2\n'.format(available_area))
+        output_file.write('  utilized chip area: {}%\n'.format(utilization_area))
+        results["total_power"] = total_power
+        results["available_area"] = available_area
+
+def keep_failure_output(failure, configuration, txt_file_path):
+    """Keep the tool output of failed configurations, their output folder is cleaned up."""
+    if failure.kind == "dominated":
+        return
+    if not os.path.exists(failures_directory):
+        os.makedirs(failures_directory)
+    shutil.copyfile(txt_file_path, os.path.join(failures_directory, f"progress-{configuration}.txt"))
+
+def get_cleanup_command(configuration, working_directory):
+    """Return the command deleting the output files and folders of a configuration."""
+    output_folder = os.path.join(working_directory, "output")
+    return f"find {output_folder} -name '*{configuration}*' -exec rm -rf {{}} +"
+
+def run_stage(key, command, txt_file_path, output_file, working_directory, timeout, follower, cycle_limit=None):
+    """Run one stage in its own process group, killing the whole group on timeout.
+
+    With a cycle_limit, the Bambu stage is also killed as soon as its output reports
+    more simulation cycles; a configuration tying the limit runs to completion. The follower parses the log of the stage while
+    it runs. Any other non-zero exit code fails the stage; the command runs under
+    stage_trace.py, with pipefail, so a tool piped into tee cannot hide its exit code.
+    """
+    cycle_limit = get_stage_cycle_limit(key, cycle_limit)
+    output_file.flush()
+    output_start = os.path.getsize(txt_file_path)
+    start_time = time.monotonic()
+    process = subprocess.Popen(command, shell=True, stdout=output_file, stderr=output_file,
+                               cwd=working_directory, start_new_session=True, env=get_stage_environment(cycle_limit))
+    cycle_counter = CycleCounter()
+    with open(txt_file_path, "r", errors="replace") as progress_file:
+        progress_file.seek(output_start)
+        output = []
+        while True:
+            try:
+                return_code = process.wait(timeout=poll_interval)
+            except subprocess.TimeoutExpired:
+                return_code = None
+            output.append(progress_file.read())
+            cycles = cycle_counter.update(output[-1])
+            if follower is not None:
+                follower.poll()
+            if cycle_limit is not None and cycles > cycle_limit:
+                if return_code is None:
+                    os.killpg(process.pid, signal.SIGKILL)
+                    process.wait()
+                raise get_dominated_failure(key, cycle_limit)
+            if return_code is not None:
+                break
+            if time.monotonic() - start_time > timeout:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+                raise get_timeout_failure(key, timeout)
+    if follower is not None:
+        follower.finish()
+    check_return_code(key, return_code, "".join(output))
+
+def run_stage_attempts(key, command, configuration, txt_file_path, output_file, working_directory, timeout, retries,
+                       backend, cycle_limit=None):
+    """Run a stage, retrying transient failures, with a trace span per attempt, and return its log follower."""
+    for attempt in range(retries + 1):
+        follower = get_log_follower(key, configuration, working_directory, backend)
+        span = StageSpan(key, configuration, working_directory, attempt)
+        try:
+            run_stage(key, span.get_command(command), txt_file_path, output_file, working_directory, timeout,
+                      follower, cycle_limit)
+            span.finish()
+            return follower
+        except StageFailure as failure:
+            span.finish(failure.kind)
+            time.sleep(get_retry_delay(failure, attempt, retries, output_file))
+
+def run_commands(configuration, commands, session, working_directory=".", timeouts=default_timeouts, retries=0,
+                 cycle_limit=None):
+    """Run the tool commands of a configuration and return its measured results.
+
+    Raises StageFailure when a stage times out or does not produce its results. Stages
+    failing with a transient error are retried up to retries times. A configuration
+    whose simulation exceeds cycle_limit is aborted before OpenROAD as "dominated".
+    """
+    txt_file_path = get_progress_path(configuration, working_directory)
+    results = get_empty_results()
+    try:
+        with open(txt_file_path, "a") as output_file:
+            for key, command in commands.items():
+                check_stage_inputs(key, configuration, working_directory)
+                # Execute the command
+                command = session.get_command(key, command, working_directory)
+                follower = run_stage_attempts(key, command, configuration, txt_file_path, output_file, working_directory,
+                                              timeouts[get_stage_type(key)], retries, session.backend, cycle_limit)
+
+                # Check specific conditions after certain commands
+                record_stage_results(key, follower, results, output_file, cycle_limit)
+    except StageFailure as failure:
+        keep_failure_output(failure, configuration, txt_file_path)
+        raise
+    finally:
+        subprocess.run(get_cleanup_command(configuration, working_directory), shell=True, check=True)
+    return results
+
+def run_job(job):
+    """Run a job in the private workspace of this worker process.
+
+    The results are staged as JSON in the workspace so that only the parent process
+    merges them into the results CSV files.
+    """
+    workspace = get_workspace()
+    copy_inputs(job["inputs"], workspace)
+    results = run_commands(job["configuration"], job["commands"], worker_session, workspace,
+                           job["timeouts"], job["retries"], job["cycle_limit"])
+    staging_path = os.path.join(workspace, "results", f"{job['configuration']}.json")
+    with open(staging_path, "w", encoding="UTF-8") as file:
+        json.dump(results, file)
+    return staging_path
@@ -43,7 +43,8 @@ class FullyConnected:
 
         self.no_of_tiles = 1
 
-        if self.tile or self.permute:
+        # Unrolled designs grow the most, so joint explorations with unrolling use its clipping
+        if (self.tile or self.permute) and not self.unroll:
             if self.output_width > 128:
                 factors = self.get_factors(self.output_width)
                 factors_list = [factor for factor in factors if factor <= 128]
@@ -93,6 +94,38 @@ class FullyConnected:
                 print(f"FullyConnected: Clipped kernel width to {self.clipped_kernel_width} due to kernel_width > 32")
                 print(f"FullyConnected: Clipped input height to {self.clipped_input_height} due to input_height > 32")
                 self.no_of_tiles *= self.kernel_width/self.clipped_kernel_width
+
+    def get_signature(self):
+        """Return the shape signature of the implemented (clipped) layer."""
+        if self.clipped_output_width is not None:
+            output_width = self.clipped_output_width
+        else:
+            output_width = self.output_width
+        if self.clipped_output_height is not None:
+            output_height = self.clipped_output_height
+        else:
+            output_height = self.output_height
+        if self.clipped_kernel_width is not None:
+            kernel_width = self.clipped_kernel_width
+        else:
+            kernel_width = self.kernel_width
+        if self.clipped_kernel_height is not None:
+            kernel_height = self.clipped_kernel_height
+        else:
+            kernel_height = self.kernel_height
+        if self.clipped_input_width is not None:
+            input_width = self.clipped_input_width
+        else:
+            input_width = self.input_width
+        if self.clipped_input_height is not None:
+            input_height = self.clipped_input_height
+        else:
+            input_height = self.input_height
+        return ("matmul",
+                self.input_batch, input_width, input_height,
+                self.kernel_batch, kernel_width, kernel_height,
+                self.output_batch, output_width, output_height)
+
     def get_factors(self, n):
         """Return the factors of n."""
         factors = []
@@ -0,0 +1,152 @@
+import re
+from itertools import permutations, product
+
+linalg_line_pattern = re.compile(r'linalg\.(\w+)')
+memref_pattern = re.compile(r'memref<([0-9x]+)xf32>')
+
+# Loops of the linalg named ops the layer files use, from outermost to innermost, and the
+# loops indexing each dimension of their input, filter and output operands
+linalg_ops = {
+    "conv_2d_nhwc_hwcf": (["n", "oh", "ow", "f", "kh", "kw", "c"], [
+        [["n"], ["oh", "kh"], ["ow", "kw"], ["c"]],
+        [["kh"], ["kw"], ["c"], ["f"]],
+        [["n"], ["oh"], ["ow"], ["f"]]
+    ]),
+    "depthwise_conv_2d_nhwc_hwc": (["n", "oh", "ow", "c", "kh", "kw"], [
+        [["n"], ["oh", "kh"], ["ow", "kw"], ["c"]],
+        [["kh"], ["kw"], ["c"]],
+        [["n"], ["oh"], ["ow"], ["c"]]
+    ]),
+    "batch_matmul": (["b", "m", "n", "k"], [
+        [["b"], ["m"], ["k"]],
+        [["b"], ["k"], ["n"]],
+        [["b"], ["m"], ["n"]]
+    ])
+}
+
+operand_names = ["input", "filter", "output"]
+
+def read_linalg_op(file_path):
+    """Return the name and the input, filter and output shapes of the linalg op of a layer file."""
+    with open(file_path, 'r', encoding='UTF-8') as file:
+        for line in file:
+            match = linalg_line_pattern.search(line)
+            if match:
+                shapes = [[int(size) for size in shape.split("x")] for shape in memref_pattern.findall(line)]
+                return match.group(1), shapes
+    raise ValueError(f"No linalg op in {file_path}")
+
+def get_loop_nest(file_path):
+    """Return the loops of the linalg op of a layer file, from outermost to innermost.
+
+    Each loop has its iterator type, a reduction if it does not index the output, its trip
+    count, read from the operand dimension it indexes alone, and its role: the operands it
+    indexes and whether it shares their dimensions with other loops.
+    """
+    op_name, shapes = read_linalg_op(file_path)
+    if op_name not in linalg_ops:
+        raise ValueError(f"Unsupported linalg op {op_name}")
+    loop_names, indexing_maps = linalg_ops[op_name]
+    loops = []
+    for name in loop_names:
+        trip_count = None
+        role = []
+        for operand_name, indexing_map, shape in zip(operand_names, indexing_maps, shapes):
+            for dimension, size in zip(indexing_map, shape):
+                if name not in dimension:
+                    continue
+                role.append((operand_name, len(dimension)))
+                if len(dimension) == 1 and trip_count is None:
+                    trip_count = size
+        loops.append({
+            "name": name,
+            "iterator_type": "parallel" if any(name in dimension for dimension in indexing_maps[2]) else "reduction",
+            "trip_count": trip_count,
+            "role": tuple(role)
+        })
+    return op_name, loops
+
+def get_dependence_vectors(loops, reorder_reductions=False):
+    """Return the direction vectors of the dependences of the loop nest, in the original loop order.
+
+    Only the output is written, and it is read and written again by every iteration that
+    only differs in the reduction loops. Loops of trip count 1 carry no dependence. With
+    reorder_reductions, the accumulation is treated as associative and carries none either.
+    """
+    if reorder_reductions:
+        return []
+    carrying = [index for index, loop in enumerate(loops) if loop["iterator_type"] == "reduction" and loop["trip_count"] > 1]
+    vectors = []
+    for directions in product([-1, 0, 1], repeat=len(carrying)):
+        vector = [0] * len(loops)
+        for index, direction in zip(carrying, directions):
+            vector[index] = direction
+        if is_lexicographically_positive(vector):
+            vectors.append(vector)
+    return vectors
+
+def is_lexicographically_positive(vector):
+    for direction in vector:
+        if direction != 0:
+            return direction > 0
+    return False
+
+def is_legal(order, vectors):
+    """Return True if the loop order, a list of original loop indices from outermost to innermost, keeps every dependence."""
+    return all(is_lexicographically_positive([vector[index] for index in order]) for vector in vectors)
+
+def is_canonical(order, loops):
+    """Return True if interchangeable loops, of the same trip count, iterator type and role, keep their original order.
+
+    Swapping interchangeable loops, such as the kernel loops of a square kernel, gives the same hardware.
+    """
+    seen = {}
+    for index in order:
+        loop = loops[index]
+        key = (loop["trip_count"], loop["iterator_type"], loop["role"])
+        if key in seen and seen[key] > index:
+            return False
+        seen[key] = index
+    return True
+
+def get_legal_permutations(loops, reorder_reductions=False):
+    """Return the distinct legal loop orders of the nest, the original order first.
+
+    Loops of trip count 1 keep their position, as moving them does not change the hardware.
+    """
+    vectors = get_dependence_vectors(loops, reorder_reductions)
+    moving = [index for index, loop in enumerate(loops) if loop["trip_count"] > 1]
+    orders = []
+    for moved in permutations(moving):
+        order = list(range(len(loops)))
+        for position, index in zip(moving, moved):
+            order[position] = index
+        if is_legal(order, vectors) and is_canonical(order, loops):
+            orders.append(order)
+    return orders
+
+def canonicalize_tile_sizes(tile_sizes, loops):
+    """Return the tile sizes giving the same affine code as the given ones, clamped to the loop extents.
+
+    A tile at or above the extent of its loop, such as any tile of a loop of trip count 1,
+    leaves that loop untiled. If no loop is tiled, the canonical tile sizes are all 0,
+    the untiled nest.
+    """
+    canonical = [min(size, loop["trip_count"]) for size, loop in zip(tile_sizes, loops)]
+    if all(size == 0 or size == loop["trip_count"] for size, loop in zip(canonical, loops)):
+        return [0] * len(canonical)
+    return canonical
+
+def get_permutation_map(order):
+    """Return the permutation-map of -test-loop-permutation for a loop order.
+
+    The pass moves the loop at position i of the nest to position permutation-map[i],
+    which is the inverse of the order.
+    """
+    permutation_map = [0] * len(order)
+    for position, index in enumerate(order):
+        permutation_map[index] = position
+    return ",".join(str(position) for position in permutation_map)
+
+def get_loop_nest_name(loops, order):
+    return " ".join(f"{loops[index]['name']}={loops[index]['trip_count']}" for index in order)
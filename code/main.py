@@ -3,11 +3,14 @@ from parse_arguments import parse_arguments
 from read_mlir import read_file
 from create_mlir_files import MlirFiles
 from design_space_exploration import DSE
+from work_queue import run_worker
 
 def main():
     args = parse_arguments()
     print(args)
-    if args.read_mlir is not None:
+    if args.worker is not None:
+        run_worker(args.worker, args.toolchain_backend, args.toolchain_session, args.lease)
+    elif args.read_mlir is not None:
         path = Path(args.read_mlir)
         if path.exists():
             layers = read_file(args)
@@ -0,0 +1,160 @@
+import os
+import csv
+import glob
+import json
+import argparse
+import itertools
+import numpy as np
+from results_csv import read_results_csv, read_optional_float
+from results_store import ResultsStore
+
+# Clock the derived metrics of the results rows are computed at by default
+reference_frequency = 100e6
+giga_multiplier = 1e9
+
+# Raw measurements of a results row, and the metrics derived from them for a clock
+raw_columns = ["simulation_cycles", "total_power", "area", "number_of_tiles", "flop_count"]
+derived_columns = ["runtime_in_s", "gflops", "gflops_per_watt", "energy_consumed"]
+
+# Decimals the derived columns are written with
+derived_decimals = {
+    "runtime_in_s": 6,
+    "gflops": 6,
+    "gflops_per_watt": 6,
+    "energy_consumed": 12
+}
+
+# How the power reported by OpenROAD changes with the operating point: held as measured at
+# every clock and voltage, or scaled as dynamic power, linearly with the clock and
+# quadratically with the voltage scale
+power_models = ["measured", "dynamic"]
+
+def get_measurements(records):
+    """Return the raw measurements of results records as arrays, NaN where a row has none.
+
+    Only the raw columns are read; the derived columns of the rows are ignored.
+    """
+    return {
+        "simulation_cycles": np.array([float(record["row"]["simulation_cycles"]) for record in records]),
+        "total_power": np.array([read_optional_float(record["row"], "total_power") for record in records], dtype=float),
+        "area": np.array([read_optional_float(record["row"], "area") for record in records], dtype=float),
+        "number_of_tiles": np.array([record["number_of_tiles"] for record in records], dtype=float),
+        "flop_count": np.array([record["flop_count"] for record in records], dtype=float)
+    }
+
+def compute_metrics(measurements, operating_points, power_model="measured"):
+    """Return the derived metrics of every row at every operating point, as arrays of shape (operating points, rows).
+
+    An operating point is a (frequency in Hz, voltage scale) pair. The measured power model
+    uses the reported power as is, so only the runtime depends on the operating point; the
+    dynamic model multiplies it by frequency / reference frequency * voltage scale ** 2.
+    The simulation cycles are those of the whole layer,
+    so the runtime is cycles / frequency. Whether a design closes timing at a frequency is
+    not checked.
+    """
+    frequencies = np.array([frequency for frequency, _ in operating_points], dtype=float)[:, np.newaxis]
+    voltage_scales = np.array([voltage_scale for _, voltage_scale in operating_points], dtype=float)[:, np.newaxis]
+    runtime_in_s = measurements["simulation_cycles"] / frequencies
+    total_power = measurements["total_power"] * np.ones_like(frequencies)
+    if power_model == "dynamic":
+        total_power = total_power * frequencies / reference_frequency * voltage_scales ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gflops = measurements["flop_count"] / runtime_in_s / giga_multiplier
+        gflops_per_watt = gflops / total_power
+    return {
+        "frequency": np.broadcast_to(frequencies, runtime_in_s.shape),
+        "voltage_scale": np.broadcast_to(voltage_scales, runtime_in_s.shape),
+        "total_power": np.broadcast_to(total_power, runtime_in_s.shape),
+        "runtime_in_s": runtime_in_s,
+        "gflops": gflops,
+        "gflops_per_watt": gflops_per_watt,
+        "energy_consumed": total_power * runtime_in_s
+    }
+
+def round_metric(column, value):
+    value = float(value)
+    return round(value, derived_decimals[column]) if np.isfinite(value) else None
+
+def derive_metrics(flop_count, simulation_cycles, total_power, frequency=reference_frequency):
+    """Return the derived columns of one results row as written to the results CSV files.
+
+    The metrics are computed from the exact runtime and rounded only when returned.
+    """
+    measurements = {
+        "simulation_cycles": np.array([simulation_cycles], dtype=float),
+        "total_power": np.array([total_power], dtype=float),
+        "flop_count": np.array([flop_count], dtype=float)
+    }
+    metrics = compute_metrics(measurements, [(frequency, 1)])
+    return {column: round_metric(column, metrics[column][0, 0]) for column in derived_columns}
+
+def write_metrics_csv(records, measurements, metrics, file_path):
+    """Write one row per results row and operating point with the raw measurements and the recomputed metrics."""
+    directory = os.path.dirname(file_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    header = ["configuration", "loop_optimizer", "transform", "fidelity", "frequency_mhz", "voltage_scale"] + \
+        raw_columns + derived_columns
+    with open(file_path, 'w', newline='', encoding='UTF-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        for point in range(metrics["frequency"].shape[0]):
+            for index, record in enumerate(records):
+                raw = [measurements[column][index] for column in raw_columns]
+                row = [record["configuration"], record["loop_optimizer"], json.dumps(record["transform"]), record["fidelity"],
+                       metrics["frequency"][point, index] / 1e6, metrics["voltage_scale"][point, index]]
+                row += ["" if np.isnan(value) else value.item() for value in raw]
+                row += [round_metric(column, metrics[column][point, index]) for column in derived_columns]
+                writer.writerow(row)
+
+def get_store_metrics(records, metrics, power_model):
+    """Return the recomputed metrics of records read from a results store as rows of ResultsStore.add_metrics."""
+    rows = []
+    for point in range(metrics["frequency"].shape[0]):
+        for index, record in enumerate(records):
+            rows.append((record["result_id"], float(metrics["frequency"][point, index]), float(metrics["voltage_scale"][point, index]),
+                         power_model) + tuple(round_metric(column, metrics[column][point, index]) for column in derived_columns))
+    return rows
+
+def print_best(records, metrics, metric):
+    """Print the best configuration at every operating point by a metric."""
+    maximized = metric in ["gflops", "gflops_per_watt"]
+    for point in range(metrics["frequency"].shape[0]):
+        values = metrics[metric][point]
+        if np.all(np.isnan(values)):
+            continue
+        index = int(np.nanargmax(values) if maximized else np.nanargmin(values))
+        print(f"{metrics['frequency'][point, 0] / 1e6:g} MHz, voltage scale {metrics['voltage_scale'][point, 0]:g}: "
+              f"{records[index]['configuration']} ({metric} {values[index]:.6g})")
+
+def parse_metrics_arguments():
+    parser = argparse.ArgumentParser(description = "Recomputes the derived metrics of the results at other operating points.")
+    parser.add_argument("files", nargs = "*", default = None, help = "Results CSV files, results/*.csv by default.")
+    parser.add_argument("--results_store", action = "store", help = "Reads the results from this SQLite results store instead, and stores the recomputed metrics in it.")
+    parser.add_argument("--frequencies", action = "store", type = float, nargs = "+", default = [reference_frequency / 1e6], help = "Clock frequencies in MHz.")
+    parser.add_argument("--voltage_scales", action = "store", type = float, nargs = "+", default = [1.0], help = "Supply voltages relative to the nominal one.")
+    parser.add_argument("--power_model", action = "store", default = "measured", choices = power_models, help = "Holds the power as measured at every operating point, or scales it as dynamic power with the clock and the square of the voltage scale.")
+    parser.add_argument("--metric", action = "store", default = "energy_consumed", choices = derived_columns, help = "Metric the best configuration per operating point is printed by.")
+    parser.add_argument("--output", action = "store", default = "reports/metrics.csv", help = "CSV file of the recomputed metrics.")
+    return parser.parse_args()
+
+def main():
+    args = parse_metrics_arguments()
+    store = None
+    if args.results_store:
+        store = ResultsStore(args.results_store)
+        records = list(store.get_records())
+    else:
+        records = [record for file_path in args.files or sorted(glob.glob("results/*.csv")) for record in read_results_csv(file_path)]
+    operating_points = [(frequency * 1e6, voltage_scale) for frequency, voltage_scale in itertools.product(args.frequencies, args.voltage_scales)]
+    measurements = get_measurements(records)
+    metrics = compute_metrics(measurements, operating_points, args.power_model)
+    write_metrics_csv(records, measurements, metrics, args.output)
+    if store is not None:
+        store.add_metrics(get_store_metrics(records, metrics, args.power_model))
+        store.close()
+    print(f"Recomputed {len(records)} results rows at {len(operating_points)} operating points: {args.output}")
+    print_best(records, metrics, args.metric)
+
+if __name__ == "__main__":
+    main()
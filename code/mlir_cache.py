@@ -0,0 +1,72 @@
+import os
+import json
+import mmap
+import time
+import hashlib
+
+# Bump whenever the layer descriptors produced by read_mlir change
+PARSER_VERSION = 1
+
+def hash_file(file_path):
+    """Return the BLAKE2b hex digest of the file contents."""
+    digest = hashlib.blake2b(digest_size=20)
+    if os.path.getsize(file_path) > 0:
+        with open(file_path, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                digest.update(buffer)
+    return digest.hexdigest()
+
+def write_json(file_path, data):
+    """Write JSON atomically so an interrupted run never leaves a truncated cache entry."""
+    temporary_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'w', encoding='UTF-8') as file:
+        json.dump(data, file)
+    os.replace(temporary_path, file_path)
+
+def read_json(file_path):
+    try:
+        with open(file_path, 'r', encoding='UTF-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+class MlirCache:
+    """On-disk cache of the layer descriptors parsed from an MLIR file.
+
+    Entries are keyed by the content hash of the file and PARSER_VERSION. An index of
+    (size, mtime) per path avoids rehashing files that have not been touched since.
+    """
+    def __init__(self, cache_directory):
+        self.cache_directory = cache_directory
+        self.index_path = os.path.join(cache_directory, "index.json")
+        if not os.path.exists(cache_directory):
+            os.makedirs(cache_directory)
+
+    def get_content_hash(self, file_path):
+        file_stat = os.stat(file_path)
+        file_key = os.path.abspath(file_path)
+        index = read_json(self.index_path) or {}
+        entry = index.get(file_key)
+        if entry is not None and entry["size"] == file_stat.st_size and entry["mtime_ns"] == file_stat.st_mtime_ns:
+            return entry["hash"]
+        content_hash = hash_file(file_path)
+        index[file_key] = {"size": file_stat.st_size, "mtime_ns": file_stat.st_mtime_ns, "hash": content_hash}
+        write_json(self.index_path, index)
+        return content_hash
+
+    def get_entry_path(self, content_hash):
+        return os.path.join(self.cache_directory, f"{content_hash}-v{PARSER_VERSION}.json")
+
+    def load(self, file_path):
+        """Return the cached descriptors for the file, or None on a cache miss."""
+        start_time = time.perf_counter()
+        content_hash = self.get_content_hash(file_path)
+        descriptors = read_json(self.get_entry_path(content_hash))
+        if descriptors is not None:
+            elapsed_time = (time.perf_counter() - start_time) * 1e3
+            print(f"Loaded {len(descriptors)} cached layer descriptors in {elapsed_time:.1f} ms")
+        return descriptors
+
+    def store(self, file_path, descriptors):
+        content_hash = self.get_content_hash(file_path)
+        write_json(self.get_entry_path(content_hash), descriptors)
@@ -0,0 +1,114 @@
+import os
+import csv
+from results_csv import read_optional_float
+
+report_directory = "reports"
+
+# Metric of the results rows each objective selects by, and whether it is maximized
+objectives = {
+    "latency": ("runtime_in_s", False),
+    "energy": ("energy_consumed", False),
+    "gflops_per_watt": ("gflops_per_watt", True)
+}
+
+# Layers are critical while together they account for less than this share of the network latency or energy
+critical_share = 0.8
+
+def get_point(record):
+    row = record["row"]
+    return {
+        "configuration": record["configuration"],
+        "loop_optimizer": record["loop_optimizer"],
+        "transform": record["transform"],
+        "runtime_in_s": read_optional_float(row, "runtime_in_s"),
+        "energy_consumed": read_optional_float(row, "energy_consumed"),
+        "gflops_per_watt": read_optional_float(row, "gflops_per_watt"),
+        "area": read_optional_float(row, "area"),
+        "flop_count": record["flop_count"]
+    }
+
+def get_layer_points(records, model_name):
+    """Return the OpenROAD results of every configuration of a model, per layer name."""
+    layer_points = {}
+    for record in records:
+        if record["model_name"] != model_name or record["fidelity"] != "openroad":
+            continue
+        point = get_point(record)
+        if point["runtime_in_s"] is None or point["energy_consumed"] is None:
+            continue
+        layer_points.setdefault(record["layer_name"], []).append(point)
+    return layer_points
+
+def select_best(points, objective, area_budget=None):
+    """Return the best point under the objective among those within the area budget, or None."""
+    metric, maximized = objectives[objective]
+    points = [point for point in points if point[metric] is not None]
+    if area_budget is not None:
+        points = [point for point in points if point["area"] is not None and point["area"] <= area_budget]
+    if not points:
+        return None
+    if maximized:
+        return max(points, key=lambda point: point[metric])
+    return min(points, key=lambda point: point[metric])
+
+def mark_critical_layers(rows, metric):
+    """Mark the layers that, largest first, account for critical_share of the network total of a metric."""
+    total = sum(row[metric] for row in rows)
+    covered = 0
+    for row in sorted(rows, key=lambda row: row[metric], reverse=True):
+        if total == 0 or covered >= critical_share * total:
+            break
+        row["critical"] = True
+        covered += row[metric]
+
+def write_network_report(model_name, layer_names, records, objective, area_budget=None):
+    """Write the per-layer best configurations of a model and print its end-to-end latency and energy.
+
+    Layers are run one after the other, each on the accelerator of its best configuration,
+    so the network latency and energy are the sums over the layer sequence. Returns the
+    path of the report CSV.
+    """
+    layer_points = get_layer_points(records, model_name)
+    rows = []
+    missing = []
+    for layer_name in layer_names:
+        best = select_best(layer_points.get(layer_name, []), objective, area_budget)
+        if best is None:
+            missing.append(layer_name)
+            continue
+        rows.append(dict(best, layer_name=layer_name, critical=False))
+    total_runtime = sum(row["runtime_in_s"] for row in rows)
+    total_energy = sum(row["energy_consumed"] for row in rows)
+    total_flop_count = sum(row["flop_count"] for row in rows)
+    for metric in ["runtime_in_s", "energy_consumed"]:
+        mark_critical_layers(rows, metric)
+
+    if not os.path.exists(report_directory):
+        os.makedirs(report_directory)
+    file_path = os.path.join(report_directory, f"{model_name}_network_{objective}.csv")
+    header = ["layer_name", "configuration", "loop_optimizer", "transform", "runtime_in_s", "runtime_share",
+              "energy_consumed", "energy_share", "gflops_per_watt", "area", "critical"]
+    with open(file_path, 'w', newline='', encoding='UTF-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        for row in rows:
+            row["runtime_share"] = round(row["runtime_in_s"] / total_runtime, 6) if total_runtime else None
+            row["energy_share"] = round(row["energy_consumed"] / total_energy, 6) if total_energy else None
+            writer.writerow([row[column] for column in header])
+        gflops_per_watt = round(total_flop_count / total_energy / 1e9, 6) if total_energy else None
+        areas = [row["area"] for row in rows if row["area"] is not None]
+        writer.writerow(["network", "", "", "", round(total_runtime, 6), 1, round(total_energy, 12), 1,
+                         gflops_per_watt, max(areas) if areas else None, ""])
+
+    print("===========================")
+    print(f"Network report of {model_name} ({objective}{f', area <= {area_budget}' if area_budget is not None else ''}):")
+    print(f"Layers with results: {len(rows)} of {len(layer_names)}")
+    if missing:
+        print(f"No results within the constraints for: {', '.join(missing)}")
+    print(f"End-to-end latency (s): {round(total_runtime, 6)}")
+    print(f"End-to-end energy (J): {round(total_energy, 12)}")
+    print(f"GFLOPS/Watt: {gflops_per_watt}")
+    critical = [row["layer_name"] for row in sorted(rows, key=lambda row: row["runtime_in_s"], reverse=True) if row["critical"]]
+    print(f"Critical layers: {', '.join(critical)}")
+    print(f"Report: {file_path}")
+    return file_path
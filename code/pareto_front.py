@@ -0,0 +1,41 @@
+import os
+import csv
+
+# Minimized objectives, as computed by DSE.record_results
+objectives = ["runtime_in_s", "energy_consumed", "area"]
+
+def dominates(first, second):
+    """Return True if the first point is no worse in every objective and better in one."""
+    no_worse = all(first[objective] <= second[objective] for objective in objectives)
+    better = any(first[objective] < second[objective] for objective in objectives)
+    return no_worse and better
+
+class ParetoFront:
+    """Non-dominated configurations of one layer, updated as results arrive."""
+    def __init__(self):
+        self.points = []
+
+    def add(self, point):
+        """Add a point unless it is dominated, dropping the points it dominates. Return True if added."""
+        if self.dominates(point):
+            return False
+        self.points = [front_point for front_point in self.points if not dominates(point, front_point)]
+        self.points.append(point)
+        return True
+
+    def dominates(self, point):
+        return any(dominates(front_point, point) for front_point in self.points)
+
+    def write(self, file_path):
+        """Write the front as CSV, replacing the previous version atomically."""
+        directory = os.path.dirname(file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temporary_path = f"{file_path}.{os.getpid()}.tmp"
+        header = ["configuration", "transform"] + objectives + ["simulation_cycles", "total_power"]
+        with open(temporary_path, 'w', newline='', encoding='UTF-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            for point in sorted(self.points, key=lambda point: point["runtime_in_s"]):
+                writer.writerow([point[column] for column in header])
+        os.replace(temporary_path, file_path)
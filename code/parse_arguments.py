@@ -3,14 +3,54 @@ import argparse
 def parse_arguments():
     parser = argparse.ArgumentParser()
     parser.add_argument("--read_mlir", action = "store", help = "Reads .mlir files.")
-    parser.add_argument("--permute", action = "store_true", help = "Explores loop permutation.")
-    parser.add_argument("--tile", action = "store_true", help = "Explores loop tiling.")
-    parser.add_argument("--unroll", action = "store_true", help = "Explores loop unrolling.")
+    parser.add_argument("--permute", action = "store_true", help = "Explores loop permutation, jointly with --tile and --unroll if given.")
+    parser.add_argument("--tile", action = "store_true", help = "Explores loop tiling, jointly with --permute and --unroll if given.")
+    parser.add_argument("--unroll", action = "store_true", help = "Explores loop unrolling, jointly with --tile and --permute if given.")
+    parser.add_argument("--reorder_reductions", action = "store_true", help = "Treats the accumulation as associative, so that permutations may reorder the reduction loops.")
     parser.add_argument("--conv2d", action = "store_true", help = "Explores 2D Convolution layers.")
     parser.add_argument("--depthwise_conv2d", action = "store_true", help = "Explores Depthwise 2D Convolution layers.")
     parser.add_argument("--matmul", action = "store_true", help = "Explores Fully Connected layers.")
     parser.add_argument("--start_layer", action = "store", help = "Which layer to start exploration from.")
     parser.add_argument("--end_layer", action = "store", help = "Which layer to end exploration at.")
     parser.add_argument("--select_layer", action = "store", help = "Only the selected layer is explored.")
+    parser.add_argument("--cache_dir", action = "store", default = ".mlir_cache", help = "Directory of the parsed MLIR cache.")
+    parser.add_argument("--no_cache", action = "store_true", help = "Always re-parse the MLIR file.")
+    parser.add_argument("--no_dedup", action = "store_true", help = "Explores layers with identical shape signatures separately.")
+    parser.add_argument("--jobs", action = "store", type = int, default = 1, help = "Number of configurations explored in parallel.")
+    parser.add_argument("--toolchain_backend", action = "store", default = "docker", choices = ["docker", "native", "mock"], help = "Runs the toolchain in Docker, installed on the host, or as a deterministic mock of its outputs, which sleeps DSE_MOCK_DELAY seconds per million simulated cycles.")
+    parser.add_argument("--toolchain_session", action = "store_true", help = "Runs all toolchain commands of a worker in one long-lived container.")
+    parser.add_argument("--fused_frontend", action = "store_true", help = "Pipes the front-end passes into each other instead of writing intermediate files.")
+    parser.add_argument("--debug_ir", action = "store_true", help = "Dumps the IR after every front-end pass.")
+    parser.add_argument("--no_frontend_reuse", action = "store_true", help = "Runs the layer-invariant front-end steps for every configuration.")
+    parser.add_argument("--results_cache", action = "store", default = "results_cache", help = "Directory of the results cache and its journal.")
+    parser.add_argument("--no_results_cache", action = "store_true", help = "Runs every configuration even if its results are cached.")
+    parser.add_argument("--results_store", action = "store", help = "SQLite results store the results rows are written to instead of results/*.csv.")
+    parser.add_argument("--import_results", action = "store_true", help = "Imports the existing results/*.csv files, or the results store, into the results cache.")
+    parser.add_argument("--network_report", action = "store", choices = ["latency", "energy", "gflops_per_watt"], help = "Reports the end-to-end latency and energy of the model with the best configuration per layer under this objective.")
+    parser.add_argument("--target_frequency", action = "store", type = float, default = 100, help = "Clock frequency in MHz the runtime, GFLOPS and energy of the results are computed at.")
+    parser.add_argument("--area_budget", action = "store", type = float, help = "Only configurations within this area are considered by the network report.")
+    parser.add_argument("--frontend_timeout", action = "store", type = int, help = "Wall-clock timeout in seconds of each front-end stage.")
+    parser.add_argument("--bambu_timeout", action = "store", type = int, help = "Wall-clock timeout in seconds of Bambu synthesis and simulation.")
+    parser.add_argument("--openroad_timeout", action = "store", type = int, help = "Wall-clock timeout in seconds of the OpenROAD flow.")
+    parser.add_argument("--retries", action = "store", type = int, default = 2, help = "Retries of a stage failing with a transient error.")
+    parser.add_argument("--retry_failures", action = "store_true", help = "Runs configurations that failed in earlier sweeps again.")
+    parser.add_argument("--dominance_cutoff", action = "store", type = float, help = "Aborts the simulation of a configuration once it exceeds this multiple of the best cycles of the layer, skipping OpenROAD.")
+    parser.add_argument("--async_orchestrator", action = "store_true", help = "Runs the configurations as asyncio coroutines, parsing the tool logs while they are written.")
+    parser.add_argument("--coordinator", action = "store", help = "Puts the configurations into this SQLite work queue and records the results of its workers.")
+    parser.add_argument("--worker", action = "store", help = "Runs configurations from this SQLite work queue until its coordinator finishes.")
+    parser.add_argument("--lease", action = "store", type = int, default = 300, help = "Seconds a worker holds a job without a heartbeat.")
+    parser.add_argument("--stage_scheduler", action = "store_true", help = "Schedules the Bambu and OpenROAD stages separately, costliest configurations first.")
+    parser.add_argument("--bambu_jobs", action = "store", type = int, help = "Bambu stages run at the same time by the stage scheduler, --jobs by default.")
+    parser.add_argument("--openroad_jobs", action = "store", type = int, help = "OpenROAD stages run at the same time by the stage scheduler, --jobs by default.")
+    parser.add_argument("--bambu_memory", action = "store", type = float, help = "Memory limit in GB of the Bambu stages of the stage scheduler.")
+    parser.add_argument("--openroad_memory", action = "store", type = float, help = "Memory limit in GB of the OpenROAD stages of the stage scheduler.")
+    parser.add_argument("--search", action = "store", default = "exhaustive", choices = ["exhaustive", "random", "annealing", "evolutionary", "bayesian"], help = "Strategy choosing the configurations explored per layer.")
+    parser.add_argument("--search_budget", action = "store", type = int, default = 32, help = "Configurations evaluated per layer by a search strategy.")
+    parser.add_argument("--search_seed", action = "store", type = int, help = "Random seed of the search strategy.")
+    parser.add_argument("--search_objective", action = "store", default = "cycles", choices = ["cycles", "energy"], help = "Layer latency in cycles or energy minimized by the search strategy.")
+    parser.add_argument("--pareto_prune", action = "store_true", help = "Skips unroll combinations that a point of the layer's Pareto front dominates, assuming unrolling speeds a layer up by at most the growth of its unrolled iterations and never shrinks its area or power.")
+    parser.add_argument("--surrogate_top_k", action = "store", type = int, help = "Only synthesizes the k configurations per layer ranked best by the surrogate model trained on results/.")
+    parser.add_argument("--multi_fidelity", action = "store_true", help = "Screens every configuration with Bambu and only runs OpenROAD for those close to the fewest cycles and not beaten in cycles and Bambu area.")
+    parser.add_argument("--finalist_margin", action = "store", type = float, default = 0.1, help = "Fraction above the fewest Bambu cycles of a layer within which screened configurations go on to OpenROAD.")
     args = parser.parse_args()
     return args
@@ -1,55 +1,165 @@
 import re
+import os
+import mmap
+import time
 from conv2d_class import Conv2D
 from depthwise_conv2d_class import DepthwiseDepthConv2D
 from fully_connected_class import FullyConnected
+from mlir_cache import MlirCache
 
-regex_patterns = {
-    "conv2d": r'linalg\.conv_2d_nhwc_hwcf\s*\{\s*dilations\s*=\s*dense<(\d+)>\s*:\s*tensor<\d+xi64>\s*,\s*strides\s*=\s*dense<(\d+)>\s*:\s*tensor<\d+xi64>\s*[^}]*\}\s*ins\(\s*([^:]+):\s*memref<([^>]+)>\s*,\s*memref<([^>]+)>s*\)\s*outs\(\s*([^:]+):\s*memref<([^>]+)>\s*\)',
-    "depthwise_conv2d_multiplier": r'linalg\.depthwise_conv_2d_nhwc_hwcm\s*\{\s*dilations\s*=\s*dense<(\d+)>\s*:\s*tensor<\d+xi64>\s*,\s*strides\s*=\s*dense<(\d+)>\s*:\s*tensor<\d+xi64>\s*[^}]*\}\s*ins\(\s*([^:]+):\s*memref<([^>]+)>\s*,\s*memref<([^>]+)>s*\)\s*outs\(\s*([^:]+):\s*memref<([^>]+)>\s*\)',
-    "depthwise_conv2d": r'linalg\.depthwise_conv_2d_nhwc_hwc\s*\{\s*dilations\s*=\s*dense<(\d+)>\s*:\s*tensor<\d+xi64>\s*,\s*strides\s*=\s*dense<(\d+)>\s*:\s*tensor<\d+xi64>\s*[^}]*\}\s*ins\(\s*([^:]+):\s*memref<([^>]+)>\s*,\s*memref<([^>]+)>s*\)\s*outs\(\s*([^:]+):\s*memref<([^>]+)>\s*\)',
-    "matmul": r'linalg\.batch_matmul\s*ins\(\s*([^:]+):\s*memref<([^>]+)>\s*,\s*memref<([^>]+)>s*\)\s*outs\(\s*([^:]+):\s*memref<([^>]+)>\s*\)'
+# linalg op name -> layer name prefix used as key in the layers dictionary
+linalg_ops = {
+    b"conv_2d_nhwc_hwcf": "conv2d",
+    b"depthwise_conv_2d_nhwc_hwcm": "depthwise_conv2d_multiplier",
+    b"depthwise_conv_2d_nhwc_hwc": "depthwise_conv2d",
+    b"batch_matmul": "matmul"
 }
 
+# Layer name prefix -> counter shared between ops numbered together
+layer_counters = {
+    "conv2d": "conv2d",
+    "depthwise_conv2d_multiplier": "depthwise_conv2d",
+    "depthwise_conv2d": "depthwise_conv2d",
+    "matmul": "matmul"
+}
+
+op_name_pattern = re.compile(rb'linalg\.([A-Za-z0-9_]+)')
+dilations_pattern = re.compile(r'dilations\s*=\s*dense<([^>]+)>')
+strides_pattern = re.compile(r'strides\s*=\s*dense<([^>]+)>')
+integer_pattern = re.compile(r'-?\d+')
+# Shape and element type, ignoring layout/memory space attributes such as strided<...>
+memref_pattern = re.compile(r'memref<((?:\d+x)+\w+)')
+
 def process_tensor_shape(tensor_shape):
     dimensions, _ = tensor_shape.strip().rsplit('x', 1)
     return list(map(int, dimensions.split('x')))
 
-def read_file(args):
+def find_closing_parenthesis(text, start):
+    """Return the index of the ")" balancing the "(" at text[start]."""
+    end = text.find(")", start)
+    while end != -1 and text.count("(", start, end) != text.count(")", start, end + 1):
+        end = text.find(")", end + 1)
+    return end
+
+def process_memref_types(operands):
+    """Return the shapes of all memref types in an ins(...)/outs(...) operand list."""
+    return [process_tensor_shape(match.group(1)) for match in memref_pattern.finditer(operands)]
+
+def process_dense_attribute(pattern, attributes):
+    match = pattern.search(attributes)
+    if match is None:
+        return 1
+    values = [int(value) for value in integer_pattern.findall(match.group(1))]
+    if len(set(values)) > 1:
+        print(f"Warning: non-uniform attribute {match.group(0)}, using {values[0]}")
+    return values[0]
+
+def parse_linalg_op(name, text):
+    """Parse the text of one linalg op into a layer descriptor."""
+    ins_start = text.find("ins(")
+    outs_start = text.find("outs(")
+    if ins_start == -1 or outs_start == -1:
+        return None
+    ins_end = find_closing_parenthesis(text, ins_start + 3)
+    outs_end = find_closing_parenthesis(text, outs_start + 4)
+    input_shapes = process_memref_types(text[ins_start:ins_end])
+    output_shapes = process_memref_types(text[outs_start:outs_end])
+    if len(input_shapes) != 2 or len(output_shapes) != 1:
+        return None
+    attributes = text[:ins_start]
+    descriptor = {
+        "name": name,
+        "input_tensor_shape": input_shapes[0],
+        "kernel_tensor_shape": input_shapes[1],
+        "output_tensor_shape": output_shapes[0]
+    }
+    if name != "matmul":
+        descriptor["dilations"] = process_dense_attribute(dilations_pattern, attributes)
+        descriptor["strides"] = process_dense_attribute(strides_pattern, attributes)
+    return descriptor
+
+def scan_linalg_ops(buffer):
+    """Scan the buffer once, yielding (name, text) for every supported linalg op.
+
+    Ops may span several lines; an op ends at the parenthesis closing its outs(...).
+    """
+    position = buffer.find(b"linalg.")
+    while position != -1:
+        match = op_name_pattern.match(buffer, position)
+        name = linalg_ops.get(match.group(1)) if match else None
+        if name is None:
+            position = buffer.find(b"linalg.", position + 7)
+            continue
+        outs_start = buffer.find(b"outs(", match.end())
+        if outs_start == -1:
+            break
+        next_op = buffer.find(b"linalg.", match.end(), outs_start)
+        if next_op != -1:
+            # Not in destination-passing form, the outs( belongs to a later op
+            position = next_op
+            continue
+        # Extend to the next ")" until the parentheses of outs( are balanced
+        end = buffer.find(b")", outs_start)
+        while end != -1:
+            operands = buffer[outs_start:end + 1]
+            if operands.count(b"(") == operands.count(b")"):
+                break
+            end = buffer.find(b")", end + 1)
+        if end == -1:
+            break
+        yield name, buffer[match.end():end + 1].decode("UTF-8")
+        position = buffer.find(b"linalg.", end)
+
+def parse_file(file_path):
+    """Return the layer descriptors of every supported linalg op in the file, in order."""
+    descriptors = []
+    file_size = os.path.getsize(file_path)
+    start_time = time.perf_counter()
+    if file_size > 0:
+        with open(file_path, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                for name, text in scan_linalg_ops(buffer):
+                    descriptor = parse_linalg_op(name, text)
+                    if descriptor is not None:
+                        descriptors.append(descriptor)
+    elapsed_time = time.perf_counter() - start_time
+    megabytes = file_size / 1e6
+    throughput = megabytes / elapsed_time if elapsed_time > 0 else float("inf")
+    print(f"Parsed {megabytes:.2f} MB in {elapsed_time:.3f} s ({throughput:.2f} MB/s)")
+    return descriptors
+
+def create_layers(args, descriptors):
+    """Build the Conv2D / DepthwiseDepthConv2D / FullyConnected layers from descriptors."""
     layers = {}
-    with open(args.read_mlir, 'r', encoding="UTF-8") as file:
-        conv2d_count = 0
-        depthwise_conv2d_count = 0
-        matmul_count = 0
-        for line in file:
-            # Loop through each regex pattern in the dictionary
-            for name, pattern in regex_patterns.items():
-                match = re.findall(pattern, line)  # Find all matches for the current line
-                if match and name == "conv2d" and args.conv2d:  # If there are matches
-                    dilations = int(match[0][0])
-                    strides = int(match[0][1])
-                    input_tensor_shape = process_tensor_shape(match[0][3])
-                    kernel_tensor_shape = process_tensor_shape(match[0][4])
-                    output_tensor_shape = process_tensor_shape(match[0][6])
-                    layer = Conv2D(args, input_tensor_shape, kernel_tensor_shape, output_tensor_shape, dilations, strides)
-                    conv2d_count += 1
-                    layers[f"{name}_{conv2d_count}"] = layer
-                elif match and (name == "depthwise_conv2d" or name == "depthwise_conv2d_multiplier") and args.depthwise_conv2d:
-                    dilations = int(match[0][0])
-                    strides = int(match[0][1])
-                    input_tensor_shape = process_tensor_shape(match[0][3])
-                    kernel_tensor_shape = process_tensor_shape(match[0][4])
-                    output_tensor_shape = process_tensor_shape(match[0][6])
-                    layer = DepthwiseDepthConv2D(args, input_tensor_shape, kernel_tensor_shape, output_tensor_shape, dilations, strides)
-                    depthwise_conv2d_count += 1
-                    layers[f"{name}_{depthwise_conv2d_count}"] = layer
-                elif match and name == "matmul" and args.matmul:
-                    input_tensor_shape = process_tensor_shape(match[0][1])
-                    kernel_tensor_shape = process_tensor_shape(match[0][2])
-                    output_tensor_shape = process_tensor_shape(match[0][4])
-                    layer = FullyConnected(args, input_tensor_shape, kernel_tensor_shape, output_tensor_shape)
-                    matmul_count += 1
-                    layers[f"{name}_{matmul_count}"] = layer
-    print(f"Conv2d count: {conv2d_count}")
-    print(f"Depthwise_Conv2d count: {depthwise_conv2d_count}")
-    print(f"Matmul count: {matmul_count}")
+    counts = {"conv2d": 0, "depthwise_conv2d": 0, "matmul": 0}
+    for descriptor in descriptors:
+        name = descriptor["name"]
+        counter = layer_counters[name]
+        if name == "conv2d" and args.conv2d:
+            layer = Conv2D(args, descriptor["input_tensor_shape"], descriptor["kernel_tensor_shape"],
+                           descriptor["output_tensor_shape"], descriptor["dilations"], descriptor["strides"])
+        elif counter == "depthwise_conv2d" and args.depthwise_conv2d:
+            layer = DepthwiseDepthConv2D(args, descriptor["input_tensor_shape"], descriptor["kernel_tensor_shape"],
+                                         descriptor["output_tensor_shape"], descriptor["dilations"], descriptor["strides"])
+        elif name == "matmul" and args.matmul:
+            layer = FullyConnected(args, descriptor["input_tensor_shape"], descriptor["kernel_tensor_shape"],
+                                   descriptor["output_tensor_shape"])
+        else:
+            continue
+        counts[counter] += 1
+        layers[f"{name}_{counts[counter]}"] = layer
+    print(f"Conv2d count: {counts['conv2d']}")
+    print(f"Depthwise_Conv2d count: {counts['depthwise_conv2d']}")
+    print(f"Matmul count: {counts['matmul']}")
     return layers
+
+def read_file(args):
+    if args.no_cache:
+        descriptors = parse_file(args.read_mlir)
+    else:
+        cache = MlirCache(args.cache_dir)
+        descriptors = cache.load(args.read_mlir)
+        if descriptors is None:
+            descriptors = parse_file(args.read_mlir)
+            cache.store(args.read_mlir, descriptors)
+    return create_layers(args, descriptors)
@@ -0,0 +1,117 @@
+import os
+import json
+import hashlib
+from results_csv import read_results_csv
+
+class ResultsCache:
+    """Content-addressed cache of configuration results, backed by a write-ahead journal.
+
+    A key hashes the layer signature, the loop transformation and the toolchain pass
+    pipeline. The journal records when a configuration starts, when its results are
+    known ("done") and which layer rows were written to the results CSV files
+    ("recorded"), so that a restarted sweep skips finished configurations and only
+    writes the rows that are still missing. Configurations that failed ("failed")
+    form a negative cache and are skipped by later sweeps as well.
+    """
+    def __init__(self, cache_directory):
+        self.cache_directory = cache_directory
+        self.journal_path = os.path.join(cache_directory, "journal.jsonl")
+        self.results = {}
+        self.recorded = set()
+        self.started = {}
+        self.failures = {}
+        if not os.path.exists(cache_directory):
+            os.makedirs(cache_directory)
+        self.replay()
+
+    def replay(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'r', encoding='UTF-8') as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn last line of a crashed run
+                    continue
+                self.apply(entry)
+        unfinished = [configuration for key, configuration in self.started.items()
+                      if key not in self.results and key not in self.failures]
+        if unfinished:
+            print(f"Results cache: {len(unfinished)} configurations did not finish and will be rerun")
+
+    def apply(self, entry):
+        if entry["event"] == "start":
+            self.started[entry["key"]] = entry["configuration"]
+        elif entry["event"] == "done":
+            self.results[entry["key"]] = entry["results"]
+            self.failures.pop(entry["key"], None)
+        elif entry["event"] == "failed":
+            self.failures[entry["key"]] = entry
+        elif entry["event"] == "recorded":
+            self.recorded.add((entry["model_name"], entry["layer_name"], entry["key"]))
+
+    def append(self, entry):
+        with open(self.journal_path, 'a', encoding='UTF-8') as journal:
+            journal.write(json.dumps(entry) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+        self.apply(entry)
+
+    @staticmethod
+    def get_key(signature, loop_optimizer, transform, pipeline):
+        data = json.dumps([list(signature), loop_optimizer, transform, pipeline])
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    @staticmethod
+    def get_fidelity_pipeline(pipeline, fidelity):
+        """Return the pipeline identifying results of a fidelity level, unchanged for full OpenROAD results."""
+        if fidelity == "openroad":
+            return pipeline
+        return f"{pipeline} fidelity={fidelity}"
+
+    def lookup(self, key):
+        """Return the cached results for the key, or None."""
+        return self.results.get(key)
+
+    def start(self, key, configuration):
+        self.append({"event": "start", "key": key, "configuration": configuration})
+
+    def complete(self, key, configuration, results):
+        self.append({"event": "done", "key": key, "configuration": configuration, "results": results})
+
+    def fail(self, key, configuration, failure):
+        self.append({"event": "failed", "key": key, "configuration": configuration, "kind": failure.kind,
+                     "stage": failure.stage, "message": failure.message, "cycle_limit": failure.cycle_limit})
+
+    def lookup_failure(self, key):
+        """Return the journal entry of a known failure of the key, or None."""
+        return self.failures.get(key)
+
+    def is_recorded(self, model_name, layer_name, key):
+        return (model_name, layer_name, key) in self.recorded
+
+    def mark_recorded(self, model_name, layer_name, key):
+        self.append({"event": "recorded", "model_name": model_name, "layer_name": layer_name, "key": key})
+
+    def import_csv(self, file_path, get_pipeline, get_transform=None):
+        """Import the rows of an existing results CSV as finished and recorded configurations.
+
+        get_pipeline(loop_optimizer, transform) returns the pass pipeline the rows are assumed
+        to have been produced with, get_transform(record) the transform a row is looked up by.
+        """
+        self.import_records(read_results_csv(file_path), get_pipeline, file_path, get_transform)
+
+    def import_records(self, records, get_pipeline, source, get_transform=None):
+        count = 0
+        for record in records:
+            transform = record["transform"] if get_transform is None else get_transform(record)
+            pipeline = get_pipeline(record["loop_optimizer"], transform)
+            key = self.get_key(record["signature"], record["loop_optimizer"], transform,
+                               self.get_fidelity_pipeline(pipeline, record["fidelity"]))
+            if key not in self.results:
+                self.complete(key, record["configuration"], record["results"])
+            if not self.is_recorded(record["model_name"], record["layer_name"], key):
+                self.mark_recorded(record["model_name"], record["layer_name"], key)
+            count += 1
+        print(f"Imported {count} results from {source}")
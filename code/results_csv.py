@@ -0,0 +1,89 @@
+import os
+import re
+import csv
+from transform_pipeline import parse_recipe_name
+
+# Layer kinds in the order their names have to be matched
+layer_kinds = ["depthwise_conv2d", "conv2d", "matmul"]
+loop_optimizers = ["permute", "tile", "unroll", "joint"]
+
+layer_name_pattern = re.compile(r'(?:depthwise_conv2d_multiplier|depthwise_conv2d|conv2d|matmul)_\d+')
+
+def parse_results_file_name(file_path):
+    """Return (model_name, layer_kind, loop_optimizer) of a results CSV such as vgg16_conv2d_permute_1.csv.
+
+    The Bambu fidelity rows of a results CSV are in a file of the same name ending in _bambu.
+    """
+    file_name, _ = os.path.splitext(os.path.basename(file_path))
+    for layer_kind in layer_kinds:
+        for loop_optimizer in loop_optimizers:
+            match = re.match(rf'(.+)_{layer_kind}_{loop_optimizer}(?:_\d+)?(?:_bambu)?$', file_name)
+            if match:
+                return match.group(1), layer_kind, loop_optimizer
+    return None
+
+def get_signature(layer_kind, row):
+    """Return the shape signature of a results row, as returned by the layer classes."""
+    actual_columns = [column for column in row.keys() if column.startswith("actual_")]
+    signature = [layer_kind]
+    if layer_kind != "matmul":
+        dilations = row["dilations"] if "dilations" in row else row["dilation"]
+        signature += [int(row["strides"]), int(dilations)]
+    signature += [int(float(row[column])) for column in actual_columns]
+    return tuple(signature)
+
+def get_transform(loop_optimizer, row):
+    """Return the loop transformation of a results row in the form used by DSE."""
+    if loop_optimizer == "permute":
+        orders = [row[column] for column in row.keys() if column.startswith("permuation_order_")]
+        return ",".join(orders)
+    elif loop_optimizer == "tile":
+        return [int(row[column]) for column in row.keys() if column.startswith("tiled_")]
+    elif loop_optimizer == "joint":
+        return parse_recipe_name(row["transform_recipe"])
+    else:
+        return [int(row["unroll_full"]), int(row["unroll_factor"])]
+
+def read_optional_float(row, column):
+    return float(row[column]) if row.get(column) else None
+
+def get_record(file_info, row):
+    """Return the record of a results row, with the raw per-tile measurements.
+
+    Rows of the Bambu fidelity have no power and area.
+    """
+    model_name, layer_kind, loop_optimizer = file_info
+    number_of_tiles = float(row["number_of_tiles"])
+    layer_name = layer_name_pattern.search(row["configuration"][len(model_name):])
+    return {
+        "model_name": model_name,
+        "layer_kind": layer_kind,
+        "loop_optimizer": loop_optimizer,
+        "layer_name": layer_name.group(0) if layer_name else None,
+        "configuration": row["configuration"],
+        "signature": get_signature(layer_kind, row),
+        "transform": get_transform(loop_optimizer, row),
+        "number_of_tiles": number_of_tiles,
+        "flop_count": int(row["flop_count"]),
+        "fidelity": row.get("fidelity") or "openroad",
+        "results": {
+            "simulation_cycles": round(float(row["simulation_cycles"]) / number_of_tiles),
+            "total_power": read_optional_float(row, "total_power"),
+            "available_area": read_optional_float(row, "area"),
+            "bambu_area": read_optional_float(row, "bambu_area")
+        },
+        "row": row
+    }
+
+def read_results_csv(file_path):
+    """Yield one record per row of a results CSV.
+
+    Values beyond the header, as in rows appended by a run writing more columns, are ignored.
+    """
+    file_info = parse_results_file_name(file_path)
+    if file_info is None:
+        return
+    with open(file_path, 'r', newline='', encoding='UTF-8') as file:
+        for row in csv.DictReader(file):
+            row.pop(None, None)
+            yield get_record(file_info, row)
@@ -0,0 +1,280 @@
+import os
+import csv
+import glob
+import json
+import sqlite3
+import argparse
+from results_csv import parse_results_file_name, get_record, read_optional_float
+
+schema = [
+    """CREATE TABLE IF NOT EXISTS results (
+        id INTEGER PRIMARY KEY,
+        source_file TEXT,
+        model_name TEXT,
+        layer_kind TEXT,
+        layer_name TEXT,
+        loop_optimizer TEXT,
+        configuration TEXT,
+        signature TEXT,
+        transform TEXT,
+        fidelity TEXT,
+        number_of_tiles REAL,
+        flop_count INTEGER,
+        simulation_cycles REAL,
+        total_power REAL,
+        area REAL,
+        bambu_area REAL,
+        frequency REAL,
+        row TEXT,
+        occurrence INTEGER,
+        UNIQUE (source_file, row, occurrence))""",
+    """CREATE TABLE IF NOT EXISTS derived_metrics (
+        result_id INTEGER REFERENCES results (id),
+        frequency REAL,
+        voltage_scale REAL,
+        power_model TEXT,
+        runtime_in_s REAL,
+        gflops REAL,
+        gflops_per_watt REAL,
+        energy_consumed REAL,
+        UNIQUE (result_id, frequency, voltage_scale, power_model))""",
+    "CREATE INDEX IF NOT EXISTS results_model ON results (model_name, layer_name)",
+    "CREATE INDEX IF NOT EXISTS results_signature ON results (signature)",
+    "CREATE INDEX IF NOT EXISTS results_transform ON results (loop_optimizer, transform)"
+]
+
+# Raw measurements and derived metrics that queries may rank by, and those where higher is better
+raw_metrics = ["simulation_cycles", "total_power", "area", "bambu_area"]
+derived_metrics = ["runtime_in_s", "gflops", "gflops_per_watt", "energy_consumed"]
+metrics = raw_metrics + derived_metrics
+maximized_metrics = ["gflops", "gflops_per_watt"]
+
+# Columns queries may filter on
+filters = ["model_name", "layer_kind", "layer_name", "loop_optimizer", "fidelity", "signature"]
+
+class ResultsStore:
+    """SQLite results store with one schema for every layer kind and loop optimizer.
+
+    Each row keeps the raw measurements of the unified schema, and the clock its derived
+    metrics were computed at, next to the results CSV row it stands for, as written or
+    imported, and the name of that CSV file. The derived metrics are kept apart, one row
+    per results row and operating point, so metrics_engine can add those of other clocks
+    and voltages without touching the measurements. CSV files
+    therefore import losslessly and export back to the same files. Rows are keyed on
+    their content and on how many identical rows precede them in their file, so
+    re-importing a file that has since been appended to adds only the new rows, while
+    repeated rows of a file are all kept. Rows are buffered by add() and written in
+    one transaction by flush().
+    """
+    def __init__(self, database_path, frequency=100e6):
+        directory = os.path.dirname(database_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(database_path, timeout=60)
+        for statement in schema:
+            self.connection.execute(statement)
+        self.connection.commit()
+        # Clock in Hz the derived columns of the added rows were computed at
+        self.frequency = frequency
+        self.pending = []
+
+    def add(self, file_name, row, occurrence=None):
+        """Buffer a results row, given as a dict of its CSV values, of the results CSV file_name.
+
+        occurrence counts the identical rows before this one in the file. By default the row
+        is appended after those already stored or buffered.
+        """
+        file_info = parse_results_file_name(file_name)
+        if file_info is None:
+            raise ValueError(f"Not a results file name: {file_name}")
+        record = get_record(file_info, row)
+        source_file = os.path.basename(file_name)
+        content = json.dumps(row)
+        if occurrence is None:
+            occurrence = self.count_rows(source_file, content)
+        self.pending.append(((
+            source_file, record["model_name"], record["layer_kind"], record["layer_name"],
+            record["loop_optimizer"], record["configuration"], json.dumps(list(record["signature"])),
+            json.dumps(record["transform"]), record["fidelity"], record["number_of_tiles"], record["flop_count"],
+            read_optional_float(row, "simulation_cycles"), read_optional_float(row, "total_power"),
+            read_optional_float(row, "area"), read_optional_float(row, "bambu_area"), self.frequency,
+            content, occurrence), tuple(read_optional_float(row, column) for column in derived_metrics)))
+
+    def count_rows(self, source_file, content):
+        """Return the number of stored and buffered rows of source_file with this content."""
+        stored = self.connection.execute("SELECT COUNT(*) FROM results WHERE source_file = ? AND row = ?",
+                                         (source_file, content)).fetchone()[0]
+        return stored + sum(1 for pending, _ in self.pending if pending[0] == source_file and pending[-2] == content)
+
+    def flush(self):
+        """Write the buffered rows, skipping rows the store already holds. Return the number written."""
+        if not self.pending:
+            return 0
+        written = 0
+        with self.connection:
+            for values, derived in self.pending:
+                cursor = self.connection.execute(
+                    """INSERT OR IGNORE INTO results (source_file, model_name, layer_kind, layer_name, loop_optimizer,
+                    configuration, signature, transform, fidelity, number_of_tiles, flop_count, simulation_cycles,
+                    total_power, area, bambu_area, frequency, row, occurrence)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", values)
+                if cursor.rowcount == 0:
+                    continue
+                written += 1
+                self.connection.execute(
+                    """INSERT INTO derived_metrics (result_id, frequency, voltage_scale, power_model, runtime_in_s,
+                    gflops, gflops_per_watt, energy_consumed) VALUES (?, ?, 1, 'measured', ?, ?, ?, ?)""",
+                    (cursor.lastrowid, values[-3]) + derived)
+        skipped = len(self.pending) - written
+        self.pending = []
+        if skipped:
+            print(f"Skipped {skipped} rows the results store already holds")
+        return written
+
+    def import_csv(self, file_path):
+        """Import the rows of a results CSV file that the store does not hold yet."""
+        if parse_results_file_name(file_path) is None:
+            print(f"Skipping {file_path}, not a results CSV")
+            return
+        with open(file_path, 'r', newline='', encoding='UTF-8') as file:
+            rows = list(csv.DictReader(file))
+        occurrences = {}
+        for row in rows:
+            content = json.dumps(row)
+            occurrence = occurrences.get(content, 0)
+            occurrences[content] = occurrence + 1
+            self.add(file_path, row, occurrence)
+        print(f"Imported {self.flush()} of {len(rows)} rows from {file_path}")
+
+    def add_metrics(self, rows):
+        """Write derived metrics given as (result id, frequency, voltage scale, power model, runtime_in_s,
+        gflops, gflops_per_watt, energy_consumed) rows, replacing those of the same operating point."""
+        with self.connection:
+            self.connection.executemany(
+                """INSERT OR REPLACE INTO derived_metrics (result_id, frequency, voltage_scale, power_model,
+                runtime_in_s, gflops, gflops_per_watt, energy_consumed) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", rows)
+
+    def get_rows(self, **conditions):
+        """Yield (id, source_file, row) of the stored rows matching the filter columns, in insertion order."""
+        where, values = self.get_where(conditions)
+        cursor = self.connection.execute(f"SELECT id, source_file, row FROM results{where} ORDER BY id", values)
+        for result_id, source_file, row in cursor:
+            yield result_id, source_file, json.loads(row)
+
+    def get_records(self, **conditions):
+        """Yield the stored rows as records, in the form of results_csv.read_results_csv, with their result_id."""
+        for result_id, source_file, row in self.get_rows(**conditions):
+            record = get_record(parse_results_file_name(source_file), row)
+            record["result_id"] = result_id
+            yield record
+
+    def get_where(self, conditions):
+        conditions = {name: value for name, value in conditions.items() if value is not None}
+        for name in conditions:
+            if name not in filters:
+                raise ValueError(f"Unknown filter {name}, use one of {', '.join(filters)}")
+        if not conditions:
+            return "", []
+        return " WHERE " + " AND ".join(f"{name} = ?" for name in conditions), list(conditions.values())
+
+    def query(self, metric="runtime_in_s", k=10, operating_point=None, **conditions):
+        """Return the k best rows by a metric as dicts of the unified schema, best first.
+
+        The derived metrics are those of the operating point, a (frequency in Hz, voltage scale,
+        power model) triple, or by default those of the clock each row was recorded at.
+        """
+        if metric not in metrics:
+            raise ValueError(f"Unknown metric {metric}, use one of {', '.join(metrics)}")
+        order = "DESC" if metric in maximized_metrics else "ASC"
+        if operating_point is None:
+            point = "derived_metrics.frequency = results.frequency AND voltage_scale = 1 AND power_model = 'measured'"
+            point_values = []
+        else:
+            point = "derived_metrics.frequency = ? AND voltage_scale = ? AND power_model = ?"
+            point_values = list(operating_point)
+        where, values = self.get_where(conditions)
+        where = f"{where} AND" if where else " WHERE"
+        cursor = self.connection.execute(
+            f"""SELECT model_name, layer_name, loop_optimizer, configuration, transform, fidelity,
+            derived_metrics.frequency AS frequency, {", ".join(metrics)}
+            FROM results LEFT JOIN derived_metrics ON result_id = results.id AND {point}
+            {where} {metric} IS NOT NULL ORDER BY {metric} {order} LIMIT ?""", point_values + values + [k])
+        columns = [description[0] for description in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor]
+        for row in rows:
+            row["transform"] = json.loads(row["transform"])
+        return rows
+
+    def export_csv(self, directory, **conditions):
+        """Write the stored rows back to results CSV files in the directory, one per source file."""
+        files = {}
+        for _, source_file, row in self.get_rows(**conditions):
+            files.setdefault(source_file, []).append(row)
+        if files and not os.path.exists(directory):
+            os.makedirs(directory)
+        for source_file, rows in files.items():
+            header = []
+            for row in rows:
+                header += [column for column in row if column not in header]
+            with open(os.path.join(directory, source_file), 'w', newline='', encoding='UTF-8') as file:
+                writer = csv.DictWriter(file, fieldnames=header)
+                writer.writeheader()
+                writer.writerows(rows)
+            print(f"Exported {len(rows)} rows to {os.path.join(directory, source_file)}")
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+def print_table(rows, metric):
+    columns = ["model_name", "layer_name", "loop_optimizer", "transform", "fidelity", metric]
+    table = [columns] + [["" if row[column] is None else str(row[column]) for column in columns] for row in rows]
+    widths = [max(len(line[index]) for line in table) for index in range(len(columns))]
+    for line in table:
+        print("  ".join(value.ljust(width) for value, width in zip(line, widths)))
+
+def parse_store_arguments():
+    parser = argparse.ArgumentParser(description = "Queries, imports and exports a results store.")
+    parser.add_argument("database", action = "store", help = "SQLite results store.")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+    import_parser = subparsers.add_parser("import", help = "Imports results CSV files.")
+    import_parser.add_argument("files", nargs = "*", default = None, help = "Results CSV files, results/*.csv by default.")
+    import_parser.add_argument("--frequency", action = "store", type = float, default = 100, help = "Clock frequency in MHz the derived columns of the files were computed at.")
+    export_parser = subparsers.add_parser("export", help = "Exports the results as CSV files.")
+    export_parser.add_argument("directory", action = "store", help = "Directory of the CSV files.")
+    top_parser = subparsers.add_parser("top", help = "Prints the best configurations by a metric.")
+    top_parser.add_argument("--metric", action = "store", default = "runtime_in_s", choices = metrics, help = "Metric to rank by.")
+    top_parser.add_argument("--k", action = "store", type = int, default = 10, help = "Number of configurations.")
+    top_parser.add_argument("--frequency", action = "store", type = float, help = "Clock frequency in MHz of the derived metrics, recomputed by metrics_engine. The clock each row was recorded at by default.")
+    top_parser.add_argument("--voltage_scale", action = "store", type = float, default = 1.0, help = "Voltage scale of the derived metrics with --frequency.")
+    top_parser.add_argument("--power_model", action = "store", default = "measured", help = "Power model of the derived metrics with --frequency.")
+    for sub_parser in [export_parser, top_parser]:
+        sub_parser.add_argument("--model", action = "store", dest = "model_name", help = "Only rows of this model.")
+        sub_parser.add_argument("--layer_kind", action = "store", choices = ["conv2d", "depthwise_conv2d", "matmul"], help = "Only rows of this layer kind.")
+        sub_parser.add_argument("--layer", action = "store", dest = "layer_name", help = "Only rows of this layer.")
+        sub_parser.add_argument("--loop_optimizer", action = "store", help = "Only rows of this loop optimizer.")
+        sub_parser.add_argument("--fidelity", action = "store", help = "Only rows of this fidelity.")
+    return parser.parse_args()
+
+def main():
+    args = parse_store_arguments()
+    store = ResultsStore(args.database)
+    try:
+        if args.command == "import":
+            store.frequency = args.frequency * 1e6
+            for file_path in args.files or sorted(glob.glob("results/*.csv")):
+                store.import_csv(file_path)
+            return
+        conditions = {name: getattr(args, name) for name in ["model_name", "layer_kind", "layer_name", "loop_optimizer", "fidelity"]}
+        if args.command == "export":
+            store.export_csv(args.directory, **conditions)
+        else:
+            operating_point = None
+            if args.frequency is not None:
+                operating_point = (args.frequency * 1e6, args.voltage_scale, args.power_model)
+            print_table(store.query(args.metric, args.k, operating_point, **conditions), args.metric)
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import math
+import numpy as np
+
+class SearchStrategy:
+    """Chooses which candidates of a layer's design space to evaluate within a budget.
+
+    Candidates are described by feature vectors. propose() returns indices of candidates
+    that were not proposed before and observe() reports the objective of one of them,
+    lower is better; failed candidates are observed as infinity.
+    """
+    def __init__(self, features, seed=None):
+        features = np.asarray(features, dtype=float)
+        span = features.max(axis=0) - features.min(axis=0)
+        span[span == 0] = 1
+        self.features = (features - features.min(axis=0)) / span
+        self.rng = np.random.default_rng(seed)
+        self.remaining = set(range(len(features)))
+        self.observed = {}
+
+    def take(self, index):
+        self.remaining.discard(index)
+        return index
+
+    def take_random(self, count):
+        indices = self.rng.permutation(sorted(self.remaining))[:count]
+        return [self.take(int(index)) for index in indices]
+
+    def take_nearest(self, point, spread=3):
+        """Take one of the spread remaining candidates closest to a point of the feature space."""
+        if not self.remaining:
+            return None
+        remaining = np.array(sorted(self.remaining))
+        distances = np.linalg.norm(self.features[remaining] - point, axis=1)
+        nearest = remaining[np.argsort(distances, kind="stable")[:spread]]
+        return self.take(int(self.rng.choice(nearest)))
+
+    def get_best(self):
+        finite = {index: value for index, value in self.observed.items() if math.isfinite(value)}
+        if not finite:
+            return None
+        return min(finite, key=finite.get)
+
+    def propose(self, count):
+        return self.take_random(count)
+
+    def observe(self, index, value):
+        self.observed[index] = value
+
+class RandomSearch(SearchStrategy):
+    """Uniform sampling of the design space without replacement."""
+
+class SimulatedAnnealing(SearchStrategy):
+    """Walks between neighbouring candidates, accepting worse ones with a falling probability."""
+    def __init__(self, features, seed=None, initial_temperature=1.0, cooling=0.9, step=0.25):
+        super().__init__(features, seed)
+        self.temperature = initial_temperature
+        self.cooling = cooling
+        self.step = step
+        self.current = None
+
+    def propose(self, count):
+        if self.current is None:
+            return self.take_random(count)
+        proposals = []
+        for _ in range(count):
+            point = self.features[self.current] + self.rng.normal(0, self.step, self.features.shape[1])
+            index = self.take_nearest(point)
+            if index is not None:
+                proposals.append(index)
+        return proposals
+
+    def observe(self, index, value):
+        super().observe(index, value)
+        if not math.isfinite(value):
+            return
+        if self.current is None:
+            self.current = index
+            return
+        current_value = self.observed[self.current]
+        # Relative change, so that the temperature does not depend on the unit of the objective
+        change = (value - current_value) / current_value
+        if change <= 0 or self.rng.random() < math.exp(-change / self.temperature):
+            self.current = index
+        self.temperature *= self.cooling
+
+class EvolutionarySearch(SearchStrategy):
+    """Breeds candidates from the best ones evaluated so far by crossover and mutation."""
+    def __init__(self, features, seed=None, population_size=8, mutation=0.15):
+        super().__init__(features, seed)
+        self.population_size = population_size
+        self.mutation = mutation
+
+    def select_parent(self, population):
+        # Binary tournament
+        first, second = self.rng.choice(population, 2)
+        return first if self.observed[first] <= self.observed[second] else second
+
+    def propose(self, count):
+        population = sorted((index for index, value in self.observed.items() if math.isfinite(value)),
+                            key=self.observed.get)[:self.population_size]
+        if len(population) < 2:
+            return self.take_random(count)
+        proposals = []
+        for _ in range(count):
+            first, second = self.select_parent(population), self.select_parent(population)
+            mask = self.rng.random(self.features.shape[1]) < 0.5
+            point = np.where(mask, self.features[first], self.features[second])
+            point = point + self.rng.normal(0, self.mutation, self.features.shape[1])
+            index = self.take_nearest(point)
+            if index is not None:
+                proposals.append(index)
+        return proposals
+
+class BayesianSearch(SearchStrategy):
+    """Gaussian process on the log objective, proposing the candidates of highest expected improvement."""
+    def __init__(self, features, seed=None, initial_samples=4, length_scale=0.5, noise=1e-6):
+        super().__init__(features, seed)
+        self.initial_samples = initial_samples
+        self.length_scale = length_scale
+        self.noise = noise
+
+    def get_kernel(self, first, second):
+        distances = ((first[:, None, :] - second[None, :, :]) ** 2).sum(axis=2)
+        return np.exp(-0.5 * distances / self.length_scale ** 2)
+
+    def get_expected_improvement(self, candidates):
+        indices = np.array(sorted(self.observed))
+        values = np.array([self.observed[index] for index in indices])
+        finite = np.isfinite(values)
+        # Failed candidates are modelled as twice as bad as the worst evaluated one
+        values = np.where(finite, values, values[finite].max() * 2)
+        targets = np.log(values)
+        mean, deviation = targets.mean(), targets.std() or 1
+        targets = (targets - mean) / deviation
+        kernel = self.get_kernel(self.features[indices], self.features[indices]) + self.noise * np.eye(len(indices))
+        cross_kernel = self.get_kernel(self.features[candidates], self.features[indices])
+        cholesky = np.linalg.cholesky(kernel)
+        alpha = np.linalg.solve(cholesky.T, np.linalg.solve(cholesky, targets))
+        predicted_mean = cross_kernel @ alpha
+        v = np.linalg.solve(cholesky, cross_kernel.T)
+        predicted_deviation = np.sqrt(np.clip(1 - (v ** 2).sum(axis=0), 1e-12, None))
+        improvement = targets.min() - predicted_mean
+        z = improvement / predicted_deviation
+        cdf = 0.5 * (1 + np.vectorize(math.erf)(z / math.sqrt(2)))
+        pdf = np.exp(-0.5 * z ** 2) / math.sqrt(2 * math.pi)
+        return improvement * cdf + predicted_deviation * pdf
+
+    def propose(self, count):
+        if len(self.observed) < self.initial_samples or self.get_best() is None:
+            return self.take_random(count)
+        candidates = np.array(sorted(self.remaining))
+        if len(candidates) == 0:
+            return []
+        expected_improvement = self.get_expected_improvement(candidates)
+        best = candidates[np.argsort(-expected_improvement, kind="stable")[:count]]
+        return [self.take(int(index)) for index in best]
+
+search_strategies = {
+    "random": RandomSearch,
+    "annealing": SimulatedAnnealing,
+    "evolutionary": EvolutionarySearch,
+    "bayesian": BayesianSearch
+}
@@ -0,0 +1,152 @@
+import os
+import math
+import shutil
+import asyncio
+import itertools
+from dse_async import run_commands
+from dse_worker import StageFailure, get_workspace, copy_inputs, workspaces_directory
+from transform_pipeline import get_recipe
+
+# Predicted peak memory in GB of one Bambu run and of the OpenROAD flow of a design without unrolling
+bambu_memory_estimate = 1
+openroad_memory_estimate = 2
+
+# Growth of the loop body assumed for each fully unrolled loop
+unrolled_loop_growth = 4
+
+def get_design_scale(profile):
+    """Return the predicted growth of the synthesized design over the rolled loop nest."""
+    steps = dict(get_recipe(profile["loop_optimizer"], profile["transform"]))
+    if "unroll" not in steps:
+        return 1
+    depth, factor = steps["unroll"]
+    if depth == 0:
+        return 1
+    if factor == 0:
+        return unrolled_loop_growth ** depth
+    return unrolled_loop_growth ** (depth - 1) * factor
+
+def predict_cost(profile):
+    """Return the relative run time of a configuration, used to start the costliest ones first.
+
+    Bambu simulates the work of one tile of the layer, HLS and P&R times grow with the
+    unrolled design, and small loop tiles add loop overhead to the simulation.
+    """
+    cost = profile["flop_count"] / profile["number_of_tiles"]
+    cost *= 1 + math.log2(get_design_scale(profile))
+    steps = dict(get_recipe(profile["loop_optimizer"], profile["transform"]))
+    if "tile" in steps:
+        tile_sizes = [size for size in steps["tile"] if size > 0]
+        if tile_sizes:
+            cost *= 1 + sum(1 / size for size in tile_sizes) / len(tile_sizes)
+    return cost
+
+def predict_memory(stage, profile):
+    if stage == "bambu":
+        return bambu_memory_estimate
+    return openroad_memory_estimate * (1 + math.log2(get_design_scale(profile)))
+
+class ResourcePool:
+    """Concurrency and memory limit of one stage type.
+
+    Waiting jobs are granted in the order of their predicted cost; a cheaper job that
+    fits may start while a costlier one waits for memory. A job predicted to need more
+    than the whole memory limit runs alone.
+    """
+    def __init__(self, name, slots, memory):
+        self.name = name
+        self.slots = slots
+        self.memory = memory
+        self.running = 0
+        self.memory_used = 0
+        self.waiting = []
+        self.sequence = itertools.count()
+
+    async def acquire(self, cost, memory):
+        if self.memory is not None:
+            memory = min(memory, self.memory)
+        grant = asyncio.get_running_loop().create_future()
+        self.waiting.append((-cost, next(self.sequence), memory, grant))
+        self.dispatch()
+        try:
+            await grant
+        except asyncio.CancelledError:
+            if grant.done() and not grant.cancelled():
+                self.release(memory)
+            else:
+                self.waiting = [waiter for waiter in self.waiting if waiter[3] is not grant]
+            raise
+        return memory
+
+    def release(self, memory):
+        self.running -= 1
+        self.memory_used -= memory
+        self.dispatch()
+
+    def fits(self, memory):
+        if self.running >= self.slots:
+            return False
+        return self.memory is None or self.memory_used + memory <= self.memory
+
+    def dispatch(self):
+        self.waiting.sort(key=lambda waiter: waiter[:2])
+        for waiter in list(self.waiting):
+            memory, grant = waiter[2], waiter[3]
+            if not self.fits(memory):
+                continue
+            self.waiting.remove(waiter)
+            self.running += 1
+            self.memory_used += memory
+            grant.set_result(None)
+
+class StageScheduler:
+    """Runs the queued jobs of a DSE as Bambu -> OpenROAD stage graphs.
+
+    The front-end and Bambu stages of a configuration share the bambu resource pool, its
+    OpenROAD stage uses the openroad pool. Jobs are started in the order of their
+    predicted cost to shorten the makespan of a sweep, each in its own workspace.
+    """
+    def __init__(self, dse, bambu_jobs, bambu_memory, openroad_jobs, openroad_memory):
+        self.dse = dse
+        self.pools = {
+            "bambu": ResourcePool("bambu", bambu_jobs, bambu_memory),
+            "openroad": ResourcePool("openroad", openroad_jobs, openroad_memory)
+        }
+
+    def run(self, jobs):
+        asyncio.run(self.run_jobs(jobs))
+
+    async def run_jobs(self, jobs):
+        jobs = sorted(jobs, key=lambda job: predict_cost(job["profile"]), reverse=True)
+        await asyncio.gather(*[self.run_job(job) for job in jobs])
+
+    async def run_stage(self, stage, job, commands, workspace, keep_output):
+        pool = self.pools[stage]
+        cost = predict_cost(job["profile"])
+        memory = await pool.acquire(cost, predict_memory(stage, job["profile"]))
+        try:
+            if stage == "bambu":
+                # The workspace is only created once the job starts
+                copy_inputs(job["inputs"], get_workspace(os.path.basename(workspace)))
+                job["cycle_limit"] = self.dse.get_cycle_limit(job["state"]["current_layer_name"])
+            return await run_commands(job["configuration"], commands, self.dse.session, workspace,
+                                      job["timeouts"], job["retries"], job["cycle_limit"], keep_output)
+        finally:
+            pool.release(memory)
+
+    async def run_job(self, job):
+        workspace = os.path.join(workspaces_directory, f"job_{job['key'][:16]}")
+        openroad_commands = {key: command for key, command in job["commands"].items() if key == "3-openroad"}
+        bambu_commands = {key: command for key, command in job["commands"].items() if key != "3-openroad"}
+        try:
+            results = await self.run_stage("bambu", job, bambu_commands, workspace, bool(openroad_commands))
+            if openroad_commands:
+                openroad_results = await self.run_stage("openroad", job, openroad_commands, workspace, False)
+                results["total_power"] = openroad_results["total_power"]
+                results["available_area"] = openroad_results["available_area"]
+        except StageFailure as failure:
+            self.dse.fail_job(job, failure)
+            return
+        finally:
+            shutil.rmtree(workspace, ignore_errors=True)
+        self.dse.complete_job(job, results)
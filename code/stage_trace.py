@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import glob
+import time
+import shlex
+import socket
+import resource
+import subprocess
+
+trace_directory = "traces"
+
+def get_output_size(working_directory, configuration):
+    """Return the bytes of the output files and folders of a configuration."""
+    size = 0
+    for path in glob.glob(os.path.join(working_directory, "output", f"*{configuration}*")):
+        if os.path.isfile(path):
+            size += os.path.getsize(path)
+            continue
+        for directory, _, file_names in os.walk(path):
+            for file_name in file_names:
+                file_path = os.path.join(directory, file_name)
+                if not os.path.islink(file_path):
+                    size += os.path.getsize(file_path)
+    return size
+
+def write_span(span):
+    """Append a span to the trace file of this process, which the DSE merges at the end of its run."""
+    if not os.path.exists(trace_directory):
+        os.makedirs(trace_directory, exist_ok=True)
+    span = dict(span, host=socket.gethostname(), pid=os.getpid())
+    file_path = os.path.join(trace_directory, f"stages-{socket.gethostname()}-{os.getpid()}.jsonl")
+    with open(file_path, "a", encoding="UTF-8") as file:
+        file.write(json.dumps(span) + "\n")
+
+class StageSpan:
+    """Wall time, CPU time, peak RSS and bytes written of one attempt of a stage.
+
+    The stage command runs under this module, which writes the resource usage of the
+    command's process tree to a usage file when it exits. Tools running in a Docker
+    container are not children of the command, so only their wall time and output are
+    measured.
+    """
+    def __init__(self, key, configuration, working_directory, attempt):
+        self.key = key
+        self.configuration = configuration
+        self.working_directory = working_directory
+        self.attempt = attempt
+        self.usage_path = os.path.abspath(os.path.join(working_directory, "output", f"usage-{key}-{configuration}.json"))
+        os.makedirs(os.path.dirname(self.usage_path), exist_ok=True)
+        self.output_size = get_output_size(working_directory, configuration)
+        self.start = time.time()
+        self.start_monotonic = time.monotonic()
+
+    def get_command(self, command):
+        return f"{shlex.quote(sys.executable)} {shlex.quote(os.path.abspath(__file__))} {shlex.quote(self.usage_path)} {shlex.quote(command)}"
+
+    def finish(self, outcome="ok"):
+        wall_time = time.monotonic() - self.start_monotonic
+        usage = {}
+        if os.path.exists(self.usage_path):
+            with open(self.usage_path, "r", encoding="UTF-8") as file:
+                usage = json.load(file)
+            os.remove(self.usage_path)
+        write_span({
+            "stage": self.key,
+            "configuration": self.configuration,
+            "attempt": self.attempt,
+            "outcome": outcome,
+            "start": self.start,
+            "wall_time": wall_time,
+            "cpu_time": usage.get("cpu_time"),
+            "peak_rss": usage.get("peak_rss"),
+            "bytes_written": max(0, get_output_size(self.working_directory, self.configuration) - self.output_size)
+        })
+
+def read_spans(since):
+    """Return the spans of every process started at or after the time since, in start order."""
+    spans = []
+    for file_path in glob.glob(os.path.join(trace_directory, "stages-*.jsonl")):
+        with open(file_path, "r", encoding="UTF-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                span = json.loads(line)
+                if span["start"] >= since:
+                    spans.append(span)
+    return sorted(spans, key=lambda span: span["start"])
+
+def get_trace_events(spans):
+    """Return the spans as Chrome trace events, one process per worker and one thread per concurrent stage."""
+    events = []
+    processes = {}
+    lanes = {}
+    origin = spans[0]["start"] if spans else 0
+    for span in spans:
+        process = (span["host"], span["pid"])
+        if process not in processes:
+            processes[process] = len(processes) + 1
+            lanes[process] = []
+            events.append({"name": "process_name", "ph": "M", "pid": processes[process],
+                           "args": {"name": f"{span['host']} {span['pid']}"}})
+        # Stages of one process may overlap, as in the asyncio orchestrator
+        ends = lanes[process]
+        end = span["start"] + span["wall_time"]
+        lane = next((index for index, lane_end in enumerate(ends) if lane_end <= span["start"]), len(ends))
+        if lane == len(ends):
+            ends.append(end)
+        ends[lane] = end
+        events.append({
+            "name": span["stage"],
+            "cat": span["outcome"],
+            "ph": "X",
+            "ts": round((span["start"] - origin) * 1e6),
+            "dur": round(span["wall_time"] * 1e6),
+            "pid": processes[process],
+            "tid": lane + 1,
+            "args": {name: span[name] for name in ["configuration", "attempt", "outcome", "cpu_time", "peak_rss", "bytes_written"]}
+        })
+    return events
+
+def get_stage_summary(spans):
+    """Return one row per stage with its runs, failures, wall and CPU time, largest peak RSS and bytes written."""
+    total_wall_time = sum(span["wall_time"] for span in spans)
+    stages = {}
+    for span in spans:
+        stage = stages.setdefault(span["stage"], {"stage": span["stage"], "runs": 0, "failures": 0, "wall_time": 0,
+                                                  "max_wall_time": 0, "cpu_time": 0, "peak_rss": 0, "bytes_written": 0})
+        stage["runs"] += 1
+        stage["failures"] += span["outcome"] != "ok"
+        stage["wall_time"] += span["wall_time"]
+        stage["max_wall_time"] = max(stage["max_wall_time"], span["wall_time"])
+        stage["cpu_time"] += span["cpu_time"] or 0
+        stage["peak_rss"] = max(stage["peak_rss"], span["peak_rss"] or 0)
+        stage["bytes_written"] += span["bytes_written"]
+    rows = sorted(stages.values(), key=lambda stage: stage["wall_time"], reverse=True)
+    for row in rows:
+        row["share"] = row["wall_time"] / total_wall_time if total_wall_time else 0
+    return rows
+
+def print_stage_summary(rows):
+    columns = ["stage", "runs", "failures", "wall_time", "mean_wall_time", "max_wall_time", "share", "cpu_time",
+               "peak_rss_mb", "written_mb"]
+    table = [columns]
+    for row in rows:
+        table.append([row["stage"], str(row["runs"]), str(row["failures"]), f"{row['wall_time']:.1f}",
+                      f"{row['wall_time'] / row['runs']:.1f}", f"{row['max_wall_time']:.1f}", f"{row['share']:.1%}",
+                      f"{row['cpu_time']:.1f}", f"{row['peak_rss'] / 2 ** 20:.1f}", f"{row['bytes_written'] / 2 ** 20:.1f}"])
+    widths = [max(len(line[index]) for line in table) for index in range(len(columns))]
+    for line in table:
+        print("  ".join(value.ljust(width) for value, width in zip(line, widths)))
+
+def write_trace(model_name, since):
+    """Write the stages run since the start of a DSE run as Chrome trace JSON and print their summary.
+
+    The trace opens in chrome://tracing and ui.perfetto.dev. Times are in seconds.
+    """
+    spans = read_spans(since)
+    if not spans:
+        return None
+    file_path = os.path.join(trace_directory, f"{model_name}_trace.json")
+    with open(file_path, "w", encoding="UTF-8") as file:
+        json.dump({"traceEvents": get_trace_events(spans), "displayTimeUnit": "ms"}, file)
+    print("===========================")
+    print(f"Stages of {len(set(span['configuration'] for span in spans if span['configuration']))} configurations:")
+    print_stage_summary(get_stage_summary(spans))
+    print(f"Trace: {file_path}")
+    return file_path
+
+def main():
+    """Run a stage command and write the resource usage of its process tree, exiting with its exit code.
+
+    The command runs in bash with pipefail, so that a pipe fails when any of its tools does.
+    """
+    usage_path, command = sys.argv[1:3]
+    return_code = subprocess.call(["bash", "-o", "pipefail", "-c", command])
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    with open(usage_path, "w", encoding="UTF-8") as file:
+        # ru_maxrss is in KB on Linux
+        json.dump({"cpu_time": usage.ru_utime + usage.ru_stime, "peak_rss": usage.ru_maxrss * 1024}, file)
+    sys.exit(return_code if return_code >= 0 else 128 - return_code)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import glob
+import numpy as np
+from results_csv import read_results_csv
+from transform_pipeline import get_recipe
+
+# Predicted results, in the form run_commands returns them
+targets = ["simulation_cycles", "total_power", "available_area"]
+
+def get_transform_features(loop_optimizer, transform):
+    if loop_optimizer == "joint":
+        return [feature for name, step in get_recipe(loop_optimizer, transform)
+                for feature in get_transform_features(name, step)]
+    elif loop_optimizer == "permute":
+        return [float(order) for order in transform.split(",")]
+    elif loop_optimizer == "tile":
+        return [np.log2(size + 1) for size in transform]
+    return [transform[0], np.log2(transform[1] + 1)]
+
+def get_features(loop_optimizer, signature, transform, flop_count, number_of_tiles):
+    """Return the feature vector of a configuration: log layer shape, transform and work per tile."""
+    features = [np.log2(1 + value) for value in signature[1:]]
+    features += get_transform_features(loop_optimizer, transform)
+    features.append(np.log2(flop_count / number_of_tiles))
+    return features
+
+def get_work(flop_count, number_of_tiles):
+    return flop_count / number_of_tiles
+
+class SurrogateModel:
+    """Distance-weighted k-nearest-neighbour model of the measured results.
+
+    One model per (layer kind, loop optimizer) predicts the log simulation cycles per FLOP
+    of a tile and the log power and area, from standardized features. Normalizing the
+    cycles by the work of a tile lets the model carry over to layers of other sizes.
+    """
+    def __init__(self, neighbours=5):
+        self.neighbours = neighbours
+        self.groups = {}
+        self.errors = {target: [] for target in targets}
+
+    def add(self, layer_kind, loop_optimizer, signature, transform, flop_count, number_of_tiles, results):
+        features = get_features(loop_optimizer, signature, transform, flop_count, number_of_tiles)
+        work = get_work(flop_count, number_of_tiles)
+        values = [results["simulation_cycles"] / work, results["total_power"], results["available_area"]]
+        if any(value is None or value <= 0 for value in values):
+            return
+        group = self.groups.setdefault((layer_kind, loop_optimizer), {"features": [], "values": [], "signatures": []})
+        if group["features"] and len(features) != len(group["features"][0]):
+            return
+        group["features"].append(features)
+        group["values"].append(np.log(values))
+        group["signatures"].append(tuple(signature))
+
+    def load_corpus(self, pattern="results/*.csv"):
+        self.load_records(record for file_path in sorted(glob.glob(pattern)) for record in read_results_csv(file_path))
+
+    def load_records(self, records):
+        count = 0
+        for record in records:
+            self.add(record["layer_kind"], record["loop_optimizer"], record["signature"], record["transform"],
+                     record["flop_count"], record["number_of_tiles"], record["results"])
+            count += 1
+        print(f"Surrogate model trained on {count} results")
+
+    def get_neighbour_values(self, train_features, train_values, features):
+        mean = train_features.mean(axis=0)
+        deviation = train_features.std(axis=0)
+        deviation[deviation == 0] = 1
+        train_features = (train_features - mean) / deviation
+        features = (features - mean) / deviation
+        distances = ((features[:, None, :] - train_features[None, :, :]) ** 2).sum(axis=2)
+        nearest = np.argsort(distances, axis=1, kind="stable")[:, :self.neighbours]
+        weights = 1 / (np.take_along_axis(distances, nearest, axis=1) + 1e-3)
+        return (train_values[nearest] * weights[:, :, None]).sum(axis=1) / weights.sum(axis=1)[:, None]
+
+    def predict(self, layer_kind, loop_optimizer, signature, transforms, flop_count, number_of_tiles):
+        """Return the predicted results of each transform of a layer, or None without training data."""
+        group = self.groups.get((layer_kind, loop_optimizer))
+        if group is None:
+            return None
+        features = np.array([get_features(loop_optimizer, signature, transform, flop_count, number_of_tiles)
+                             for transform in transforms])
+        if features.shape[1] != len(group["features"][0]):
+            return None
+        values = np.exp(self.get_neighbour_values(np.array(group["features"]), np.array(group["values"]), features))
+        work = get_work(flop_count, number_of_tiles)
+        return [{"simulation_cycles": cycles * work, "total_power": power, "available_area": area}
+                for cycles, power, area in values]
+
+    def record_error(self, prediction, results):
+        for target in targets:
+            if results[target]:
+                self.errors[target].append(abs(prediction[target] / results[target] - 1))
+
+    def report_errors(self):
+        """Print the median relative error of the predictions checked against real results so far."""
+        if not self.errors["simulation_cycles"]:
+            return
+        errors = ", ".join(f"{target} {np.median(self.errors[target]) * 100:.1f}%" for target in targets)
+        print(f"Surrogate error over {len(self.errors['simulation_cycles'])} configurations: {errors}")
+
+    def cross_validate(self, folds=5, seed=0):
+        """Print the median relative error of each model, holding out whole layer shapes per fold."""
+        for (layer_kind, loop_optimizer), group in sorted(self.groups.items()):
+            signatures = sorted(set(group["signatures"]))
+            if len(signatures) < 2:
+                continue
+            np.random.default_rng(seed).shuffle(signatures)
+            fold_of = {signature: index % folds for index, signature in enumerate(signatures)}
+            features = np.array(group["features"])
+            values = np.array(group["values"])
+            fold = np.array([fold_of[signature] for signature in group["signatures"]])
+            errors = []
+            for held_out in range(min(folds, len(signatures))):
+                test = fold == held_out
+                predicted = self.get_neighbour_values(features[~test], values[~test], features[test])
+                errors.append(np.abs(np.exp(predicted - values[test]) - 1))
+            errors = np.median(np.concatenate(errors), axis=0) * 100
+            print(f"Surrogate {layer_kind} {loop_optimizer}: cycles {errors[0]:.1f}%, power {errors[1]:.1f}%, "
+                  f"area {errors[2]:.1f}% held-out error")
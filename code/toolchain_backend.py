@@ -0,0 +1,244 @@
+import os
+import re
+import sys
+import math
+import time
+import hashlib
+from loop_nest import get_loop_nest
+
+# Commands run with soda-opt/mlir-opt/mlir-translate, through the prefix of the backend
+toolchain_stages = ["1-frontend", "1a-soda", "1b-mlir", "1c-soda", "1d-mlir-opt", "1e-soda"]
+toolchain_tools = ["soda-opt", "mlir-opt", "mlir-translate"]
+
+# Bambu options of the HLS parameters of the flow: 100 MHz on NanGate45 without BRAMs
+bambu_options = [
+    "-v3", "-lm", "--soft-float", "--compiler=I386_CLANG16", "--device=nangate45", "--clock-period=10",
+    "--experimental-setup=BAMBU-BALANCED-MP", "--channels-number=2", "--memory-allocation-policy=NO_BRAM",
+    "--disable-function-proxy", "--generate-tb=../../main_kernel_test.xml", "--simulate", "--simulator=VERILATOR",
+    "--top-fname=main_kernel"
+]
+max_sim_cycles = 2 ** 32 - 1
+
+mock_directory = ".mock_toolchain"
+
+class ToolchainBackend:
+    """Runs the tools of the flow: the front-end commands and the Bambu and OpenROAD stages.
+
+    Every backend leaves the Bambu log and the OpenROAD report where the synthesis
+    flow generated by Bambu writes them.
+    """
+    name = None
+    # Whether commands run in containers that a persistent toolchain session can reuse
+    containerized = False
+
+    def get_prefix(self):
+        """Return the prefix of the front-end commands."""
+        return ""
+
+    def get_bambu_command(self, configuration):
+        raise NotImplementedError
+
+    def get_openroad_command(self, configuration):
+        raise NotImplementedError
+
+    def get_bambu_log_path(self, configuration, working_directory):
+        return os.path.join(working_directory, f'output/{configuration}/bambu-log')
+
+    def get_openroad_report_path(self, configuration, working_directory):
+        log_path_suffix = 'HLS_output/Synthesis/bash_flow/openroad/logs/nangate45/main_kernel/base/6_report.log'
+        return os.path.join(working_directory, f'output/{configuration}/' + log_path_suffix)
+
+class DockerBackend(ToolchainBackend):
+    """Runs the front-end in the SODA container and Bambu and OpenROAD through the run scripts."""
+    name = "docker"
+    containerized = True
+    image = "agostini01/soda"
+
+    def get_prefix(self):
+        return f"docker run -u $(id -u) -v $(pwd):/working_dir --rm {self.image}"
+
+    def get_bambu_command(self, configuration):
+        return f"scripts/run-bambu.sh {configuration} 2>&1 | tee ./output/bambu-{configuration}.log"
+
+    def get_openroad_command(self, configuration):
+        return f"scripts/run-openroad.sh {configuration} 2>&1 | tee ./output/openroad-{configuration}.log"
+
+class NativeBackend(ToolchainBackend):
+    """Runs soda-opt, mlir-opt, mlir-translate, Bambu and OpenROAD installed on the host.
+
+    Bambu runs in the output folder of the configuration and writes the synthesis flow
+    that the OpenROAD stage then runs.
+    """
+    name = "native"
+
+    def get_bambu_command(self, configuration):
+        options = " ".join(bambu_options + [f"--max-sim-cycles=${{DSE_MAX_SIM_CYCLES:-{max_sim_cycles}}}"])
+        return f"mkdir -p output/{configuration} && (cd output/{configuration} && bambu {options} ../05{configuration}.ll) " \
+            f"2>&1 | tee output/{configuration}/bambu-log ./output/bambu-{configuration}.log"
+
+    def get_openroad_command(self, configuration):
+        return f"(cd output/{configuration}/HLS_output/Synthesis/bash_flow && ./synthesize_Synthesis_main_kernel.sh) " \
+            f"2>&1 | tee ./output/openroad-{configuration}.log"
+
+class MockBackend(ToolchainBackend):
+    """Fabricates deterministic, plausible tool outputs without the toolchain.
+
+    The front-end tools copy their input and note their passes, so the LLVM IR of a
+    configuration is its layer and its pass pipeline. Bambu estimates the cycles and
+    area of the loop nest from them, OpenROAD the power and area of that design. Both
+    honor DSE_MAX_SIM_CYCLES and sleep DSE_MOCK_DELAY seconds per million cycles, or
+    per 10000 um^2, to emulate tool run times.
+    """
+    name = "mock"
+
+    def __init__(self):
+        self.bin_directory = os.path.abspath(os.path.join(mock_directory, "bin"))
+        if not os.path.exists(self.bin_directory):
+            os.makedirs(self.bin_directory, exist_ok=True)
+        for tool in toolchain_tools:
+            shim_path = os.path.join(self.bin_directory, tool)
+            with open(shim_path, "w", encoding="UTF-8") as file:
+                file.write(f"#!/bin/sh\nexec \"{sys.executable}\" \"{os.path.abspath(__file__)}\" tool {tool} \"$@\"\n")
+            os.chmod(shim_path, 0o755)
+
+    def get_prefix(self):
+        return f"env PATH={self.bin_directory}:$PATH"
+
+    def get_bambu_command(self, configuration):
+        return f"{sys.executable} {os.path.abspath(__file__)} bambu {configuration} 2>&1 | tee ./output/bambu-{configuration}.log"
+
+    def get_openroad_command(self, configuration):
+        return f"{sys.executable} {os.path.abspath(__file__)} openroad {configuration} 2>&1 | tee ./output/openroad-{configuration}.log"
+
+toolchain_backends = {
+    "docker": DockerBackend,
+    "native": NativeBackend,
+    "mock": MockBackend
+}
+
+def get_jitter(text, spread=0.05):
+    """Return a deterministic factor within 1 +- spread for a text."""
+    digest = hashlib.blake2b(text.encode(), digest_size=8).digest()
+    return 1 + spread * (int.from_bytes(digest, "big") / 2 ** 63 - 1)
+
+def get_mock_delay():
+    return float(os.environ.get("DSE_MOCK_DELAY") or 0)
+
+def run_mock_tool(tool, arguments):
+    """Copy the input IR to the output, noting the passes of the tool."""
+    output_path = None
+    input_paths = []
+    passes = []
+    arguments = iter(arguments)
+    for argument in arguments:
+        if argument == "-o":
+            output_path = next(arguments)
+        elif argument.startswith("-"):
+            passes.append(argument)
+        else:
+            input_paths.append(argument)
+    if input_paths:
+        with open(input_paths[0], "r", encoding="UTF-8") as file:
+            text = file.read()
+    else:
+        text = sys.stdin.read()
+    if "--mlir-print-ir-after-all" in passes:
+        sys.stderr.write(text)
+    text += f"// {tool} {' '.join(passes)}\n"
+    if output_path is None:
+        sys.stdout.write(text)
+    else:
+        with open(output_path, "w", encoding="UTF-8") as file:
+            file.write(text)
+
+def estimate_design(ll_path):
+    """Return the simulation cycles and area estimate of the loop nest of a mock LLVM IR file.
+
+    Unrolled innermost loops run in parallel with diminishing returns, as the memory
+    channels are shared, an innermost reduction loop keeps its accumulator in a register,
+    and every tile adds loop overhead.
+    """
+    with open(ll_path, "r", encoding="UTF-8") as file:
+        text = file.read()
+    _, loops = get_loop_nest(ll_path)
+    trip_counts = [loop["trip_count"] for loop in loops]
+    tile_sizes = re.search(r'tile-sizes=([\d,]+)', text)
+    tile_sizes = [int(size) for size in tile_sizes.group(1).split(",")] if tile_sizes else [0] * len(loops)
+    point_trip_counts = [size if 0 < size < trip_count else trip_count for size, trip_count in zip(tile_sizes, trip_counts)]
+    tiles = math.prod(math.ceil(trip_count / size) for size, trip_count in zip(point_trip_counts, trip_counts))
+    order = list(range(len(loops)))
+    permutation_map = re.search(r'permutation-map=([\d,]+)', text)
+    if permutation_map:
+        positions = [int(position) for position in permutation_map.group(1).split(",")]
+        # Permutations after tiling reorder the point loops below the tile loops
+        positions = [position - (len(positions) - len(loops)) for position in positions[len(positions) - len(loops):]]
+        for index, position in enumerate(positions):
+            order[position] = index
+    unroll_factor = re.search(r'unroll-factor=(\d+)', text)
+    unrolled = [point_trip_counts[index] for index in reversed(order)][:text.count("unroll-full") + bool(unroll_factor)]
+    if unroll_factor:
+        unrolled[-1] = min(unrolled[-1], int(unroll_factor.group(1)))
+    parallelism = math.prod(unrolled)
+    cycles_per_mac = 6
+    if loops[order[-1]]["iterator_type"] == "reduction" and not unrolled:
+        cycles_per_mac = 4
+    jitter = get_jitter(text)
+    cycles = math.prod(trip_counts) * cycles_per_mac / (1 + 2 * math.log2(parallelism)) + 8 * tiles
+    area = (1500 + 900 * parallelism) * get_jitter(text[::-1])
+    return int(cycles * jitter) + 100, round(area, 2)
+
+def run_mock_bambu(configuration):
+    ll_path = f"output/05{configuration}.ll"
+    if not os.path.exists(ll_path) or os.path.getsize(ll_path) == 0:
+        print(f"error: {ll_path} is missing")
+        return 1
+    cycles, area = estimate_design(ll_path)
+    cycle_limit = int(os.environ.get("DSE_MAX_SIM_CYCLES") or max_sim_cycles)
+    steps = 4
+    for step in range(1, steps + 1):
+        time.sleep(get_mock_delay() * cycles / 1e6 / steps)
+        reported = cycles * step // steps
+        if reported > cycle_limit:
+            print(f"error: simulation stopped after {reported} cycles")
+            return 1
+        print(f"Simulated {reported} cycles", flush=True)
+    log_path = ToolchainBackend().get_bambu_log_path(configuration, ".")
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, "w", encoding="UTF-8") as file:
+        file.write(f"Simulation completed with SUCCESS; Execution time {cycles} cycles;\n")
+        file.write(f"1. Average execution: {cycles} cycles\n")
+        file.write(f"  Total estimated area: {area} um^2\n")
+    return 0
+
+def run_mock_openroad(configuration):
+    log_path = ToolchainBackend().get_bambu_log_path(configuration, ".")
+    if not os.path.exists(log_path):
+        print(f"error: {log_path} is missing")
+        return 1
+    with open(log_path, "r", encoding="UTF-8") as file:
+        log = file.read()
+    bambu_area = float(re.search(r'Total estimated area: ([\d.]+)', log).group(1))
+    area = round(bambu_area * 1.4 * get_jitter(log), 1)
+    power = area * 2.5e-6 * get_jitter(log[::-1], 0.2)
+    time.sleep(get_mock_delay() * area / 1e4)
+    report_path = ToolchainBackend().get_openroad_report_path(configuration, ".")
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, "w", encoding="UTF-8") as file:
+        file.write("Group                  Internal  Switching    Leakage      Total\n")
+        file.write(f"Total                  {power * 0.6:.2e}   {power * 0.38:.2e}   {power * 0.02:.2e}   {power:.2e} 100.0%\n")
+        file.write(f"Design area {area:g} u^2 {round(50 + 20 * (get_jitter(log, 1) - 1))}% utilization.\n")
+    print(f"Reported {power:.2e} W on {area:g} u^2")
+    return 0
+
+def main():
+    """Entry point of the mock tools: tool <soda-opt|mlir-opt|mlir-translate> <arguments>, bambu or openroad <configuration>."""
+    command, arguments = sys.argv[1], sys.argv[2:]
+    if command == "tool":
+        run_mock_tool(arguments[0], arguments[1:])
+    elif command == "bambu":
+        sys.exit(run_mock_bambu(arguments[0]))
+    elif command == "openroad":
+        sys.exit(run_mock_openroad(arguments[0]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import os
+import time
+import subprocess
+from stage_trace import write_span
+from toolchain_backend import toolchain_stages
+
+session_label = "soda-dse"
+
+class ToolchainSession:
+    """Runs toolchain commands through the prefix of the backend, or in one long-lived container.
+
+    A persistent session of a containerized backend starts the container once in the
+    working directory and sends every command through docker exec. All containers of a
+    run share the owner label so that they can be removed together with stop_sessions().
+    """
+    def __init__(self, backend, persistent, owner, working_directory="."):
+        self.backend = backend
+        self.persistent = persistent and backend.containerized
+        self.owner = owner
+        self.working_directory = working_directory
+        self.container_name = None
+
+    def start(self):
+        if not self.persistent or self.container_name is not None:
+            return
+        self.container_name = f"{session_label}-{self.owner}-{os.getpid()}"
+        start = time.time()
+        command = f"docker run -d --rm -u $(id -u) -v $(pwd):/working_dir -w /working_dir \
+            --name {self.container_name} --label {session_label}={self.owner} \
+            --entrypoint sleep {self.backend.image} infinity"
+        subprocess.run(command, shell=True, check=True, stdout=subprocess.DEVNULL, cwd=self.working_directory)
+        write_span({"stage": "toolchain-session", "configuration": None, "attempt": 0, "outcome": "ok", "start": start,
+                    "wall_time": time.time() - start, "cpu_time": None, "peak_rss": None, "bytes_written": 0})
+        print(f"Started toolchain session {self.container_name}")
+
+    def stop(self):
+        if self.container_name is None:
+            return
+        subprocess.run(f"docker rm -f {self.container_name}", shell=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        print(f"Stopped toolchain session {self.container_name}")
+        self.container_name = None
+
+    def get_prefix(self, working_directory=None):
+        if self.container_name is not None:
+            if working_directory is not None and os.path.abspath(working_directory) != os.path.abspath(self.working_directory):
+                # Commands of a subdirectory of the session, such as a job workspace
+                subdirectory = os.path.relpath(working_directory, self.working_directory)
+                return f"docker exec -w /working_dir/{subdirectory} {self.container_name}"
+            return f"docker exec {self.container_name}"
+        return self.backend.get_prefix()
+
+    def get_command(self, key, command, working_directory=None):
+        """Return the shell command of a stage, running toolchain stages through the session."""
+        if key in toolchain_stages:
+            prefix = self.get_prefix(working_directory)
+            return f"{prefix} {command}" if prefix else command
+        return command
+
+def stop_sessions(owner):
+    """Remove every session container started for the owner, including those of worker processes."""
+    subprocess.run(f"docker ps -aq --filter label={session_label}={owner} | xargs -r docker rm -f",
+                   shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
@@ -0,0 +1,111 @@
+from itertools import product
+
+# Loop transformations in the order a joint recipe applies them
+transform_order = ["tile", "permute", "unroll"]
+
+# soda-opt passes of step 1c lowering the affine loop nest for Bambu
+soda_opt_bambu_pipeline = [
+    "-affine-scalrep",
+    "-cse",
+    "-affine-data-copy-generate='generate-dma=false fast-mem-space=0'",
+    "-erase-buffer-deallocation",
+    "-promote-buffers-to-stack='max-rank-of-allocated-memref=4 max-alloc-size-in-bytes=4096'",
+    "-lower-affine",
+    "-convert-scf-to-cf",
+    "-convert-memref-to-llvm",
+    "-convert-math-to-llvm",
+    "-convert-math-to-libm",
+    "-arith-expand",
+    "-memref-expand",
+    "-convert-arith-to-llvm",
+    "-convert-func-to-llvm='use-bare-ptr-memref-call-conv'",
+    "-reconcile-unrealized-casts"
+]
+
+def get_loop_optimizer(args):
+    """Return the loop optimizer of the arguments, 'joint' when several loop transformations are given."""
+    enabled = [name for name in transform_order if getattr(args, name)]
+    if len(enabled) > 1:
+        return "joint"
+    return enabled[0] if enabled else None
+
+def get_recipe(loop_optimizer, transform):
+    """Return the (loop_optimizer, transform) steps of a transform, in the order they are applied.
+
+    The transform of the joint loop optimizer maps loop optimizers to their transforms.
+    """
+    if loop_optimizer == "joint":
+        return [(name, transform[name]) for name in transform_order if name in transform]
+    return [(loop_optimizer, transform)]
+
+def is_tiled(tile_sizes):
+    return any(size != 0 for size in tile_sizes)
+
+def offset_permutation_map(permutation, loop_offset):
+    """Return the permutation map of the loops below the outermost loop_offset loops of the nest."""
+    if loop_offset == 0:
+        return permutation
+    orders = [int(order) for order in permutation.split(",")]
+    orders = list(range(loop_offset)) + [loop_offset + order for order in orders]
+    return ",".join(str(order) for order in orders)
+
+def get_unroll_passes(unroll):
+    """Return the unroll passes of (number of fully unrolled innermost loops, factor of the last one)."""
+    loop_unroll_full_string = "-affine-loop-unroll='unroll-full'"
+    loop_unroll_factor_string = f"-affine-loop-unroll='unroll-factor={unroll[1]}'"
+    if unroll[1] == 0:
+        loop_unroll_string_list = [loop_unroll_full_string] * unroll[0]
+    else:
+        loop_unroll_string_list = [loop_unroll_full_string] * (unroll[0] - 1) + [loop_unroll_factor_string]
+    return " ".join(loop_unroll_string_list)
+
+def get_soda_opt_passes(recipe):
+    """Return the soda-opt passes of step 1c applying the loop transformations of a recipe.
+
+    Tiling and permutation run on the affine loop nest before scalar replacement,
+    unrolling after it. Tiling an n-deep nest yields n tile loops around n point loops,
+    so a permutation after tiling reorders the point loops. Unrolling always works on
+    the innermost loops. A recipe of one step gives the pipeline of that loop optimizer.
+    """
+    steps = dict(recipe)
+    leading_passes = []
+    loop_offset = 0
+    if "tile" in steps and is_tiled(steps["tile"]):
+        tiling_combination_string = ",".join(str(i) for i in steps["tile"])
+        leading_passes.append(f"-affine-loop-tile='tile-sizes={tiling_combination_string}'")
+        loop_offset = len(steps["tile"])
+    if "permute" in steps:
+        permutation_map = offset_permutation_map(steps["permute"], loop_offset)
+        leading_passes.append(f"-test-loop-permutation='permutation-map={permutation_map}'")
+    passes = list(soda_opt_bambu_pipeline)
+    if "tile" in steps:
+        passes.pop(4)
+    if "unroll" in steps:
+        passes[2:4] = [get_unroll_passes(steps["unroll"])]
+    return leading_passes + passes
+
+def get_recipe_name(recipe):
+    """Return the transform recipe as recorded in results CSV files, such as tile=1x14x14;unroll=3x0."""
+    parts = []
+    for loop_optimizer, transform in recipe:
+        if loop_optimizer == "permute":
+            parts.append(f"permute={transform}")
+        else:
+            parts.append(f"{loop_optimizer}={'x'.join(str(value) for value in transform)}")
+    return ";".join(parts)
+
+def parse_recipe_name(recipe_name):
+    """Return the joint transform of a recipe name written by get_recipe_name."""
+    transform = {}
+    for part in recipe_name.split(";"):
+        loop_optimizer, value = part.split("=")
+        if loop_optimizer == "permute":
+            transform[loop_optimizer] = value
+        else:
+            transform[loop_optimizer] = [int(size) for size in value.split("x")]
+    return transform
+
+def get_joint_candidates(candidates):
+    """Return every combination of the candidates of each loop optimizer, as joint transforms."""
+    names = [name for name in transform_order if name in candidates]
+    return [dict(zip(names, combination)) for combination in product(*(candidates[name] for name in names))]
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+import dse_worker
+from dse_worker import StageFailure, run_job, start_worker_session
+from toolchain_session import stop_sessions
+
+# Seconds between polls of the queue by the coordinator and idle workers
+queue_poll_interval = 2
+
+# Leases of a job that may expire before it is given up as lost
+max_attempts = 3
+
+schema = [
+    """CREATE TABLE IF NOT EXISTS jobs (
+        key TEXT PRIMARY KEY,
+        configuration TEXT,
+        layer TEXT,
+        payload TEXT,
+        status TEXT,
+        worker TEXT,
+        lease_expires REAL,
+        attempts INTEGER DEFAULT 0,
+        outcome TEXT,
+        collected INTEGER DEFAULT 0)""",
+    "CREATE TABLE IF NOT EXISTS cycle_limits (layer TEXT PRIMARY KEY, cycle_limit INTEGER)",
+    "CREATE TABLE IF NOT EXISTS sweep (name TEXT PRIMARY KEY, value TEXT)"
+]
+
+class WorkQueue:
+    """SQLite work queue shared by a coordinator and any number of workers.
+
+    Jobs are pending, leased by a worker until lease_expires, then done or failed. A
+    worker extends its lease with heartbeats; leases that expire are given back to the
+    queue, up to max_attempts times. A lease is identified by the worker and the attempt
+    it was claimed in, so a worker that lost its lease can neither extend it nor record
+    an outcome over the one of the worker holding the job now. The database can live on
+    a filesystem shared by several hosts, every process opens its own connection.
+    """
+    def __init__(self, database_path):
+        self.connection = sqlite3.connect(database_path, timeout=60, isolation_level=None)
+        for statement in schema:
+            self.connection.execute(statement)
+
+    def transaction(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+
+    def add(self, layer, jobs):
+        """Queue jobs, requeueing those whose outcome was already collected by an earlier sweep."""
+        self.transaction()
+        for job in jobs:
+            self.connection.execute(
+                """INSERT INTO jobs (key, configuration, layer, payload, status) VALUES (?, ?, ?, ?, 'pending')
+                ON CONFLICT(key) DO UPDATE SET payload = excluded.payload, status = 'pending', worker = NULL,
+                attempts = 0, outcome = NULL, collected = 0 WHERE collected = 1""",
+                (job["key"], job["configuration"], layer(job), json.dumps(job)))
+        self.connection.execute("COMMIT")
+
+    def requeue_expired(self):
+        now = time.time()
+        expired = self.connection.execute(
+            "SELECT key, attempts FROM jobs WHERE status = 'leased' AND lease_expires < ?", (now,)).fetchall()
+        for key, attempts in expired:
+            if attempts >= max_attempts:
+                # Lost workers say nothing about the configuration, so the failure is not cached
+                failure = StageFailure("lease_expired", "queue", f"lease expired {attempts} times", transient=True)
+                self.set_outcome(key, "failed", {"failure": failure.args})
+            else:
+                self.connection.execute("UPDATE jobs SET status = 'pending', worker = NULL WHERE key = ?", (key,))
+            print(f"Lease of {key[:12]} expired")
+
+    def claim(self, worker, lease):
+        """Lease the oldest pending job to the worker and return it with its lease attempt, or None."""
+        self.transaction()
+        try:
+            self.requeue_expired()
+            row = self.connection.execute(
+                "SELECT key, layer, payload FROM jobs WHERE status = 'pending' ORDER BY rowid LIMIT 1").fetchone()
+            if row is None:
+                return None
+            key, layer, payload = row
+            attempt = self.connection.execute("SELECT attempts + 1 FROM jobs WHERE key = ?", (key,)).fetchone()[0]
+            self.connection.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE key = ?",
+                (worker, time.time() + lease, key))
+            limit = self.connection.execute("SELECT cycle_limit FROM cycle_limits WHERE layer = ?", (layer,)).fetchone()
+        finally:
+            self.connection.execute("COMMIT")
+        job = json.loads(payload)
+        job["cycle_limit"] = limit[0] if limit is not None else None
+        job["attempt"] = attempt
+        return job
+
+    def heartbeat(self, key, worker, attempt, lease):
+        """Extend the lease of the worker, returning False if it no longer holds it."""
+        cursor = self.connection.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE key = ? AND worker = ? AND attempts = ? AND status = 'leased'",
+            (time.time() + lease, key, worker, attempt))
+        return cursor.rowcount == 1
+
+    def set_outcome(self, key, status, outcome):
+        self.connection.execute("UPDATE jobs SET status = ?, outcome = ?, lease_expires = NULL WHERE key = ?",
+                                (status, json.dumps(outcome), key))
+
+    def finish(self, key, worker, attempt, status, outcome):
+        """Record the outcome of a lease, returning False and ignoring it if the worker no longer holds the lease."""
+        cursor = self.connection.execute(
+            """UPDATE jobs SET status = ?, outcome = ?, lease_expires = NULL
+            WHERE key = ? AND worker = ? AND attempts = ? AND status = 'leased'""",
+            (status, json.dumps(outcome), key, worker, attempt))
+        return cursor.rowcount == 1
+
+    def complete(self, key, worker, attempt, results):
+        return self.finish(key, worker, attempt, "done", {"results": results})
+
+    def fail(self, key, worker, attempt, failure):
+        return self.finish(key, worker, attempt, "failed", {"failure": failure.args})
+
+    def collect(self, keys):
+        """Return the (key, outcome) pairs of the keys finished since the last call and mark them collected."""
+        self.transaction()
+        rows = self.connection.execute(
+            "SELECT key, status, outcome FROM jobs WHERE status IN ('done', 'failed') AND collected = 0").fetchall()
+        rows = [row for row in rows if row[0] in keys]
+        self.connection.executemany("UPDATE jobs SET collected = 1 WHERE key = ?", [(row[0],) for row in rows])
+        self.connection.execute("COMMIT")
+        outcomes = []
+        for key, status, outcome in rows:
+            outcome = json.loads(outcome)
+            if status == "done":
+                outcomes.append((key, outcome["results"]))
+            else:
+                outcomes.append((key, StageFailure(*outcome["failure"])))
+        return outcomes
+
+    def set_cycle_limit(self, layer, cycle_limit):
+        self.connection.execute("INSERT OR REPLACE INTO cycle_limits (layer, cycle_limit) VALUES (?, ?)",
+                                (layer, cycle_limit))
+
+    def set_state(self, state):
+        self.connection.execute("INSERT OR REPLACE INTO sweep (name, value) VALUES ('state', ?)", (state,))
+
+    def is_closed(self):
+        """Return True once the coordinator finished and no job is left to claim."""
+        state = self.connection.execute("SELECT value FROM sweep WHERE name = 'state'").fetchone()
+        remaining = self.connection.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'leased')").fetchone()[0]
+        return state is not None and state[0] == "closed" and remaining == 0
+
+    def get_counts(self):
+        return dict(self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+class QueueCoordinator:
+    """Puts the queued jobs of a DSE into a work queue and records their outcomes.
+
+    The coordinator only writes the results CSV files and the results cache, the tool
+    runs happen in the worker processes started with --worker. The queue is open for
+    the whole DSE run, which queues a batch of jobs per layer or search round; workers
+    leave once it is closed and empty.
+    """
+    def __init__(self, dse, database_path):
+        self.dse = dse
+        self.queue = WorkQueue(database_path)
+
+    def get_layer(self, job):
+        return f"{self.dse.model_name}:{job['state']['current_layer_name']}"
+
+    def open(self):
+        self.queue.set_state("open")
+
+    def close(self):
+        self.queue.set_state("closed")
+
+    def run(self, jobs):
+        """Queue a batch of jobs and record their outcomes as workers finish them."""
+        waiting = {job["key"]: job for job in jobs}
+        self.queue.add(self.get_layer, jobs)
+        print(f"Queued {len(waiting)} configurations, waiting for workers")
+        counts = None
+        while waiting:
+            for key, outcome in self.queue.collect(waiting):
+                job = waiting.pop(key)
+                if isinstance(outcome, StageFailure):
+                    self.dse.fail_job(job, outcome)
+                    continue
+                self.dse.complete_job(job, outcome)
+                layer_name = job["state"]["current_layer_name"]
+                cycle_limit = self.dse.get_cycle_limit(layer_name)
+                if cycle_limit is not None:
+                    self.queue.set_cycle_limit(self.get_layer(job), cycle_limit)
+            if waiting:
+                if counts != self.queue.get_counts():
+                    counts = self.queue.get_counts()
+                    print(f"Work queue: {counts}")
+                time.sleep(queue_poll_interval)
+
+class Heartbeat(threading.Thread):
+    """Extends the lease of the job a worker runs until stopped."""
+    def __init__(self, database_path, key, worker, attempt, lease):
+        super().__init__(daemon=True)
+        self.database_path = database_path
+        self.key = key
+        self.worker = worker
+        self.attempt = attempt
+        self.lease = lease
+        self.stopped = threading.Event()
+
+    def run(self):
+        # SQLite connections cannot be shared between threads
+        queue = WorkQueue(self.database_path)
+        while not self.stopped.wait(self.lease / 3):
+            if not queue.heartbeat(self.key, self.worker, self.attempt, self.lease):
+                print(f"Lost the lease of {self.key[:12]}")
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+def run_worker(database_path, backend_name, persistent, lease):
+    """Claim and run jobs from the work queue until the coordinator closes it."""
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    queue = WorkQueue(database_path)
+    start_worker_session(backend_name, persistent, worker)
+    print(f"Worker {worker} polling {database_path}")
+    try:
+        while True:
+            job = queue.claim(worker, lease)
+            if job is None:
+                if queue.is_closed():
+                    break
+                time.sleep(queue_poll_interval)
+                continue
+            print(f"Running {job['configuration']}")
+            heartbeat = Heartbeat(database_path, job["key"], worker, job["attempt"], lease)
+            heartbeat.start()
+            try:
+                staging_path = run_job(job)
+            except StageFailure as failure:
+                print(f"Configuration {job['configuration']} failed: {failure}")
+                if not queue.fail(job["key"], worker, job["attempt"], failure):
+                    print(f"Ignored the failure of {job['configuration']}, its lease was lost")
+                continue
+            finally:
+                heartbeat.stop()
+            with open(staging_path, "r", encoding="UTF-8") as file:
+                results = json.load(file)
+            if not queue.complete(job["key"], worker, job["attempt"], results):
+                print(f"Ignored the results of {job['configuration']}, its lease was lost")
+            os.remove(staging_path)
+    finally:
+        dse_worker.worker_session.stop()
+        stop_sessions(worker)
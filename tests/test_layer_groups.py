@@ -0,0 +1,24 @@
+from types import SimpleNamespace
+from read_mlir import parse_file, create_layers
+from design_space_exploration import DSE
+
+conv2d = """    linalg.conv_2d_nhwc_hwcf {{dilations = dense<1> : tensor<2xi64>, strides = dense<{strides}> : tensor<2xi64>}}
+      ins(%a, %b : memref<1x58x58x64xf32>, memref<3x3x64x64xf32>) outs(%c : memref<1x{size}x{size}x64xf32>)
+"""
+
+def get_layers(tmp_path, ops):
+    file_path = tmp_path / "model.mlir"
+    file_path.write_text("module {\n" + "".join(ops) + "}\n")
+    args = SimpleNamespace(permute=True, tile=False, unroll=False, conv2d=True, depthwise_conv2d=False, matmul=False)
+    return create_layers(args, parse_file(str(file_path)))
+
+def test_layers_of_the_same_signature_share_a_group(tmp_path):
+    layers = get_layers(tmp_path, [conv2d.format(strides=1, size=56), conv2d.format(strides=2, size=28),
+                                   conv2d.format(strides=1, size=56), conv2d.format(strides=1, size=56)])
+    groups = DSE.group_layers(SimpleNamespace(layers=layers), True)
+    assert groups == {"conv2d_1": ["conv2d_1", "conv2d_3", "conv2d_4"], "conv2d_2": ["conv2d_2"]}
+
+def test_layers_are_not_grouped_without_deduplication(tmp_path):
+    layers = get_layers(tmp_path, [conv2d.format(strides=1, size=56), conv2d.format(strides=1, size=56)])
+    groups = DSE.group_layers(SimpleNamespace(layers=layers), False)
+    assert groups == {"conv2d_1": ["conv2d_1"], "conv2d_2": ["conv2d_2"]}
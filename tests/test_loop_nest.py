@@ -0,0 +1,53 @@
+from loop_nest import get_loop_nest, get_legal_permutations, canonicalize_tile_sizes
+
+conv2d = ("linalg.conv_2d_nhwc_hwcf {dilations = dense<1> : tensor<2xi64>, strides = dense<1> : tensor<2xi64>} "
+          "ins(%a, %b : memref<1x10x10x4xf32>, memref<3x3x4x8xf32>) outs(%c : memref<1x8x8x8xf32>)\n")
+matmul = "linalg.batch_matmul ins(%a, %b : memref<1x64x32xf32>, memref<1x32x16xf32>) outs(%c : memref<1x64x16xf32>)\n"
+
+def get_loops(tmp_path, op):
+    file_path = tmp_path / "layer.mlir"
+    file_path.write_text(op)
+    return get_loop_nest(str(file_path))[1]
+
+def test_loop_nest_trip_counts(tmp_path):
+    loops = get_loops(tmp_path, conv2d)
+    assert [(loop["name"], loop["trip_count"], loop["iterator_type"]) for loop in loops] == [
+        ("n", 1, "parallel"), ("oh", 8, "parallel"), ("ow", 8, "parallel"), ("f", 8, "parallel"),
+        ("kh", 3, "reduction"), ("kw", 3, "reduction"), ("c", 4, "reduction")]
+
+def test_permutations_of_matmul(tmp_path):
+    loops = get_loops(tmp_path, matmul)
+    orders = get_legal_permutations(loops)
+    assert orders[0] == [0, 1, 2, 3]
+    # The batch loop of trip count 1 stays in place, the other three loops move freely
+    assert len(orders) == 6
+    assert all(order[0] == 0 for order in orders)
+
+def test_permutations_keep_the_order_of_the_reductions(tmp_path):
+    loops = get_loops(tmp_path, conv2d)
+    orders = get_legal_permutations(loops)
+    reductions = [index for index, loop in enumerate(loops) if loop["iterator_type"] == "reduction"]
+    assert orders[0] == list(range(len(loops)))
+    assert len(set(map(tuple, orders))) == len(orders)
+    for order in orders:
+        assert order[0] == 0
+        assert [index for index in order if index in reductions] == reductions
+
+def test_permutations_of_interchangeable_loops_are_canonical(tmp_path):
+    loops = get_loops(tmp_path, conv2d)
+    orders = get_legal_permutations(loops, reorder_reductions=True)
+    # Swapping oh and ow, or kh and kw, gives the same hardware and is left out
+    for order in orders:
+        assert order.index(1) < order.index(2)
+        assert order.index(4) < order.index(5)
+    assert len(orders) > len(get_legal_permutations(loops))
+
+def test_tile_sizes_are_clamped_to_the_loop_extents(tmp_path):
+    loops = get_loops(tmp_path, matmul)
+    assert canonicalize_tile_sizes([4, 128, 8, 32], loops) == [1, 64, 8, 32]
+    assert canonicalize_tile_sizes([1, 64, 8, 32], loops) == [1, 64, 8, 32]
+
+def test_untiled_nests_are_canonicalized_to_zeros(tmp_path):
+    loops = get_loops(tmp_path, matmul)
+    assert canonicalize_tile_sizes([1, 64, 16, 32], loops) == [0, 0, 0, 0]
+    assert canonicalize_tile_sizes([8, 128, 0, 64], loops) == [0, 0, 0, 0]
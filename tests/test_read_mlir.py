@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+from read_mlir import parse_file, create_layers
+
+model = """module {
+  func.func @main(%arg0: memref<1x224x224x3xf32>) {
+    linalg.conv_2d_nhwc_hwcf {dilations = dense<1> : tensor<2xi64>,
+                              strides = dense<2> : tensor<2xi64>}
+      ins(%a, %b : memref<1x225x225x3xf32>, memref<3x3x3x16xf32>)
+      outs(%c : memref<1x112x112x16xf32>)
+    linalg.fill ins(%cst : f32) outs(%i : memref<1x1x1000xf32>)
+    linalg.depthwise_conv_2d_nhwc_hwc
+      {dilations = dense<1> : tensor<2xi64>, strides = dense<1> : tensor<2xi64>}
+      ins(%d, %e : memref<1x114x114x16xf32, strided<[207936, 1824, 16, 1]>>, memref<3x3x16xf32>)
+      outs(%f : memref<1x112x112x16xf32>)
+    %0 = linalg.batch_matmul ins(%g, %h : tensor<1x1x512xf32>, tensor<1x512x1000xf32>) -> tensor<1x1x1000xf32>
+    linalg.batch_matmul ins(%g, %h : memref<1x1x512xf32>, memref<1x512x1000xf32>)
+      outs(%i : memref<1x1x1000xf32>)
+  }
+}
+"""
+
+def get_args(**layer_kinds):
+    args = {"permute": True, "tile": False, "unroll": False, "conv2d": False, "depthwise_conv2d": False, "matmul": False}
+    args.update(layer_kinds)
+    return SimpleNamespace(**args)
+
+def test_parse_file_reads_ops_spanning_several_lines(tmp_path):
+    file_path = tmp_path / "model.mlir"
+    file_path.write_text(model)
+    descriptors = parse_file(str(file_path))
+    assert [descriptor["name"] for descriptor in descriptors] == ["conv2d", "depthwise_conv2d", "matmul"]
+    conv2d, depthwise_conv2d, matmul = descriptors
+    assert conv2d["input_tensor_shape"] == [1, 225, 225, 3]
+    assert conv2d["kernel_tensor_shape"] == [3, 3, 3, 16]
+    assert conv2d["output_tensor_shape"] == [1, 112, 112, 16]
+    assert conv2d["strides"] == 2 and conv2d["dilations"] == 1
+    assert depthwise_conv2d["input_tensor_shape"] == [1, 114, 114, 16]
+    assert depthwise_conv2d["strides"] == 1
+    assert matmul["kernel_tensor_shape"] == [1, 512, 1000]
+    assert matmul["output_tensor_shape"] == [1, 1, 1000]
+
+def test_parse_file_of_empty_file(tmp_path):
+    file_path = tmp_path / "empty.mlir"
+    file_path.write_text("")
+    assert parse_file(str(file_path)) == []
+
+def test_create_layers_numbers_the_selected_kinds(tmp_path):
+    file_path = tmp_path / "model.mlir"
+    file_path.write_text(model)
+    layers = create_layers(get_args(conv2d=True, matmul=True), parse_file(str(file_path)))
+    assert list(layers) == ["conv2d_1", "matmul_1"]
@@ -0,0 +1,43 @@
+from results_csv import parse_results_file_name, read_results_csv
+
+header = ("configuration,input_batch,input_width,input_height,weight_batch,weight_width,weight_height,output_batch,"
+          "output_width,output_height,permuation_order_1,permuation_order_2,permuation_order_3,permuation_order_4,"
+          "actual_input_batch,actual_input_width,actual_input_height,actual_weight_batch,actual_weight_width,"
+          "actual_weight_height,actual_output_batch,actual_output_width,actual_output_height,number_of_tiles,"
+          "simulation_cycles,total_power,area,runtime_in_s,gflops,gflops_per_watt,energy_consumed,flop_count")
+row = ("model_permute_matmul_1_{order},1,1,512,1,512,1000,1,1,1000,{orders},1,1,128,1,128,125,1,1,125,32.0,"
+       "3149888.0,0.044,48434.0,0.031499,0.032509,0.738843,0.00138595072,1024000")
+
+def get_row(order):
+    return row.format(order=order, orders=",".join(order))
+
+def test_results_file_names():
+    assert parse_results_file_name("results/vgg16_conv2d_permute_1.csv") == ("vgg16", "conv2d", "permute")
+    assert parse_results_file_name("results/vgg16_depthwise_conv2d_tile.csv") == ("vgg16", "depthwise_conv2d", "tile")
+    assert parse_results_file_name("results/vgg16_matmul_permute_bambu.csv") == ("vgg16", "matmul", "permute")
+    assert parse_results_file_name("results/vgg16_matmul_permute_1_bambu.csv") == ("vgg16", "matmul", "permute")
+    assert parse_results_file_name("results/vgg16_matmul.csv") is None
+
+def test_rows_with_more_values_than_the_header(tmp_path):
+    file_path = tmp_path / "model_matmul_permute.csv"
+    # A run writing the fidelity and Bambu area appended to a file of the older schema
+    file_path.write_text("\n".join([header, get_row("0123"), get_row("0213") + ",openroad,812.0"]) + "\n")
+    records = list(read_results_csv(str(file_path)))
+    assert [record["transform"] for record in records] == ["0,1,2,3", "0,2,1,3"]
+    for record in records:
+        assert None not in record["row"]
+        assert record["fidelity"] == "openroad"
+        assert record["signature"] == ("matmul", 1, 1, 128, 1, 128, 125, 1, 1, 125)
+        assert record["results"]["simulation_cycles"] == round(3149888.0 / 32)
+        assert record["results"]["bambu_area"] is None
+
+def test_rows_of_the_bambu_fidelity(tmp_path):
+    file_path = tmp_path / "model_matmul_permute_bambu.csv"
+    bambu_header = header + ",fidelity,bambu_area"
+    bambu_row = get_row("0123").replace(",0.044,48434.0,", ",,,") + ",bambu,812.0"
+    file_path.write_text("\n".join([bambu_header, bambu_row]) + "\n")
+    [record] = read_results_csv(str(file_path))
+    assert record["fidelity"] == "bambu"
+    assert record["results"]["total_power"] is None
+    assert record["results"]["available_area"] is None
+    assert record["results"]["bambu_area"] == 812.0
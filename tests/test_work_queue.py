@@ -0,0 +1,61 @@
+import json
+import time
+import threading
+from types import SimpleNamespace
+import dse_worker
+import work_queue
+from work_queue import QueueCoordinator, WorkQueue, run_worker
+
+class RecordingDSE:
+    """Stands for the DSE a coordinator reports the outcomes of its jobs to."""
+    model_name = "model"
+
+    def __init__(self):
+        self.completed = []
+
+    def complete_job(self, job, results):
+        self.completed.append(job["key"])
+
+    def fail_job(self, job, failure):
+        raise AssertionError(f"{job['key']} failed: {failure}")
+
+    def get_cycle_limit(self, layer_name):
+        return None
+
+def get_jobs(keys):
+    return [{"key": key, "configuration": f"model_permute_conv2d_1_{key}", "state": {"current_layer_name": "conv2d_1"}}
+            for key in keys]
+
+def run_job(job):
+    staging_path = f"{job['staging_directory']}/{job['key']}.json"
+    with open(staging_path, "w", encoding="UTF-8") as file:
+        json.dump({"simulation_cycles": 1}, file)
+    return staging_path
+
+def start_worker_session(backend_name, persistent, owner):
+    dse_worker.worker_session = SimpleNamespace(stop=lambda: None)
+
+def test_worker_stays_for_every_batch_of_the_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(work_queue, "queue_poll_interval", 0.05)
+    monkeypatch.setattr(work_queue, "run_job", run_job)
+    monkeypatch.setattr(work_queue, "start_worker_session", start_worker_session)
+    monkeypatch.setattr(work_queue, "stop_sessions", lambda owner: None)
+    database_path = str(tmp_path / "queue.db")
+    dse = RecordingDSE()
+    coordinator = QueueCoordinator(dse, database_path)
+    coordinator.open()
+    worker = threading.Thread(target=run_worker, args=(database_path, "mock", False, 60), daemon=True)
+    worker.start()
+    batches = [get_jobs(["a", "b"]), get_jobs(["c"]), get_jobs(["d", "e"])]
+    for batch in batches:
+        for job in batch:
+            job["staging_directory"] = str(tmp_path)
+        coordinator.run(batch)
+        # Between the batches of a run, such as two layers, the queue is empty but still open
+        time.sleep(0.2)
+        assert worker.is_alive()
+    coordinator.close()
+    worker.join(timeout=10)
+    assert not worker.is_alive()
+    assert dse.completed == ["a", "b", "c", "d", "e"]
+    assert WorkQueue(database_path).get_counts() == {"done": 5}